@@ -3,6 +3,7 @@ Metrics scripts
 """
 from datetime import datetime, timedelta
 from modularodm import Q
+from website.statistics import get_totals, rebuild_statistics
 from website.project.model import User, Node
 from website.project.utils import CONTENT_NODE_QUERY
 
@@ -31,10 +32,11 @@ def get_previous_midnight(time=None):
     )
 
 
-def get_osf_statistics(time=None):
+def get_osf_statistics(time=None, backfill=False):
     """ get all dates since the latest
 
     :param time: immediately turns into the previous midnight
+    :param backfill: rebuild the daily counters from every node and user first
     :return: nothing
     """
     time = get_previous_midnight(time)
@@ -46,20 +48,29 @@ def get_osf_statistics(time=None):
         dates = get_list_of_dates(latest.date, time)
     else:
         dates = [time]
+    if backfill:
+        rebuild_statistics()
+    totals = get_totals(dates)
     for date in dates:
-        get_days_statistics(date, latest)
+        get_days_statistics(date, latest, totals=totals[date])
         latest = OSFWebsiteStatistics.objects.latest('date')
 
 
-def get_days_statistics(time, latest=None):
+def get_days_statistics(time, latest=None, totals=None):
+    """ Save the statistics for `time`. Days before `time` are read from the
+    daily counters, and only the part of `time`'s own day is counted.
+    """
+    if totals is None:
+        totals = get_totals([time])[time]
+    since = datetime.combine(time.date(), datetime.min.time())
     statistics = OSFWebsiteStatistics(date=time)
     # Basic user count
-    statistics.users = get_active_user_count(time)
+    statistics.users = totals['users'] + get_active_user_count(time, since=since)
     # Users who are currently unregistered
     statistics.unregistered_users = get_unregistered_users()
-    statistics.projects = get_projects(time=time)
-    statistics.public_projects = get_projects(time=time, public=True)
-    statistics.registered_projects = get_projects(time=time, registered=True)
+    statistics.projects = totals['projects'] + get_projects(time=time, since=since)
+    statistics.public_projects = totals['public_projects'] + get_projects(time=time, public=True, since=since)
+    statistics.registered_projects = totals['registered_projects'] + get_projects(time=time, registered=True, since=since)
     if latest:
         statistics.delta_users = statistics.users - latest.users
         statistics.delta_projects = statistics.projects - latest.projects
@@ -68,13 +79,15 @@ def get_days_statistics(time, latest=None):
     statistics.save()
 
 
-def get_projects(time=None, public=False, registered=False):
+def get_projects(time=None, public=False, registered=False, since=None):
     query = (
         Q('parent_node', 'eq', None) &
         CONTENT_NODE_QUERY
     )
     if time:
         query = query & Q('date_created', 'lt', time)
+    if since:
+        query = query & Q('date_created', 'gte', since)
     if public:
         query = query & Q('is_public', 'eq', True)
     if registered:
@@ -82,7 +95,7 @@ def get_projects(time=None, public=False, registered=False):
     return Node.find(query).count()
 
 
-def get_active_user_count(time):
+def get_active_user_count(time, since=None):
     query = (
         Q('date_registered', 'lt', time) &
         Q('is_registered', 'eq', True) &
@@ -91,6 +104,8 @@ def get_active_user_count(time):
         Q('date_confirmed', 'ne', None) &
         Q('date_disabled', ' eq', None)
     )
+    if since:
+        query = query & Q('date_registered', 'gte', since)
     return User.find(query).count()
 
 
@@ -1,8 +1,20 @@
 # -*- coding: utf-8 -*-
+from collections import defaultdict
+
 from admin.base.settings import ENTRY_POINTS
 from datetime import datetime, timedelta
 from framework.mongo import database as db
 
+# Dashboard metrics, one document per day
+COLLECTION = 'salesanalytics'
+# The actions, products and first repeated action of each user on each day
+DAILY_COLLECTION = 'salesanalyticsdaily'
+METRICS = ('user_count', 'multi_product_metrics_yearly', 'multi_product_metrics_monthly', 'repeat_action_user_monthly')
+# Days of logs kept rolled up, enough for the yearly metrics
+ROLLUP_DAYS = timedelta(days=365)
+# Seconds between two occurrences of an action for the second to count as a repeat
+REPEAT_ACTION_INTERVAL = 3
+
 
 # Helper functions
 def get_entry_point(system_tags, entry_points=ENTRY_POINTS):
@@ -52,42 +64,107 @@ def get_user_count(db=db, entry_points=ENTRY_POINTS):
     return {'tags': tags, 'count': count_list, 'percent': percent_list, 'total': total}
 
 
-def get_multi_product_metrics(db=db, timedelta=timedelta(days=365)):
+def find_by_ids(collection, ids, fields, chunk_size=1000):
+    """
+    Load the documents with the given ids from collection, `chunk_size` at a time,
+    returning a dict of id to document.
+    """
+    ids = list(ids)
+    documents = {}
+    for i in range(0, len(ids), chunk_size):
+        for document in collection.find({'_id': {'$in': ids[i:i + chunk_size]}}, fields):
+            documents[document['_id']] = document
+    return documents
+
+
+def day_start(day):
+    return datetime.combine(day, datetime.min.time())
+
+
+def day_key(day):
+    return day.strftime('%Y-%m-%d')
+
+
+def rollup_day(day, db=db):
     """
-    Get the number of users using 2+ products within a period of time
+    Summarize the logs of each user on `day` in the daily rollup collection, replacing any
+    earlier summary of that day. Logs are streamed in date order, so memory grows with the
+    number of users active that day rather than with the number of logs.
     """
-    start_date = datetime.now() - timedelta
-    pipeline = [
-        {'$match': {'date': {'$gt': start_date}}},
-        {'$group': {'_id': '$user', 'node_id': {'$addToSet': '$params.node'},
-                    'action': {'$addToSet': '$action'}}}
+    start = day_start(day)
+    logs = db.nodelog.find(
+        {'date': {'$gte': start, '$lt': start + timedelta(days=1)}, 'user': {'$ne': None}},
+        {'user': True, 'action': True, 'params.node': True, 'date': True},
+    ).sort('date', 1)
+    users = {}
+    for log in logs:
+        user = users.setdefault(log['user'], {'node_ids': set(), 'actions': {}, 'repeat_date': None})
+        node_id = (log.get('params') or {}).get('node')
+        if node_id:
+            user['node_ids'].add(node_id)
+        action = user['actions'].get(log['action'])
+        if action is None:
+            user['actions'][log['action']] = {'action': log['action'], 'first': log['date'], 'last': log['date']}
+            continue
+        # Actions repeated within REPEAT_ACTION_INTERVAL seconds of each other count as one
+        if user['repeat_date'] is None and (log['date'] - action['last']).total_seconds() >= REPEAT_ACTION_INTERVAL:
+            user['repeat_date'] = log['date']
+        action['last'] = log['date']
+
+    nodes = find_by_ids(db.node, set().union(*[user['node_ids'] for user in users.values()]), {'system_tags': True})
+    db[DAILY_COLLECTION].ensure_index([('date', 1)])
+    db[DAILY_COLLECTION].remove({'date': start})
+    rows = [
+        {
+            'date': start,
+            'user': user_id,
+            'products': sorted(set(
+                get_entry_point(nodes[node_id]['system_tags'])
+                for node_id in user['node_ids']
+                if node_id in nodes
+            )),
+            'actions': user['actions'].values(),
+            'repeat_date': user['repeat_date'],
+        }
+        for user_id, user in users.items()
     ]
-    user_nodes = db.nodelog.aggregate(pipeline)['result']
+    if rows:
+        db[DAILY_COLLECTION].insert(rows)
+    return len(rows)
+
+
+def get_multi_product_metrics(db=db, timedelta=timedelta(days=365), end=None):
+    """
+    Get the number of users using 2+ products within a period of time, from the daily rollups
+    """
+    end = end or datetime.now()
+    start_date = end - timedelta
+    products = defaultdict(set)
+    actions = defaultdict(set)
+    rows = db[DAILY_COLLECTION].find(
+        {'date': {'$gte': start_date, '$lt': end}},
+        {'user': True, 'products': True, 'actions.action': True},
+    )
+    for row in rows:
+        products[row['user']].update(row['products'])
+        actions[row['user']].update(action['action'] for action in row['actions'])
+    users = find_by_ids(db.user, actions.keys(), {'system_tags': True})
+
     multi_product_count = 0
     cross_product_count = 0
     multi_action_count = 0
-    for user_node in user_nodes:
-        if user_node['_id']:
-            user_id = user_node['_id']
-            node_id = user_node['node_id']
-            products = []
-            nodes = db.node.find({'_id': {'$in': node_id}})
-            for node in nodes:
-                products.append(get_entry_point(node['system_tags']))
-            if len(set(products)) > 1:
-                multi_product_count += 1
-
-            # Cross product count
-            user = db.user.find_one({'_id': user_id})
-            user_entry_point = get_entry_point(user['system_tags'])
-            for product in products:
-                if user_entry_point != product:
-                    cross_product_count += 1
-                    break
-
-            # Action type
-            if len(set(user_node['action'])) > 1:
-                multi_action_count += 1
+    for user_id, user_actions in actions.items():
+        if len(products[user_id]) > 1:
+            multi_product_count += 1
+
+        # Cross product count
+        user = users.get(user_id)
+        if user and products[user_id] - {get_entry_point(user['system_tags'])}:
+            cross_product_count += 1
+
+        # Action type
+        if len(user_actions) > 1:
+            multi_action_count += 1
 
     return {'multi_product_count': multi_product_count,
             'cross_product_count': cross_product_count,
@@ -95,37 +172,90 @@ def get_multi_product_metrics(db=db, timedelta=timedelta(days=365)):
             }
 
 
-def get_repeat_action_user_count(db=db, timedelta=timedelta(days=30)):
+def get_repeat_action_user_count(db=db, timedelta=timedelta(days=30), end=None):
     """
     Get the number of users that have repetitive actions (with a 3 second difference)
-    during the last month.
+    during the last month, from the daily rollups.
     """
-    start_date = datetime.now() - timedelta
-    pipeline = [
-        {'$match': {'date': {'$gt': start_date}}},
-        {'$group': {'_id': '$user', 'nodelog_id': {'$addToSet': '$_id'}}},
+    end = end or datetime.now()
+    start_date = end - timedelta
+    rows = db[DAILY_COLLECTION].find(
+        {'date': {'$gte': start_date, '$lt': end}},
+        {'user': True, 'actions': True, 'repeat_date': True},
+    ).sort('date', 1)
+    last_action_dates = defaultdict(dict)
+    repeat_action_dates = {}
+    for row in rows:
+        user_id = row['user']
+        if user_id in repeat_action_dates:
+            continue
+        # The first repeat of the day is either within the day, or an action
+        # the user already took on an earlier day
+        repeats = [row['repeat_date']] if row['repeat_date'] else []
+        last_dates = last_action_dates[user_id]
+        for action in row['actions']:
+            last = last_dates.get(action['action'])
+            if last and (action['first'] - last).total_seconds() >= REPEAT_ACTION_INTERVAL:
+                repeats.append(action['first'])
+            last_dates[action['action']] = action['last']
+        if repeats:
+            repeat_action_dates[user_id] = min(repeats)
+
+    users = find_by_ids(db.user, repeat_action_dates.keys(), {'date_registered': True})
+    repeat_action_user_age = [
+        (repeat_date - users[user_id]['date_registered']).days
+        for user_id, repeat_date in repeat_action_dates.items()
+        if user_id in users
     ]
+    return {'repeat_action_count': len(repeat_action_dates), 'repeat_action_age': repeat_action_user_age}
+
+
+def get_rollup_days(day, db=db):
+    """
+    Return the days whose logs are not yet rolled up as of `day`: those that ended since the last
+    update, or the last ROLLUP_DAYS days before the first update.
+    """
+    end = day_start(day)
+    latest = list(db[COLLECTION].find({'_id': {'$lte': day_key(day)}}).sort('_id', -1).limit(1))
+    rollup_from = max(latest[0]['date'], end - ROLLUP_DAYS) if latest else end - ROLLUP_DAYS
+    days = []
+    while rollup_from < end:
+        days.append(rollup_from.date())
+        rollup_from += timedelta(days=1)
+    return days
+
 
-    user_nodelog = db.nodelog.aggregate(pipeline)['result']
-    repeat_action_count = 0
-    repeat_action_user_age = []
-    for i in user_nodelog:
-        if i['_id']:
-            user_id = i['_id']
-            nodelog_id = i['nodelog_id']
-            nodelogs = db.nodelog.find({'_id': {'$in': nodelog_id}}).sort([('date', 1)])
-            repeat_action_date = {}
-            for nodelog in nodelogs:
-                action = nodelog['action']
-                date = nodelog['date']
-                if action not in repeat_action_date:
-                    repeat_action_date[action] = date
-                elif abs((date - repeat_action_date[action]).total_seconds()) < 3:
-                    repeat_action_date[action] = date
-                else:
-                    repeat_action_count += 1
-                    date_registered = db.user.find({'_id': user_id}).next()['date_registered']
-                    age = (date - date_registered).days
-                    repeat_action_user_age.append(age)
-                    break
-    return {'repeat_action_count': repeat_action_count, 'repeat_action_age': repeat_action_user_age}
+def update_sales_analytics(day=None, db=db, rollup=True):
+    """
+    Roll up the logs of each day that ended since the last update, unless `rollup` is False because
+    the caller already has, then compute and store the dashboard metrics for `day`. Rollups older
+    than ROLLUP_DAYS are no longer read and are pruned. Run daily by the `scripts.sales_analytics` task.
+    """
+    day = day or datetime.utcnow().date()
+    end = day_start(day)
+    if rollup:
+        for rollup_from in get_rollup_days(day, db=db):
+            rollup_day(rollup_from, db=db)
+    db[DAILY_COLLECTION].remove({'date': {'$lt': end - ROLLUP_DAYS}})
+
+    metrics = {
+        'user_count': get_user_count(db=db),
+        'multi_product_metrics_yearly': get_multi_product_metrics(db=db, end=end),
+        'multi_product_metrics_monthly': get_multi_product_metrics(db=db, timedelta=timedelta(days=30), end=end),
+        'repeat_action_user_monthly': get_repeat_action_user_count(db=db, end=end),
+    }
+    db[COLLECTION].update({'_id': day_key(day)}, dict(metrics, date=end), upsert=True)
+    return metrics
+
+
+def get_sales_analytics(time=None, db=db):
+    """
+    Return the most recent dashboard metrics stored by `update_sales_analytics`, as of the day
+    of `time`. Metrics are None until the first update has run.
+    """
+    day = (time or datetime.utcnow()).date()
+    latest = list(db[COLLECTION].find({'_id': {'$lte': day_key(day)}}).sort('_id', -1).limit(1))
+    metrics = dict.fromkeys(METRICS)
+    if latest:
+        metrics.update((key, latest[0].get(key)) for key in METRICS)
+    return metrics
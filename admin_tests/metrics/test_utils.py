@@ -6,8 +6,10 @@ from tests.factories import (
     AuthUserFactory, NodeFactory, ProjectFactory, RegistrationFactory
 )
 
+from website import statistics
 from website.project.model import Node, User
 from framework.auth import Auth
+from framework.mongo import database
 
 from admin.metrics.utils import (
     get_projects,
@@ -98,6 +100,53 @@ class TestMetricsGetOSFStatistics(AdminTestCase):
         nt.assert_equal(OSFWebsiteStatistics.objects.count(), 3)
 
 
+class TestMetricsDailyCounters(AdminTestCase):
+    def setUp(self):
+        super(TestMetricsDailyCounters, self).setUp()
+        Node.remove()
+        database[statistics.COLLECTION].remove()
+        self.midnight = get_previous_midnight()
+        self.yesterday = self.midnight - timedelta(days=1)
+        self.public_node = ProjectFactory(is_public=True, date_created=self.yesterday)
+        self.private_node = ProjectFactory(is_public=False, date_created=self.yesterday)
+        NodeFactory(parent=self.private_node, date_created=self.yesterday)
+
+    def test_counters_follow_saves(self):
+        totals = statistics.get_totals([self.midnight])[self.midnight]
+        nt.assert_equal(totals['projects'], 2)
+        nt.assert_equal(totals['public_projects'], 1)
+
+        self.private_node.is_public = True
+        self.private_node.save()
+        self.public_node.is_deleted = True
+        self.public_node.save()
+        totals = statistics.get_totals([self.midnight])[self.midnight]
+        nt.assert_equal(totals['projects'], 1)
+        nt.assert_equal(totals['public_projects'], 1)
+
+    def test_uncached_save_is_not_counted_as_new(self):
+        Node._clear_caches()
+        self.public_node.title = 'Saved without a cache entry'
+        self.public_node.save()
+        totals = statistics.get_totals([self.midnight])[self.midnight]
+        nt.assert_equal(totals['projects'], 2)
+        nt.assert_equal(totals['public_projects'], 1)
+
+    def test_rebuild_matches_counts(self):
+        database[statistics.COLLECTION].remove()
+        statistics.rebuild_statistics()
+        totals = statistics.get_totals([self.midnight])[self.midnight]
+        nt.assert_equal(totals['projects'], get_projects(time=self.midnight))
+        nt.assert_equal(totals['public_projects'], get_projects(time=self.midnight, public=True))
+        nt.assert_equal(totals['users'], get_active_user_count(self.midnight))
+
+    def test_backfill(self):
+        get_osf_statistics(time=self.midnight + timedelta(hours=1), backfill=True)
+        latest = OSFWebsiteStatistics.objects.latest('date')
+        nt.assert_equal(latest.projects, 2)
+        nt.assert_equal(latest.public_projects, 1)
+
+
 class TestMetricListDays(AdminTestCase):
     def test_five_days(self):
         time_now = datetime.utcnow()
@@ -0,0 +1,129 @@
+from nose import tools as nt
+from datetime import timedelta, datetime
+
+from framework.mongo import database
+from tests.base import AdminTestCase
+
+from admin.sales_analytics.utils import (
+    COLLECTION,
+    DAILY_COLLECTION,
+    ROLLUP_DAYS,
+    get_rollup_days,
+    rollup_day,
+    get_multi_product_metrics,
+    get_repeat_action_user_count,
+    get_sales_analytics,
+    update_sales_analytics,
+)
+
+
+class TestSalesAnalytics(AdminTestCase):
+    def setUp(self):
+        super(TestSalesAnalytics, self).setUp()
+        database.user.remove()
+        database.node.remove()
+        database.nodelog.remove()
+        database[COLLECTION].remove()
+        database[DAILY_COLLECTION].remove()
+        self.today = datetime.utcnow().date()
+        self.midnight = datetime.combine(self.today, datetime.min.time())
+        self.now = self.midnight + timedelta(hours=12)
+        database.user.insert([
+            {'_id': 'osfuser', 'system_tags': [], 'date_registered': self.now - timedelta(days=10)},
+            {'_id': 'meetinguser', 'system_tags': ['osf4m'], 'date_registered': self.now - timedelta(days=3)},
+        ])
+        database.node.insert([
+            {'_id': 'osfnode', 'system_tags': []},
+            {'_id': 'meetingnode', 'system_tags': ['osf4m']},
+        ])
+
+    def add_log(self, user, node, action, seconds_ago):
+        database.nodelog.insert({
+            'user': user,
+            'action': action,
+            'params': {'node': node},
+            'date': self.now - timedelta(seconds=seconds_ago),
+        })
+
+    def test_multi_product_metrics(self):
+        self.add_log('osfuser', 'osfnode', 'project_created', 100)
+        self.add_log('osfuser', 'meetingnode', 'file_added', 50)
+        self.add_log('meetinguser', 'meetingnode', 'file_added', 50)
+        self.add_log(None, 'osfnode', 'file_added', 50)
+        nt.assert_equal(rollup_day(self.today), 2)
+
+        metrics = get_multi_product_metrics(end=self.midnight + timedelta(days=1))
+        nt.assert_equal(metrics, {
+            'multi_product_count': 1,
+            'cross_product_count': 1,
+            'multi_action_count': 1,
+        })
+
+    def test_repeat_action_user_count(self):
+        self.add_log('osfuser', 'osfnode', 'file_added', 100)
+        self.add_log('osfuser', 'osfnode', 'file_added', 99)
+        self.add_log('meetinguser', 'meetingnode', 'file_added', 100)
+        self.add_log('meetinguser', 'meetingnode', 'file_added', 50)
+        rollup_day(self.today)
+
+        metrics = get_repeat_action_user_count(end=self.midnight + timedelta(days=1))
+        nt.assert_equal(metrics, {'repeat_action_count': 1, 'repeat_action_age': [2]})
+
+    def test_repeat_action_on_a_later_day(self):
+        self.add_log('osfuser', 'osfnode', 'file_added', 24 * 3600)
+        self.add_log('osfuser', 'osfnode', 'file_added', 0)
+        rollup_day(self.today - timedelta(days=1))
+        rollup_day(self.today)
+
+        metrics = get_repeat_action_user_count(end=self.midnight + timedelta(days=1))
+        nt.assert_equal(metrics, {'repeat_action_count': 1, 'repeat_action_age': [10]})
+
+    def test_rollup_day_replaces_earlier_rollup(self):
+        self.add_log('osfuser', 'osfnode', 'file_added', 100)
+        rollup_day(self.today)
+        rollup_day(self.today)
+        nt.assert_equal(database[DAILY_COLLECTION].find().count(), 1)
+
+    def test_update_rolls_up_days_since_last_update(self):
+        self.add_log('osfuser', 'osfnode', 'project_created', 24 * 3600)
+        self.add_log('osfuser', 'meetingnode', 'file_added', 24 * 3600 - 50)
+        update_sales_analytics(self.today)
+        nt.assert_equal(database[DAILY_COLLECTION].find().count(), 1)
+
+        # Only the day that ended since is rolled up again
+        self.add_log('meetinguser', 'meetingnode', 'file_added', 50)
+        database[DAILY_COLLECTION].remove({'date': {'$lt': self.midnight}})
+        metrics = update_sales_analytics(self.today + timedelta(days=1))
+        nt.assert_equal(database[DAILY_COLLECTION].find().count(), 1)
+        nt.assert_equal(metrics['multi_product_metrics_monthly']['multi_product_count'], 0)
+        nt.assert_equal(metrics['user_count']['total'], 2)
+
+    def test_update_prunes_rollups_older_than_rollup_days(self):
+        for days_ago in (ROLLUP_DAYS.days + 1, ROLLUP_DAYS.days):
+            self.add_log('osfuser', 'osfnode', 'file_added', days_ago * 24 * 3600)
+            rollup_day(self.today - timedelta(days=days_ago))
+        update_sales_analytics(self.today, rollup=False)
+        nt.assert_equal(
+            [row['date'] for row in database[DAILY_COLLECTION].find()],
+            [self.midnight - ROLLUP_DAYS],
+        )
+
+    def test_rollup_days_start_from_the_last_update(self):
+        nt.assert_equal(len(get_rollup_days(self.today)), ROLLUP_DAYS.days)
+        update_sales_analytics(self.today)
+        nt.assert_equal(get_rollup_days(self.today), [])
+        nt.assert_equal(get_rollup_days(self.today + timedelta(days=2)), [self.today, self.today + timedelta(days=1)])
+
+    def test_sales_analytics_are_read_from_the_last_update(self):
+        nt.assert_equal(get_sales_analytics(), dict.fromkeys([
+            'user_count',
+            'multi_product_metrics_yearly',
+            'multi_product_metrics_monthly',
+            'repeat_action_user_monthly',
+        ]))
+        self.add_log('osfuser', 'osfnode', 'project_created', 24 * 3600)
+        self.add_log('osfuser', 'meetingnode', 'file_added', 24 * 3600 - 50)
+        metrics = update_sales_analytics(self.today)
+        nt.assert_equal(get_sales_analytics(), metrics)
+        nt.assert_equal(get_sales_analytics(time=self.now + timedelta(days=3)), metrics)
+        nt.assert_equal(metrics['multi_product_metrics_yearly']['multi_product_count'], 1)
@@ -6,7 +6,7 @@ from rest_framework.authentication import BasicAuthentication
 from rest_framework import exceptions
 
 from framework.auth import cas
-from framework.sessions.model import Session
+from framework.sessions.utils import load_session
 from framework.auth.core import User, get_user
 from website import settings
 from api.base.exceptions import UnconfirmedAccountError, DeactivatedAccountError, TwoFactorRequiredError
@@ -15,7 +15,7 @@ from api.base.exceptions import UnconfirmedAccountError, DeactivatedAccountError
 def get_session_from_cookie(cookie_val):
     """Given a cookie value, return the `Session` object or `None`."""
     session_id = itsdangerous.Signer(settings.SECRET_KEY).unsign(cookie_val)
-    return Session.load(session_id)
+    return load_session(session_id)
 
 
 def check_user(user):
@@ -247,6 +247,42 @@ class FilterMixin(object):
 
         return query
 
+    def filters_to_odm_query(self, filters):
+        """Compile parsed filters (see `parse_query_params`) into a modularodm Query object.
+
+        Fields named within a single `filter[...]` key are OR-ed together; separate keys are AND-ed.
+
+        :param dict filters: parsed query params
+        :return: Query object, or None if there is nothing to filter on
+        """
+        query_parts = []
+        for key, field_names in filters.iteritems():
+            sub_query_parts = []
+            for field_name, data in field_names.iteritems():
+                # Query based on the DB field, not the name of the serializer parameter
+                if isinstance(data, list):
+                    sub_query = functools.reduce(operator.and_, [
+                        Q(item['source_field_name'], item['op'], item['value'])
+                        for item in data
+                    ])
+                else:
+                    sub_query = Q(data['source_field_name'], data['op'], data['value'])
+
+                sub_query_parts.append(sub_query)
+
+            try:
+                sub_query = functools.reduce(operator.or_, sub_query_parts)
+                query_parts.append(sub_query)
+            except TypeError:
+                continue
+
+        try:
+            query = functools.reduce(operator.and_, query_parts)
+        except TypeError:
+            query = None
+
+        return query
+
     def convert_key(self, field_name, field):
         """Used so that that queries on fields with the source attribute set will work
         :param basestring field_name: text representation of the field name
@@ -342,41 +378,18 @@ class ODMFilterMixin(FilterMixin):
         else:
             query = default_query
 
+        # Keyset pagination narrows the query itself rather than skipping over earlier pages
+        get_cursor_query = getattr(getattr(self, 'paginator', None), 'get_cursor_query', None)
+        cursor_query = get_cursor_query(self.request, self) if get_cursor_query else None
+        if cursor_query:
+            query = query & cursor_query if query else cursor_query
+
         return query
 
     def query_params_to_odm_query(self, query_params):
         """Convert query params to a modularodm Query object."""
         filters = self.parse_query_params(query_params)
-        if filters:
-            query_parts = []
-            for key, field_names in filters.iteritems():
-                sub_query_parts = []
-                for field_name, data in field_names.iteritems():
-                    # Query based on the DB field, not the name of the serializer parameter
-                    if isinstance(data, list):
-                        sub_query = functools.reduce(operator.and_, [
-                            Q(item['source_field_name'], item['op'], item['value'])
-                            for item in data
-                        ])
-                    else:
-                        sub_query = Q(data['source_field_name'], data['op'], data['value'])
-
-                    sub_query_parts.append(sub_query)
-
-                try:
-                    sub_query = functools.reduce(operator.or_, sub_query_parts)
-                    query_parts.append(sub_query)
-                except TypeError:
-                    continue
-
-            try:
-                query = functools.reduce(operator.and_, query_parts)
-            except TypeError:
-                query = None
-        else:
-            query = None
-
-        return query
+        return self.filters_to_odm_query(filters)
 
 
 class ListFilterMixin(FilterMixin):
@@ -385,17 +398,30 @@ class ListFilterMixin(FilterMixin):
 
     Subclasses must define `get_default_queryset()`.
 
+    Subclasses whose default result set lives in a collection may instead define `get_default_odm_query()`
+    and `model_class`. Filters on stored fields are then compiled into that query and run by the database;
+    any remaining filters are applied in a single pass over the results. Stored fields whose value is
+    computed by the model rather than read from the database must be listed in `computed_fields`.
+
+    Every filtered field must match, including the fields named together in one `filter[a,b]` key.
+
     Serializers that want to restrict which fields are used for filtering need to have a variable called
     filterable_fields which is a frozenset of strings representing the field names as they appear in the serialization.
     """
     FILTERS = {
         'eq': operator.eq,
+        'ne': operator.ne,
         'lt': operator.lt,
         'lte': operator.le,
         'gt': operator.gt,
         'gte': operator.ge
     }
 
+    model_class = None
+    # Source field names that are in the schema but not stored as they are serialized, so they are
+    # never filtered by the database
+    computed_fields = frozenset()
+
     def __init__(self, *args, **kwargs):
         super(FilterMixin, self).__init__(*args, **kwargs)
         if not self.serializer_class:
@@ -404,68 +430,145 @@ class ListFilterMixin(FilterMixin):
     def get_default_queryset(self):
         raise NotImplementedError('Must define get_default_queryset')
 
+    def get_default_odm_query(self):
+        """Return the MODM query for the default result set, or None if it is not backed by `model_class`.
+
+        NOTE: If the client provides additional filters in query params, the filters
+        will be intersected with this query.
+        """
+        return None
+
     def get_queryset_from_request(self):
-        default_queryset = self.get_default_queryset()
+        default_query = self.get_default_odm_query()
+        if default_query is not None:
+            default_queryset = self.model_class.find(default_query)
+        else:
+            default_queryset = self.get_default_queryset()
+
         if not self.kwargs.get('is_embedded') and self.request.query_params:
-            param_queryset = self.param_queryset(self.request.query_params, default_queryset)
+            param_queryset = self.param_queryset(self.request.query_params, default_queryset, default_query)
             return param_queryset
         else:
             return default_queryset
 
-    def param_queryset(self, query_params, default_queryset):
-        """filters default queryset based on query parameters"""
+    def param_queryset(self, query_params, default_queryset, default_query=None):
+        """filters default queryset based on query parameters
+
+        If `default_query` is given, filters on stored fields are pushed down into it. The rest are
+        applied in one pass over the queryset, which keeps its original ordering.
+        """
         filters = self.parse_query_params(query_params)
-        queryset = set(default_queryset)
+        if not filters:
+            return default_queryset
+        # Fields named in one filter key are AND-ed like separate keys, so give each its own key
+        filters = {
+            (key, field_name): {field_name: data}
+            for key, field_names in filters.iteritems()
+            for field_name, data in field_names.iteritems()
+        }
+
+        if default_query is not None:
+            odm_filters, filters = self.partition_filters(filters, default_queryset.schema)
+            param_query = self.filters_to_odm_query(odm_filters)
+            if param_query is not None:
+                default_queryset = self.model_class.find(default_query & param_query)
+            if not filters:
+                return default_queryset
 
-        if filters:
-            for key, field_names in filters.iteritems():
-                for field_name, data in field_names.iteritems():
-                    queryset = queryset.intersection(set(self.get_filtered_queryset(field_name, data, default_queryset)))
+        predicate = self.filters_to_predicate(filters)
+        return [item for item in default_queryset if predicate(item)]
 
-        return list(queryset)
+    def partition_filters(self, filters, schema):
+        """Split parsed filters into those the database can evaluate against `schema` and those it can't.
+
+        A filter is only pushed down if every field it names maps onto a stored, non-list field that is
+        not one of `computed_fields`.
+
+        :return tuple: (odm_filters, python_filters), both in the format returned by `parse_query_params`
+        """
+        odm_filters, python_filters = {}, {}
+        for key, field_names in filters.iteritems():
+            if all(self._is_stored_field(field_name, data, schema) for field_name, data in field_names.iteritems()):
+                odm_filters[key] = field_names
+            else:
+                python_filters[key] = field_names
+        return odm_filters, python_filters
+
+    def _is_stored_field(self, field_name, params, schema):
+        field = utils.decompose_field(self.serializer_class._declared_fields[field_name])
+        if isinstance(field, (ser.SerializerMethodField, ) + self.LIST_FIELDS):
+            return False
+        if not isinstance(params, list):
+            params = [params]
+        return all(
+            item['source_field_name'] in schema._fields and item['source_field_name'] not in self.computed_fields
+            for item in params
+        )
+
+    def filters_to_predicate(self, filters):
+        """Compile parsed filters into a single function that tests one item against every filtered field."""
+        predicates = [
+            self.get_filter_predicate(field_name, data)
+            for field_names in filters.itervalues()
+            for field_name, data in field_names.iteritems()
+        ]
+
+        def predicate(item):
+            return all(field_predicate(item) for field_predicate in predicates)
+        return predicate
 
     def get_filtered_queryset(self, field_name, params, default_queryset):
         """filters default queryset based on the serializer field type"""
+        predicate = self.get_filter_predicate(field_name, params)
+        return [item for item in default_queryset if predicate(item)]
+
+    def get_filter_predicate(self, field_name, params):
+        """Return a function that tests a single item against one parsed filter, based on the serializer field type"""
+        if isinstance(params, list):
+            # Ambiguous dates are parsed into a range of comparisons that must all hold
+            predicates = [self.get_filter_predicate(field_name, item) for item in params]
+            return lambda item: all(predicate(item) for predicate in predicates)
+
         field = self.serializer_class._declared_fields[field_name]
         source_field_name = params['source_field_name']
 
         if isinstance(field, ser.SerializerMethodField):
-            return_val = [
-                item for item in default_queryset
-                if self.FILTERS[params['op']](self.get_serializer_method(field_name)(item), params['value'])
-            ]
+            compare = self.FILTERS[params['op']]
+            serializer_method = self.get_serializer_method(field_name)
+
+            def predicate(item):
+                return compare(serializer_method(item), params['value'])
         elif isinstance(field, ser.CharField):
             if source_field_name in ('_id', 'root'):
                 # Param parser treats certain ID fields as bulk queries: a list of options, instead of just one
                 # Respect special-case behavior, and enforce exact match for these list fields.
                 options = set(item.lower() for item in params['value'])
-                return_val = [
-                    item for item in default_queryset
-                    if getattr(item, source_field_name, '') in options
-                ]
+
+                def predicate(item):
+                    return getattr(item, source_field_name, '') in options
             else:
+                value = params['value'].lower()
+
                 # TODO: What is {}.lower()? Possible bug
-                return_val = [
-                    item for item in default_queryset
-                    if params['value'].lower() in getattr(item, source_field_name, {}).lower()
-                ]
+                def predicate(item):
+                    return value in getattr(item, source_field_name, {}).lower()
         elif isinstance(field, ser.ListField):
-            return_val = [
-                item for item in default_queryset
-                if params['value'].lower() in [
+            value = params['value'].lower()
+
+            def predicate(item):
+                return value in [
                     lowercase(i.lower) for i in getattr(item, source_field_name, [])
                 ]
-            ]
         else:
-            try:
-                return_val = [
-                    item for item in default_queryset
-                    if self.FILTERS[params['op']](getattr(item, source_field_name, None), params['value'])
-                ]
-            except TypeError:
-                raise InvalidFilterValue(detail='Could not apply filter to specified field')
+            compare = self.FILTERS[params['op']]
+
+            def predicate(item):
+                try:
+                    return compare(getattr(item, source_field_name, None), params['value'])
+                except TypeError:
+                    raise InvalidFilterValue(detail='Could not apply filter to specified field')
 
-        return return_val
+        return predicate
 
     def get_serializer_method(self, field_name):
         """
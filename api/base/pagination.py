@@ -1,3 +1,8 @@
+import json
+import base64
+import datetime
+import functools
+import operator
 from django.utils import six
 from collections import OrderedDict
 from django.core.urlresolvers import reverse
@@ -9,6 +14,11 @@ from rest_framework.response import Response
 from rest_framework.utils.urls import (
     replace_query_param, remove_query_param
 )
+from dateutil import parser as date_parser
+from modularodm import Q
+
+from api.base import utils
+from api.base.exceptions import InvalidQueryStringError
 from api.base.serializers import is_anonymized
 from api.base.settings import MAX_PAGE_SIZE
 
@@ -16,17 +26,175 @@ from framework.guid.model import Guid
 from website.project.model import Node, Comment
 
 
+def encode_cursor(position, reverse=False):
+    """Encode the sort key of a boundary item into an opaque `page[cursor]` value.
+
+    :param list position: values of the view's `cursor_ordering` fields for the item
+    :param bool reverse: whether the cursor points backwards (i.e. is a `prev` link)
+    """
+    dates = [isinstance(value, datetime.datetime) for value in position]
+    payload = {
+        'p': [value.isoformat() if is_date else value for value, is_date in zip(position, dates)],
+        'd': dates,
+        'r': reverse,
+    }
+    return base64.urlsafe_b64encode(json.dumps(payload))
+
+
+def decode_cursor(cursor):
+    """Decode a `page[cursor]` value created by `encode_cursor`.
+
+    :return tuple: (position, reverse)
+    :raises InvalidQueryStringError: if the cursor was not created by `encode_cursor`
+    """
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(str(cursor)))
+        position = [
+            date_parser.parse(value) if is_date else value
+            for value, is_date in zip(payload['p'], payload['d'])
+        ]
+        return position, bool(payload['r'])
+    except (TypeError, ValueError, KeyError):
+        raise InvalidQueryStringError(parameter='page[cursor]', detail='Invalid cursor.')
+
+
+def keyset_query(ordering, position, reverse=False):
+    """Build a query for the items after `position` in `ordering`, or before it if `reverse`.
+
+    For an ordering of `('-date_modified', '-_id')` this is
+    `date_modified < d OR (date_modified == d AND _id < id)`.
+    """
+    clauses = []
+    for index, key in enumerate(ordering):
+        descending = key.startswith('-')
+        op = 'lt' if descending != reverse else 'gt'
+        clause = Q(key.lstrip('-'), op, position[index])
+        for previous_key, value in zip(ordering[:index], position[:index]):
+            clause = Q(previous_key.lstrip('-'), 'eq', value) & clause
+        clauses.append(clause)
+    return functools.reduce(operator.or_, clauses)
+
+
 class JSONAPIPagination(pagination.PageNumberPagination):
     """
     Custom paginator that formats responses in a JSON-API compatible format.
 
     Properly handles pagination of embedded objects.
 
+    Views that define `cursor_ordering` (a unique sort, e.g. `('-date_modified', '-_id')`) also support
+    keyset pagination: passing `page[cursor]` (empty for the first page) returns opaque `next`/`prev`
+    cursor links and avoids the count and skip of page-number pagination. The total is only computed
+    if `page[total]=true` is also passed. Cursor pagination always uses `cursor_ordering`, ignoring `sort`.
     """
 
     page_size_query_param = 'page[size]'
     max_page_size = MAX_PAGE_SIZE
 
+    cursor_query_param = 'page[cursor]'
+    cursor_total_query_param = 'page[total]'
+
+    cursor_mode = False
+    # Set while counting the total, which must not be narrowed by the cursor
+    ignore_cursor = False
+
+    def uses_cursor(self, request, view):
+        return (
+            getattr(view, 'cursor_ordering', None) is not None and
+            self.cursor_query_param in request.query_params and
+            not request.parser_context['kwargs'].get('is_embedded')
+        )
+
+    def get_cursor_query(self, request, view):
+        """Return the keyset query for the requested cursor, or None if not paginating by cursor.
+
+        Called by `ODMFilterMixin` so the keyset condition is part of the view's database query.
+        """
+        if self.ignore_cursor or not self.uses_cursor(request, view):
+            return None
+        cursor = request.query_params[self.cursor_query_param]
+        if not cursor:
+            return None
+        position, reverse = decode_cursor(cursor)
+        if len(position) != len(view.cursor_ordering):
+            raise InvalidQueryStringError(parameter=self.cursor_query_param, detail='Invalid cursor.')
+        return keyset_query(view.cursor_ordering, position, reverse)
+
+    def get_cursor_position(self, item):
+        return [getattr(item, key.lstrip('-')) for key in self.cursor_ordering]
+
+    def cursor_query(self, url, cursor):
+        url = remove_query_param(self.request.build_absolute_uri(url), '_')
+        url = remove_query_param(url, self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_next_cursor_link(self, url):
+        if not self.has_next_cursor or not self.cursor_page:
+            return None
+        return self.cursor_query(url, encode_cursor(self.get_cursor_position(self.cursor_page[-1])))
+
+    def get_previous_cursor_link(self, url):
+        if not self.has_previous_cursor or not self.cursor_page:
+            return None
+        return self.cursor_query(url, encode_cursor(self.get_cursor_position(self.cursor_page[0]), reverse=True))
+
+    def paginate_queryset_by_cursor(self, queryset, request, view):
+        """Return one page of a queryset after the keyset query from `get_cursor_query` has been applied.
+
+        One extra item is fetched to find out whether there is another page in the same direction.
+        """
+        self.cursor_mode = True
+        self.request = request
+        self.cursor_ordering = view.cursor_ordering
+        self.cursor_page_size = self.get_page_size(request)
+
+        cursor = request.query_params[self.cursor_query_param]
+        reverse = decode_cursor(cursor)[1] if cursor else False
+        ordering = self.cursor_ordering
+        if reverse:
+            ordering = [key.lstrip('-') if key.startswith('-') else '-' + key for key in ordering]
+
+        results = list(queryset.sort(*ordering)[:self.cursor_page_size + 1])
+        has_more = len(results) > self.cursor_page_size
+        results = results[:self.cursor_page_size]
+        if reverse:
+            results.reverse()
+
+        self.has_next_cursor = True if reverse else has_more
+        self.has_previous_cursor = has_more if reverse else bool(cursor)
+
+        if utils.is_truthy(request.query_params.get(self.cursor_total_query_param, False)):
+            self.cursor_total = self.count_without_cursor(view)
+        else:
+            self.cursor_total = None
+
+        self.cursor_page = results
+        return results
+
+    def count_without_cursor(self, view):
+        """Count every item matching the view's filters, on all pages, by rebuilding its queryset
+        without the keyset condition.
+        """
+        self.ignore_cursor = True
+        try:
+            return view.get_queryset().count()
+        finally:
+            self.ignore_cursor = False
+
+    def get_cursor_response_dict(self, data, url):
+        meta = OrderedDict([('per_page', self.cursor_page_size)])
+        if self.cursor_total is not None:
+            meta['total'] = self.cursor_total
+        return OrderedDict([
+            ('data', data),
+            ('links', OrderedDict([
+                ('first', self.cursor_query(url, '')),
+                ('last', None),
+                ('prev', self.get_previous_cursor_link(url)),
+                ('next', self.get_next_cursor_link(url)),
+                ('meta', meta)
+            ])),
+        ])
+
     def page_number_query(self, url, page_number):
         """
         Builds uri and adds page param.
@@ -91,7 +259,10 @@ class JSONAPIPagination(pagination.PageNumberPagination):
         if embedded:
             reversed_url = reverse(view_name, kwargs=kwargs)
 
-        response_dict = self.get_response_dict(data, reversed_url)
+        if self.cursor_mode:
+            response_dict = self.get_cursor_response_dict(data, reversed_url)
+        else:
+            response_dict = self.get_response_dict(data, reversed_url)
 
         if is_anonymized(self.request):
             if response_dict.get('meta', False):
@@ -106,6 +277,9 @@ class JSONAPIPagination(pagination.PageNumberPagination):
 
         If this is an embedded resource, returns first page, ignoring query params.
         """
+        if self.uses_cursor(request, view):
+            return self.paginate_queryset_by_cursor(queryset, request, view)
+
         if request.parser_context['kwargs'].get('is_embedded'):
             paginator = DjangoPaginator(queryset, self.page_size)
             page_number = 1
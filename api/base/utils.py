@@ -135,7 +135,13 @@ def default_node_list_query():
 def default_node_permission_query(user):
     permission_query = Q('is_public', 'eq', True)
     if not user.is_anonymous():
-        permission_query = (permission_query | Q('contributors', 'eq', user._id))
+        # Covers contributors as well as admins of a parent node, matching Node.can_view
+        permission_query = (permission_query | Q('effective_reader_ids', 'eq', user._id))
+        # Nodes not indexed yet (see scripts/migration/migrate_node_effective_permissions.py)
+        # are only visible to their contributors
+        permission_query = permission_query | (
+            Q('effective_reader_ids', 'exists', False) & Q('contributors', 'eq', user._id)
+        )
 
     return permission_query
 
@@ -1,4 +1,5 @@
 import weakref
+import collections
 from django.conf import settings as django_settings
 from django.http import JsonResponse
 from rest_framework.decorators import api_view
@@ -7,6 +8,7 @@ from rest_framework import generics
 from rest_framework import status
 from rest_framework import permissions as drf_permissions
 from rest_framework.exceptions import ValidationError, NotFound
+from modularodm import Q, fields
 
 from framework.auth.oauth_scopes import CoreScopes
 
@@ -19,11 +21,12 @@ from api.users.serializers import UserSerializer
 from api.base.parsers import JSONAPIRelationshipParser
 from api.base.parsers import JSONAPIRelationshipParserForRegularJSON
 from api.base.requests import EmbeddedRequest
-from api.base.serializers import LinkedNodesRelationshipSerializer
+from api.base.serializers import LinkedNodesRelationshipSerializer, _tpl
 from api.base import utils
 from api.nodes.permissions import ReadOnlyIfRegistration
 from api.nodes.permissions import ContributorOrPublicForRelationshipPointers
 from api.base.utils import is_bulk_request, get_user_auth
+from website.models import Node, User, Comment, NodeLog
 
 
 CACHE = weakref.WeakKeyDictionary()
@@ -37,10 +40,106 @@ class JSONAPIBaseView(generics.GenericAPIView):
         self.view_fqn = ':'.join([self.view_category, self.view_name])
         super(JSONAPIBaseView, self).__init__(**kwargs)
 
+    # Models looked up by the URL kwargs of embeddable views. Used to load the objects that the
+    # embedded views of a page look up with one query per model rather than one per item.
+    EMBED_PREFETCH_MODELS = {
+        'node_id': Node,
+        'user_id': User,
+        'comment_id': Comment,
+        'log_id': NodeLog,
+    }
+
+    def _get_embed_fields(self):
+        """Return a dict of the serializer fields to embed for this request, keyed on field name.
+        Includes fields flagged as `always_embed` and excludes those flagged as `never_embed`.
+        """
+        if self.kwargs.get('is_embedded'):
+            embeds = []
+        else:
+            embeds = self.request.query_params.getlist('embed')
+
+        fields_check = self.serializer_class._declared_fields.copy()
+
+        for field in fields_check:
+            if getattr(fields_check[field], 'field', None):
+                fields_check[field] = fields_check[field].field
+
+        for field in fields_check:
+            if getattr(fields_check[field], 'always_embed', False) and field not in embeds:
+                embeds.append(unicode(field))
+            if getattr(fields_check[field], 'never_embed', False) and field in embeds:
+                embeds.remove(field)
+
+        return {embed: fields_check.get(embed) for embed in embeds}
+
+    def _prefetch_embeds(self, items):
+        """Load the objects that the embedded views of `items` will look up by their URL kwargs, with
+        one `_id $in` query per model: first the objects the kwargs are read from through a foreign
+        field of the item (e.g. the parent of a node for `<parent_node._id>`), then the objects the
+        kwargs name (e.g. that parent, for the node detail view).
+
+        The embedded views still do their own lookups and permission checks, but those lookups are
+        then served from the ODM's object cache instead of issuing a query per item. This only covers
+        the object each embedded view is given: list embeds such as `contributors` still query their
+        contents once per item.
+        """
+        embed_fields = [
+            (field_name, field) for field_name, field in self._get_embed_fields().items()
+            if getattr(field, 'resolve', None) is not None
+        ]
+        if not embed_fields:
+            return
+
+        keys = collections.defaultdict(set)
+        for field_name, field in embed_fields:
+            lookup_kwargs = getattr(field, 'lookup_url_kwarg', None)
+            if not isinstance(lookup_kwargs, dict):
+                continue
+            for item in items:
+                for lookup_field in lookup_kwargs.values():
+                    attr = _tpl(lookup_field) if isinstance(lookup_field, basestring) else None
+                    foreign_field = attr and getattr(type(item), '_fields', {}).get(attr.split('.')[0])
+                    if isinstance(foreign_field, fields.ForeignField):
+                        value = foreign_field._get_underlying_data(item)
+                        model = foreign_field.base_class
+                        if value and not model._is_cached(value):
+                            keys[model].add(value)
+        self._load_all(keys)
+
+        keys = collections.defaultdict(set)
+        for field_name, field in embed_fields:
+            for item in items:
+                try:
+                    view_kwargs = field.resolve(item, field_name)[2]
+                except Exception:
+                    # Best effort only; the embed itself will surface any error
+                    continue
+                for kwarg, value in view_kwargs.items():
+                    model = self.EMBED_PREFETCH_MODELS.get(kwarg)
+                    if model and value and not model._is_cached(value):
+                        keys[model].add(value)
+        self._load_all(keys)
+
+    def _load_all(self, keys):
+        """Populate the object cache with the objects of a `{model: primary keys}` dict."""
+        for model, primary_keys in keys.items():
+            # Iterating the queryset is what populates the object cache
+            list(model.find(Q('_id', 'in', list(primary_keys))))
+
+    # overrides GenericAPIView
+    def paginate_queryset(self, queryset):
+        page = super(JSONAPIBaseView, self).paginate_queryset(queryset)
+        if page is not None and not self.kwargs.get('is_embedded'):
+            self._prefetch_embeds(page)
+        return page
+
     def _get_embed_partial(self, field_name, field):
         """Create a partial function to fetch the values of an embedded field. A basic
         example is to include a Node's children in a single response.
 
+        Results are cached per resolved view and URL kwargs, so items that embed the same
+        resource (e.g. siblings embedding their parent) only dispatch one sub-view.
+
         :param str field_name: Name of field of the view's serializer_class to load
         results for
         :return function object -> dict:
@@ -52,6 +151,12 @@ class JSONAPIBaseView(generics.GenericAPIView):
             v, view_args, view_kwargs = field.resolve(item, field_name)
             if not v:
                 return None
+
+            _cache_key = (v.cls, field_name, tuple(view_args), frozenset(view_kwargs.items()))
+            if _cache_key in CACHE.setdefault(self.request._request, {}):
+                # We already have the result for this embed, return it
+                return CACHE[self.request._request][_cache_key]
+
             if isinstance(self.request._request, EmbeddedRequest):
                 request = self.request._request
             else:
@@ -71,11 +176,6 @@ class JSONAPIBaseView(generics.GenericAPIView):
             view.request.parser_context['kwargs'] = view_kwargs
             view.format_kwarg = view.get_format_suffix(**view_kwargs)
 
-            _cache_key = (v.cls, field_name, view.get_serializer_class(), item)
-            if _cache_key in CACHE.setdefault(self.request._request, {}):
-                # We already have the result for this embed, return it
-                return CACHE[self.request._request][_cache_key]
-
             # Cache serializers. to_representation of a serializer should NOT augment it's fields so resetting the context
             # should be sufficient for reuse
             if not view.get_serializer_class() in CACHE.setdefault(self.request._request, {}):
@@ -117,25 +217,8 @@ class JSONAPIBaseView(generics.GenericAPIView):
          multiple levels of nesting.
         """
         context = super(JSONAPIBaseView, self).get_serializer_context()
-        if self.kwargs.get('is_embedded'):
-            embeds = []
-        else:
-            embeds = self.request.query_params.getlist('embed')
-
-        fields_check = self.serializer_class._declared_fields.copy()
-
-        for field in fields_check:
-            if getattr(fields_check[field], 'field', None):
-                fields_check[field] = fields_check[field].field
-
-        for field in fields_check:
-            if getattr(fields_check[field], 'always_embed', False) and field not in embeds:
-                embeds.append(unicode(field))
-            if getattr(fields_check[field], 'never_embed', False) and field in embeds:
-                embeds.remove(field)
         embeds_partials = {}
-        for embed in embeds:
-            embed_field = fields_check.get(embed)
+        for embed, embed_field in self._get_embed_fields().items():
             embeds_partials[embed] = self._get_embed_partial(embed, embed_field)
 
         context.update({
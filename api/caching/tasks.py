@@ -1,85 +1,192 @@
+import collections
+import re
+import threading
 import urlparse
 
 import requests
 import logging
+from gevent.pool import Pool
 from website.project.model import Comment
 
+from framework.postcommit_tasks.handlers import enqueue_postcommit_task, postcommit_queue
 from website import settings
 
 logger = logging.getLogger(__name__)
 
+_local = threading.local()
+
+# Characters that would change the meaning of a path inside a ban regex
+_REGEX_SPECIAL = re.compile(r'([\\.^$*+?{}\[\]|()])')
+
+# Running totals of ban results for this process
+ban_stats = collections.Counter()
+
 
 def get_varnish_servers():
     #  TODO: this should get the varnish servers from HAProxy or a setting
     return settings.VARNISH_SERVERS
 
 
-def get_bannable_urls(instance):
-    bannable_urls = []
-    parsed_absolute_url = {}
-
+def get_bannable_paths(instance):
+    """Return ``(paths, hostname)`` for the API paths that must be banned
+    when ``instance`` changes.
+    """
     if not hasattr(instance, 'absolute_api_v2_url'):
         logger.warning('Tried to ban {}:{} but it didn\'t have a absolute_api_v2_url method'.format(instance.__class__, instance))
         return [], ''
 
+    parsed_absolute_url = urlparse.urlparse(instance.absolute_api_v2_url)
+    bannable_paths = [parsed_absolute_url.path]
+    if isinstance(instance, Comment):
+        try:
+            bannable_paths.append(urlparse.urlparse(instance.target.referent.absolute_api_v2_url).path)
+        except AttributeError:
+            # some referents don't have an absolute_api_v2_url
+            # I'm looking at you NodeWikiPage
+            pass
+
+        try:
+            bannable_paths.append(urlparse.urlparse(instance.root_target.referent.absolute_api_v2_url).path)
+        except AttributeError:
+            # some root_targets don't have an absolute_api_v2_url
+            pass
+
+    return bannable_paths, parsed_absolute_url.hostname
+
+
+def get_bannable_urls(instance):
+    bannable_paths, hostname = get_bannable_paths(instance)
+    bannable_urls = []
     for host in get_varnish_servers():
-        # add instance url
         varnish_parsed_url = urlparse.urlparse(host)
-        parsed_absolute_url = urlparse.urlparse(instance.absolute_api_v2_url)
-        url_string = '{scheme}://{netloc}{path}.*'.format(scheme=varnish_parsed_url.scheme,
-                                                          netloc=varnish_parsed_url.netloc,
-                                                          path=parsed_absolute_url.path)
-        bannable_urls.append(url_string)
-        if isinstance(instance, Comment):
-            try:
-                parsed_target_url = urlparse.urlparse(instance.target.referent.absolute_api_v2_url)
-            except AttributeError:
-                # some referents don't have an absolute_api_v2_url
-                # I'm looking at you NodeWikiPage
-                pass
-            else:
-                url_string = '{scheme}://{netloc}{path}.*'.format(scheme=varnish_parsed_url.scheme,
-                                                                  netloc=varnish_parsed_url.netloc,
-                                                                  path=parsed_target_url.path)
-                bannable_urls.append(url_string)
-
-            try:
-                parsed_root_target_url = urlparse.urlparse(instance.root_target.referent.absolute_api_v2_url)
-            except AttributeError:
-                # some root_targets don't have an absolute_api_v2_url
-                pass
-            else:
-                url_string = '{scheme}://{netloc}{path}.*'.format(scheme=varnish_parsed_url.scheme,
-                                                              netloc=varnish_parsed_url.netloc,
-                                                              path=parsed_root_target_url.path)
-                bannable_urls.append(url_string)
-
-    return bannable_urls, parsed_absolute_url.hostname
+        for path in bannable_paths:
+            bannable_urls.append('{scheme}://{netloc}{path}.*'.format(scheme=varnish_parsed_url.scheme,
+                                                                      netloc=varnish_parsed_url.netloc,
+                                                                      path=path))
+    return bannable_urls, hostname
+
+
+def merge_ban_patterns(paths, max_length=None):
+    """Collapse ``paths`` into as few ban regexes as fit in ``max_length``
+    characters. Paths already covered by a shorter prefix are dropped, and
+    the remainder are joined into alternations, e.g. ``/(v2/nodes/abc12/|v2/users/def34/).*``.
+    """
+    max_length = max_length or settings.VARNISH_BAN_MAX_LENGTH
+    prefixes = []
+    for path in sorted(set(paths)):
+        if prefixes and path.startswith(prefixes[-1]):
+            continue
+        prefixes.append(path)
+
+    patterns = []
+    group = []
+    size = 0
+    for prefix in prefixes:
+        escaped = _REGEX_SPECIAL.sub(r'\\\1', prefix.lstrip('/'))
+        if group and size + len(escaped) + 1 > max_length:
+            patterns.append('/({}).*'.format('|'.join(group)))
+            group, size = [], 0
+        group.append(escaped)
+        size += len(escaped) + 1
+    if group:
+        patterns.append('/({}).*'.format('|'.join(group)))
+    return patterns
+
+
+def _send_ban(server, pattern, hostname):
+    parsed_server = urlparse.urlparse(server)
+    url_to_ban = '{scheme}://{netloc}{pattern}'.format(scheme=parsed_server.scheme,
+                                                       netloc=parsed_server.netloc,
+                                                       pattern=pattern)
+    # requests would percent-encode the ``|`` in the regex, so set the url
+    # on the prepared request directly
+    prepared = requests.Request('BAN', url_to_ban, headers=dict(Host=hostname)).prepare()
+    prepared.url = url_to_ban
+    try:
+        response = requests.Session().send(prepared, timeout=settings.VARNISH_BAN_TIMEOUT)
+    except Exception as ex:
+        logger.error('Banning {} failed: {}'.format(
+            url_to_ban,
+            ex.message
+        ))
+        return False
+    if not response.ok:
+        logger.error('Banning {} failed: {}'.format(
+            url_to_ban,
+            response.text
+        ))
+        return False
+    return True
+
+
+def send_bans(paths_by_hostname):
+    """Send merged bans for ``{hostname: paths}`` to every Varnish server
+    concurrently and record the outcome in ``ban_stats``.
+    """
+    jobs = []
+    pool = Pool(settings.VARNISH_BAN_POOL_SIZE)
+    for hostname, paths in paths_by_hostname.items():
+        for pattern in merge_ban_patterns(paths):
+            for server in get_varnish_servers():
+                jobs.append(pool.spawn(_send_ban, server, pattern, hostname))
+    pool.join()
+
+    succeeded = sum(1 for job in jobs if job.value)
+    failed = len(jobs) - succeeded
+    ban_stats['paths'] += sum(len(paths) for paths in paths_by_hostname.values())
+    ban_stats['succeeded'] += succeeded
+    ban_stats['failed'] += failed
+    logger.info('Sent {} bans for {} paths: {} succeeded, {} failed'.format(
+        len(jobs),
+        sum(len(paths) for paths in paths_by_hostname.values()),
+        succeeded,
+        failed
+    ))
+    return succeeded, failed
+
+
+class BanBatch(object):
+    """Bannable paths collected over one request, keyed by hostname."""
+
+    def __init__(self):
+        self.paths = collections.defaultdict(set)
+        self.key = None
+
+    def add(self, instance):
+        bannable_paths, hostname = get_bannable_paths(instance)
+        self.paths[hostname].update(bannable_paths)
+
+    def dispatch(self):
+        paths, self.paths = self.paths, collections.defaultdict(set)
+        if paths:
+            send_bans(paths)
+
+
+def _current_batch():
+    batch = getattr(_local, 'ban_batch', None)
+    # A batch belongs to the post-commit queue it was enqueued on; once that
+    # queue has been reset for a new request, start a new batch
+    if batch is None or batch.key not in postcommit_queue():
+        batch = BanBatch()
+        batch.key = enqueue_postcommit_task(_dispatch_batch, (batch, ), {}, celery=False, once_per_request=True)
+        _local.ban_batch = batch
+    return batch
+
+
+def _dispatch_batch(batch):
+    batch.dispatch()
+
+
+def ban_object(instance):
+    """Ban ``instance``'s API urls once the current request has committed.
+    Every object banned during a request is sent in the same batch.
+    """
+    if settings.ENABLE_VARNISH:
+        _current_batch().add(instance)
 
 
 def ban_url(instance):
-    # TODO: Refactor; Pull url generation into postcommit_task handling so we only ban urls once per request
-    timeout = 0.3  # 300ms timeout for bans
+    """Ban ``instance``'s API urls immediately."""
     if settings.ENABLE_VARNISH:
-        bannable_urls, hostname = get_bannable_urls(instance)
-
-        for url_to_ban in set(bannable_urls):
-            try:
-                response = requests.request('BAN', url_to_ban, timeout=timeout, headers=dict(
-                    Host=hostname
-                ))
-            except Exception as ex:
-                logger.error('Banning {} failed: {}'.format(
-                    url_to_ban,
-                    ex.message
-                ))
-            else:
-                if not response.ok:
-                    logger.error('Banning {} failed: {}'.format(
-                        url_to_ban,
-                        response.text
-                    ))
-                else:
-                    logger.info('Banning {} succeeded'.format(
-                        url_to_ban
-                    ))
+        bannable_paths, hostname = get_bannable_paths(instance)
+        send_bans({hostname: bannable_paths})
@@ -10,11 +10,36 @@ import requests
 from django.conf import settings as django_settings
 from requests.auth import HTTPBasicAuth
 
+from api.caching.tasks import merge_ban_patterns
 from framework.auth import User
 from tests.factories import create_fake_project
 from tests.base import DbTestCase
 
 
+class TestMergeBanPatterns(unittest.TestCase):
+
+    def test_covered_paths_are_dropped(self):
+        patterns = merge_ban_patterns([
+            '/v2/nodes/abc12/',
+            '/v2/nodes/abc12/contributors/',
+            '/v2/users/def34/',
+            '/v2/nodes/abc12/',
+        ])
+        assert patterns == ['/(v2/nodes/abc12/|v2/users/def34/).*']
+
+    def test_patterns_are_split_at_max_length(self):
+        paths = ['/v2/nodes/{}/'.format(i) for i in range(10, 20)]
+        patterns = merge_ban_patterns(paths, max_length=40)
+        assert len(patterns) > 1
+        for pattern in patterns:
+            assert len(pattern) <= 40 + len('/().*')
+        banned = '|'.join(pattern[2:-3] for pattern in patterns).split('|')
+        assert sorted(banned) == sorted(path.lstrip('/') for path in paths)
+
+    def test_regex_characters_are_escaped(self):
+        assert merge_ban_patterns(['/v2/files/a.b/']) == ['/(v2/files/a\\.b/).*']
+
+
 # import datadiff
 # from datadiff import tools
 
@@ -1,3 +1,5 @@
+import collections
+
 from django.core.urlresolvers import resolve, reverse
 import furl
 from rest_framework import serializers as ser
@@ -8,7 +10,7 @@ from modularodm import Q
 from framework.auth.core import Auth, User
 from website import settings
 
-from website.files.models import FileNode
+from website.files.models import File, FileNode
 from website.project.model import Comment
 from website.util import api_v2_url
 
@@ -17,6 +19,7 @@ from api.base.serializers import (
     format_relationship_links,
     IDField,
     JSONAPIListField,
+    JSONAPIListSerializer,
     JSONAPISerializer,
     Link,
     LinksField,
@@ -103,6 +106,18 @@ class FileTagField(ser.Field):
         return data
 
 
+class FileListSerializer(JSONAPIListSerializer):
+    def to_representation(self, data):
+        if not isinstance(data, collections.Mapping):
+            data = list(data)
+            # Look up the download counts of the whole page at once
+            File.prefetch_download_counts([
+                obj for obj in data
+                if obj.provider == 'osfstorage' and obj.is_file
+            ])
+        return super(FileListSerializer, self).to_representation(data)
+
+
 class FileSerializer(JSONAPISerializer):
     filterable_fields = frozenset([
         'id',
@@ -255,6 +270,12 @@ class FileSerializer(JSONAPISerializer):
         instance.save()
         return instance
 
+    # overrides JSONAPISerializer
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        kwargs['child'] = cls()
+        return FileListSerializer(*args, **kwargs)
+
     def is_valid(self, **kwargs):
         return super(FileSerializer, self).is_valid(clean_html=False, **kwargs)
 
@@ -3,6 +3,8 @@ from rest_framework import permissions
 
 from website.models import NodeLog
 
+from api.base.utils import get_user_auth
+
 from api.nodes.permissions import ContributorOrPublic
 
 
@@ -10,4 +12,7 @@ class ContributorOrPublicForLogs(permissions.BasePermission):
 
     def has_object_permission(self, request, view, obj):
         assert isinstance(obj, NodeLog), 'obj must be a NodeLog, got {}'.format(obj)
-        return ContributorOrPublic().has_object_permission(request, view, obj.node)
+        # Logs inherited by a fork are authorized against the fork when the
+        # node they were recorded on is not viewable
+        node = obj.get_viewable_node(get_user_auth(request))
+        return ContributorOrPublic().has_object_permission(request, view, node)
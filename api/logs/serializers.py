@@ -1,3 +1,5 @@
+import copy
+
 from rest_framework import serializers as ser
 
 from api.base.serializers import (
@@ -7,10 +9,40 @@ from api.base.serializers import (
     LinksField,
     is_anonymized
 )
+from api.base.utils import get_user_auth
 from website.project.model import Node
 from framework.auth.core import User
 
 
+class InheritedLog(object):
+    """A log presented under the fork that inherited it, so that nothing about
+    the node it was recorded on, which may be private, is exposed.
+    """
+
+    def __init__(self, log, node):
+        self._log = log
+        self.node = node
+        self.params = self._rebase_params(copy.deepcopy(log.params), log.node, node)
+
+    def __getattr__(self, name):
+        return getattr(self._log, name)
+
+    @staticmethod
+    def _rebase_params(params, original, node):
+        if params.get('node') == original._id:
+            params['node'] = node._id
+        if 'project' in params and params['project'] == original.parent_id:
+            params['project'] = node.parent_id
+        for key in ('source', 'destination', 'target'):
+            value = params.get(key)
+            if isinstance(value, dict) and isinstance(value.get('node'), dict) and value['node'].get('_id') == original._id:
+                value['node'] = {'_id': node._id, 'url': node.url, 'title': node.title}
+        for name, url in (params.get('urls') or {}).items():
+            if isinstance(url, basestring):
+                params['urls'][name] = url.replace('/{}/'.format(original._id), '/{}/'.format(node._id))
+        return params
+
+
 class NodeLogIdentifiersSerializer(RestrictedDictSerializer):
 
     doi = ser.CharField(read_only=True)
@@ -168,3 +200,18 @@ class NodeLogSerializer(JSONAPISerializer):
 
     def get_absolute_url(self, obj):
         return obj.absolute_url
+
+    def to_representation(self, obj, envelope='data'):
+        node = self.get_listed_node(obj)
+        if node != obj.node:
+            obj = InheritedLog(obj, node)
+        return super(NodeLogSerializer, self).to_representation(obj, envelope=envelope)
+
+    def get_listed_node(self, obj):
+        """The node to present ``obj`` under: the node whose log list it was
+        requested through, or one the requesting user can view.
+        """
+        inherited_by = self.context.get('inherited_log_owners')
+        if inherited_by is not None:
+            return obj.get_listed_node(inherited_by)
+        return obj.get_viewable_node(get_user_auth(self.context['request']))
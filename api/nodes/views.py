@@ -5,7 +5,6 @@ from rest_framework.status import HTTP_204_NO_CONTENT
 from rest_framework.response import Response
 
 from framework.auth.oauth_scopes import CoreScopes
-from framework.postcommit_tasks.handlers import enqueue_postcommit_task
 
 from api.base import generic_bulk_views as bulk_views
 from api.base import permissions as base_permissions
@@ -20,7 +19,7 @@ from api.base.exceptions import RelationshipPostMakesNoChanges, EndpointNotImple
 from api.base.pagination import CommentPagination, NodeContributorPagination, MaxSizePagination
 from api.base.utils import get_object_or_error, is_bulk_request, get_user_auth, is_truthy
 from api.base.settings import ADDONS_OAUTH, API_BASE
-from api.caching.tasks import ban_url
+from api.caching.tasks import ban_object
 from api.addons.views import AddonSettingsMixin
 from api.files.serializers import FileSerializer
 from api.comments.serializers import NodeCommentSerializer, CommentCreateSerializer
@@ -237,6 +236,9 @@ class NodeList(JSONAPIBaseView, bulk_views.BulkUpdateJSONAPIView, bulk_views.Bul
 
     + `page=<Int>` -- page number of results to view, default 1
 
+    + `page[cursor]=<Str>` -- opaque cursor taken from the `next`/`prev` links; pass it empty to start cursor pagination.
+    Deep pages are as fast as the first, results are ordered by `date_modified`, and `page[total]=true` adds the total.
+
     + `filter[<fieldname>]=<Str>` -- fields and values to filter the search results on.
 
     + `view_only=<Str>` -- Allow users with limited access keys to access this node. Note that some keys are anonymous,
@@ -265,6 +267,7 @@ class NodeList(JSONAPIBaseView, bulk_views.BulkUpdateJSONAPIView, bulk_views.Bul
     view_name = 'node-list'
 
     ordering = ('-date_modified', )  # default ordering
+    cursor_ordering = ('-date_modified', '-_id')
 
     # overrides ODMFilterMixin
     def get_default_odm_query(self):
@@ -1770,8 +1773,23 @@ class NodeFilesList(JSONAPIBaseView, generics.ListAPIView, WaterButlerMixin, Lis
     view_category = 'nodes'
     view_name = 'node-files'
 
+    model_class = FileNode
+    # osfstorage stores empty paths and computes them from the file's _id and parents
+    computed_fields = frozenset(['path', 'materialized_path'])
+
+    def get_default_odm_query(self):
+        # Don't bother going to waterbutler for osfstorage; list and filter its children in the database
+        if self.kwargs[self.provider_lookup_url_kwarg] != 'osfstorage':
+            return None
+
+        folder = self.fetch_from_waterbutler()
+        if getattr(folder, 'is_file', False):
+            # We should not have gotten a file here
+            raise NotFound
+
+        return Q('parent', 'eq', folder._id)
+
     def get_default_queryset(self):
-        # Don't bother going to waterbutler for osfstorage
         files_list = self.fetch_from_waterbutler()
 
         if isinstance(files_list, list):
@@ -2416,6 +2434,9 @@ class NodeLogList(JSONAPIBaseView, generics.ListAPIView, NodeMixin, ODMFilterMix
 
     Logs may be filtered by their `action` and `date`.
 
+    + `page[cursor]=<Str>` -- opaque cursor taken from the `next`/`prev` links; pass it empty to start cursor pagination.
+    Deep pages are as fast as the first, results are ordered by `date`, and `page[total]=true` adds the total.
+
     #This Request/Response
 
     """
@@ -2430,6 +2451,7 @@ class NodeLogList(JSONAPIBaseView, generics.ListAPIView, NodeMixin, ODMFilterMix
     log_lookup_url_kwarg = 'node_id'
 
     ordering = ('-date', )
+    cursor_ordering = ('-date', '-_id')
 
     permission_classes = (
         drf_permissions.IsAuthenticatedOrReadOnly,
@@ -2443,6 +2465,12 @@ class NodeLogList(JSONAPIBaseView, generics.ListAPIView, NodeMixin, ODMFilterMix
         query = self.get_node().get_aggregate_logs_query(auth)
         return query
 
+    def get_serializer_context(self):
+        context = super(NodeLogList, self).get_serializer_context()
+        # Present logs inherited by forks under the fork, not the original node
+        context['inherited_log_owners'] = self.get_node().get_inherited_log_owners(get_user_auth(self.request))
+        return context
+
     def get_queryset(self):
         queryset = NodeLog.find(self.get_query_from_request())
         return queryset
@@ -3111,4 +3139,4 @@ class NodeViewOnlyLinkDetail(JSONAPIBaseView, generics.RetrieveUpdateDestroyAPIV
         assert isinstance(link, PrivateLink), 'link must be a PrivateLink'
         link.is_deleted = True
         link.save()
-        enqueue_postcommit_task(ban_url, (self.get_node(),), {}, celery=True, once_per_request=True)
+        ban_object(self.get_node())
@@ -92,6 +92,9 @@ class UserList(JSONAPIBaseView, generics.ListCreateAPIView, ODMFilterMixin):
 
     + `page=<Int>` -- page number of results to view, default 1
 
+    + `page[cursor]=<Str>` -- opaque cursor taken from the `next`/`prev` links; pass it empty to start cursor pagination.
+    Deep pages are as fast as the first, results are ordered by `date_registered`, and `page[total]=true` adds the total.
+
     + `filter[<fieldname>]=<Str>` -- fields and values to filter the search results on.
 
     Users may be filtered by their `id`, `full_name`, `given_name`, `middle_names`, or `family_name`.
@@ -114,6 +117,7 @@ class UserList(JSONAPIBaseView, generics.ListCreateAPIView, ODMFilterMixin):
     serializer_class = UserSerializer
 
     ordering = ('-date_registered')
+    cursor_ordering = ('-date_registered', '-_id')
     view_category = 'users'
     view_name = 'user-list'
 
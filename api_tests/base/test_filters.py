@@ -486,6 +486,52 @@ class TestListFilterMixin(ApiTestCase):
         assert_equal(parsed_field ['value'], False)
         assert_equal(parsed_field ['op'], 'eq')
 
+    def test_param_queryset_preserves_order(self):
+        default_queryset = [
+            FakeRecord(_id=3, int_field=1),
+            FakeRecord(_id=1, int_field=1),
+            FakeRecord(_id=2, int_field=2),
+            FakeRecord(_id=4, int_field=1),
+        ]
+        filtered = self.view.param_queryset({'filter[int_field]': '1'}, default_queryset)
+        assert_equal([record._id for record in filtered], [3, 1, 4])
+
+    def test_param_queryset_multiple_filters(self):
+        default_queryset = [
+            FakeRecord(_id=1, string_field='foo', int_field=1),
+            FakeRecord(_id=2, string_field='bar', int_field=1),
+            FakeRecord(_id=3, string_field='foo', int_field=2),
+        ]
+        query_params = {
+            'filter[string_field]': 'foo',
+            'filter[int_field]': '1',
+        }
+        filtered = self.view.param_queryset(query_params, default_queryset)
+        assert_equal([record._id for record in filtered], [1])
+
+    def test_param_queryset_ands_fields_within_filter(self):
+        default_queryset = [
+            FakeRecord(_id=1, string_field='foo', second_string_field='bar'),
+            FakeRecord(_id=2, string_field='foo', second_string_field='foo'),
+            FakeRecord(_id=3, string_field='bar', second_string_field='foo'),
+        ]
+        filtered = self.view.param_queryset({'filter[string_field,second_string_field]': 'foo'}, default_queryset)
+        assert_equal([record._id for record in filtered], [2])
+
+    def test_partition_filters_keeps_list_and_computed_fields_in_python(self):
+        class schema:
+            _fields = {'string_field': None, 'list_field': None, 'int_field': None, 'second_string_field': None}
+
+        filters = self.view.parse_query_params({
+            'filter[string_field]': 'foo',
+            'filter[list_field]': 'bar',
+            'filter[second_string_field]': 'baz',
+        })
+        self.view.computed_fields = frozenset(['second_string_field'])
+        odm_filters, python_filters = self.view.partition_filters(filters, schema)
+        assert_equal(set(odm_filters.keys()), {'filter[string_field]'})
+        assert_equal(set(python_filters.keys()), {'filter[list_field]', 'filter[second_string_field]'})
+
 
 class TestODMOrderingFilter(ApiTestCase):
     class query:
@@ -1,11 +1,90 @@
 # -*- coding: utf-8 -*-
+import datetime
+
 from nose.tools import *  # flake8: noqa
+from modularodm import Q
 
 from tests.base import ApiTestCase
+from tests.factories import AuthUserFactory, ProjectFactory
 
-from api.base.pagination import MaxSizePagination
+from api.base.exceptions import InvalidQueryStringError
+from api.base.pagination import MaxSizePagination, encode_cursor, decode_cursor, keyset_query
+from api.base.settings.defaults import API_BASE
 
 class TestMaxPagination(ApiTestCase):
     def test_no_query_param_alters_page_size(self):
         assert MaxSizePagination.page_size_query_param is None, 'Adding variable page sizes to the paginator ' +\
             'requires tests to ensure that you can\'t request more than the class\'s maximum number of values.'
+
+
+class TestCursorPagination(ApiTestCase):
+
+    def test_cursor_round_trip(self):
+        now = datetime.datetime(2016, 7, 14, 12, 30, 5, 123)
+        cursor = encode_cursor([now, 'abc12'], reverse=True)
+        assert_equal(decode_cursor(cursor), ([now, 'abc12'], True))
+
+    def test_invalid_cursor_raises(self):
+        with assert_raises(InvalidQueryStringError):
+            decode_cursor('not-a-cursor')
+
+    def test_keyset_query_descending(self):
+        query = keyset_query(('-date', '-_id'), ['d', 'abc12'])
+        assert_equal(
+            repr(query),
+            repr(Q('date', 'lt', 'd') | (Q('date', 'eq', 'd') & Q('_id', 'lt', 'abc12')))
+        )
+
+    def test_keyset_query_reverse(self):
+        query = keyset_query(('-date', '-_id'), ['d', 'abc12'], reverse=True)
+        assert_equal(
+            repr(query),
+            repr(Q('date', 'gt', 'd') | (Q('date', 'eq', 'd') & Q('_id', 'gt', 'abc12')))
+        )
+
+
+class TestNodeListCursorPagination(ApiTestCase):
+
+    def setUp(self):
+        super(TestNodeListCursorPagination, self).setUp()
+        self.user = AuthUserFactory()
+        self.projects = [ProjectFactory(creator=self.user, is_public=True) for _ in range(5)]
+        self.url = '/{}nodes/'.format(API_BASE)
+
+    def test_walks_all_pages_forward_and_back(self):
+        res = self.app.get(self.url, {'page[cursor]': '', 'page[size]': 2}, auth=self.user.auth)
+        assert_not_in('total', res.json['links']['meta'])
+        assert_is_none(res.json['links']['prev'])
+
+        seen = [node['id'] for node in res.json['data']]
+        while res.json['links']['next']:
+            res = self.app.get(res.json['links']['next'], auth=self.user.auth)
+            seen.extend(node['id'] for node in res.json['data'])
+
+        expected = [
+            node._id for node in
+            sorted(self.projects, key=lambda node: (node.date_modified, node._id), reverse=True)
+        ]
+        assert_equal(seen, expected)
+
+        last_page = [node['id'] for node in res.json['data']]
+        res = self.app.get(res.json['links']['prev'], auth=self.user.auth)
+        assert_equal([node['id'] for node in res.json['data']], seen[-len(last_page) - 2:-len(last_page)])
+
+    def test_total_only_when_requested(self):
+        res = self.app.get(self.url, {'page[cursor]': '', 'page[total]': 'true'}, auth=self.user.auth)
+        assert_equal(res.json['links']['meta']['total'], 5)
+
+    def test_total_counts_every_page(self):
+        res = self.app.get(self.url, {'page[cursor]': '', 'page[size]': 2}, auth=self.user.auth)
+        res = self.app.get(res.json['links']['next'] + '&page[total]=true', auth=self.user.auth)
+        assert_equal(len(res.json['data']), 2)
+        assert_equal(res.json['links']['meta']['total'], 5)
+
+        res = self.app.get(res.json['links']['prev'] + '&page[total]=true', auth=self.user.auth)
+        assert_equal(len(res.json['data']), 2)
+        assert_equal(res.json['links']['meta']['total'], 5)
+
+    def test_invalid_cursor_returns_400(self):
+        res = self.app.get(self.url, {'page[cursor]': 'bad'}, auth=self.user.auth, expect_errors=True)
+        assert_equal(res.status_code, 400)
@@ -82,3 +82,17 @@ class TestLogDetail(LogsTestCase):
         assert_equal(res.status_code, 200)
         assert_in(self.public_log._id, unicode(res.body, 'utf-8'))
 
+
+    def test_log_detail_inherited_by_public_fork(self):
+        fork = self.node.fork_node(auth=Auth(self.node.creator))
+        fork.set_privacy('public', auth=Auth(self.node.creator))
+        res = self.app.get(self.private_log_detail, auth=self.user_two.auth)
+        assert_equal(res.status_code, 200)
+        node_href = res.json['data']['relationships']['node']['links']['related']['href']
+        assert_in(fork._id, node_href)
+        assert_not_in(self.node._id, node_href)
+
+    def test_log_detail_inherited_by_private_fork(self):
+        self.node.fork_node(auth=Auth(self.node.creator))
+        res = self.app.get(self.private_log_detail, auth=self.user_two.auth, expect_errors=True)
+        assert_equal(res.status_code, 403)
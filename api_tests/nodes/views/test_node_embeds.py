@@ -1,12 +1,16 @@
 from nose.tools import *  # flake8: noqa
 import functools
 
+import mock
+
 from framework.auth.core import Auth
+from website.models import Node
 
 from api.base.settings.defaults import API_BASE
 from tests.base import ApiTestCase
 from tests.factories import (
     ProjectFactory,
+    NodeFactory,
     AuthUserFactory
 )
 
@@ -47,6 +51,29 @@ class TestNodeEmbeds(ApiTestCase):
         embeds = res.json['data']['embeds']
         assert_equal(embeds['parent']['data']['id'], self.root_node._id)
 
+    def test_embed_parent_from_list(self):
+        url = '/{0}nodes/{1}/children/?embed=parent'.format(API_BASE, self.root_node._id)
+
+        res = self.app.get(url, auth=self.user.auth)
+        parents = [child['embeds']['parent']['data']['id'] for child in res.json['data']]
+        assert_equal(parents, [self.root_node._id, self.root_node._id])
+
+    def test_embed_parent_from_list_loads_parents_together(self):
+        user = AuthUserFactory()
+        parents = [ProjectFactory(is_public=True) for _ in range(3)]
+        for parent in parents:
+            NodeFactory(parent=parent, creator=user)
+        url = '/{0}users/{1}/nodes/?embed=parent'.format(API_BASE, user._id)
+
+        storage = Node._storage[0]
+        with mock.patch.object(storage, 'get', wraps=storage.get) as mock_get:
+            res = self.app.get(url, auth=user.auth)
+        embedded = {node['embeds']['parent']['data']['id'] for node in res.json['data']}
+        assert_equal(embedded, {parent._id for parent in parents})
+        # Parents were loaded by one query for the page, not one lookup per node
+        loaded = {call[0][1] for call in mock_get.call_args_list}
+        assert_false(loaded & embedded)
+
     def test_embed_no_parent(self):
         url = '/{0}nodes/{1}/?embed=parent'.format(API_BASE, self.root_node._id)
 
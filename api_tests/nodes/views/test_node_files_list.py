@@ -392,6 +392,22 @@ class TestNodeFilesListFiltering(ApiTestCase):
         assert_equal(res.status_code, 400)
         assert_equal(len(res.json['errors']), 1)
 
+    def test_node_files_osfstorage_can_filter_by_computed_path(self):
+        file_one = api_utils.create_test_file(self.project, self.user, filename='one')
+        api_utils.create_test_file(self.project, self.user, filename='two')
+
+        url = '/{}nodes/{}/files/osfstorage/?filter[path]={}'.format(API_BASE, self.project._id, file_one.path)
+        res = self.app.get(url, auth=self.user.auth)
+        assert_equal(res.status_code, 200)
+        assert_equal(len(res.json['data']), 1)
+        assert_equal(res.json['data'][0]['attributes']['name'], 'one')
+
+        url = '/{}nodes/{}/files/osfstorage/?filter[materialized_path]=/two'.format(API_BASE, self.project._id)
+        res = self.app.get(url, auth=self.user.auth)
+        assert_equal(res.status_code, 200)
+        assert_equal(len(res.json['data']), 1)
+        assert_equal(res.json['data'][0]['attributes']['name'], 'two')
+
 
 class TestNodeFilesListPagination(ApiTestCase):
     def setUp(self):
@@ -147,3 +147,21 @@ class TestNodeLogFiltering(TestNodeLogList):
         assert_equal(res.status_code, 200)
         assert_equal(len(res.json['data']), 1)
         assert_equal(res.json['data'][0]['attributes']['action'], 'project_created')
+
+    def test_fork_of_private_project_lists_inherited_logs_under_fork(self):
+        self.private_project.add_tag('secret', auth=self.user_auth, save=True)
+        fork = self.private_project.fork_node(auth=self.user_auth)
+        fork.set_privacy('public', auth=self.user_auth)
+        url = '/{}nodes/{}/logs/'.format(API_BASE, fork._id)
+        non_contrib = AuthUserFactory()
+
+        res = self.app.get(url, auth=non_contrib.auth)
+        assert_equal(res.status_code, 200)
+        tag_log = [log for log in res.json['data'] if log['attributes']['action'] == 'tag_added'][0]
+        node_href = tag_log['relationships']['node']['links']['related']['href']
+        assert_in(fork._id, node_href)
+        assert_not_in(self.private_project._id, node_href)
+
+        res = self.app.get('/{}logs/{}/'.format(API_BASE, tag_log['id']), auth=non_contrib.auth)
+        assert_equal(res.status_code, 200)
+        assert_in(fork._id, res.json['data']['relationships']['node']['links']['related']['href'])
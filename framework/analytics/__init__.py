@@ -1,15 +1,23 @@
 #!/usr/bin/env python
 # encoding: utf-8
 
+import atexit
+import collections
 import functools
+import hashlib
+import math
+import threading
+import time
 from datetime import datetime
 
 from dateutil import parser
+from pymongo.errors import DuplicateKeyError
 
 from framework.mongo import database
 from framework.postcommit_tasks.handlers import run_postcommit
 from framework.sessions import session
 from framework.celery_tasks import app
+from website import settings
 
 from flask import request
 
@@ -75,49 +83,165 @@ def build_page(rex, kwargs):
     except KeyError:
         return None
 
+class BloomFilter(object):
+    """Fixed-size set of strings that may report false positives but never false negatives.
+
+    :param int capacity: Number of keys the filter is sized for
+    :param float error_rate: False positive rate once ``capacity`` keys were added
+    """
+    def __init__(self, capacity, error_rate=0.01):
+        self.size = int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, int(round(float(self.size) / capacity * math.log(2))))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key):
+        digest = hashlib.md5(key.encode('utf-8')).hexdigest()
+        first, second = int(digest[:16], 16), int(digest[16:], 16)
+        return [(first + i * second) % self.size for i in xrange(self.hash_count)]
+
+    def __contains__(self, key):
+        return all(self.bits[position // 8] & (1 << position % 8) for position in self._positions(key))
+
+    def add(self, key):
+        """Add a key to the filter.
+
+        :return bool: Whether the key was (probably) already present
+        """
+        present = True
+        for position in self._positions(key):
+            byte, bit = divmod(position, 8)
+            if not self.bits[byte] & (1 << bit):
+                present = False
+                self.bits[byte] |= 1 << bit
+        return present
+
+
+class DailyVisitors(object):
+    """Remembers which visitors viewed which pages on the current day.
+
+    Replaces the per-session list of pages visited today with one Bloom filter
+    per process that is reset when the day changes.
+
+    Note: each process has its own filter, so a visitor whose requests are served
+    by several worker processes is counted as a daily unique once per process.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.date = None
+        self.filter = None
+
+    def is_new(self, visitor, page, date):
+        with self.lock:
+            if date != self.date:
+                self.date = date
+                self.filter = BloomFilter(settings.ANALYTICS_VISITORS_PER_DAY)
+            return not self.filter.add(u'{0} {1}'.format(visitor, page))
+
+
+class CounterBuffer(object):
+    """Aggregates page counter increments in memory and writes them with one upsert per page.
+
+    Buffered increments are due to be written once ``ANALYTICS_FLUSH_INTERVAL`` seconds have
+    passed since the last flush, or once ``ANALYTICS_FLUSH_PAGES`` pages have pending increments;
+    see `flush_counters`.
+
+    Note: the last increments of a process are only written at exit, so they are lost if the
+    process is killed without running its ``atexit`` handlers.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = collections.defaultdict(collections.Counter)
+        self.last_flush = time.time()
+
+    def increment(self, page, fields):
+        with self.lock:
+            self.pending[page].update(fields)
+
+    def get_pending(self, page):
+        with self.lock:
+            return dict(self.pending.get(page, {}))
+
+    def is_due(self):
+        return (
+            time.time() - self.last_flush >= settings.ANALYTICS_FLUSH_INTERVAL or
+            len(self.pending) >= settings.ANALYTICS_FLUSH_PAGES
+        )
+
+    def flush(self, db=None):
+        db = db or database
+        collection = db['pagecounters']
+        with self.lock:
+            pending, self.pending = self.pending, collections.defaultdict(collections.Counter)
+            self.last_flush = time.time()
+        while pending:
+            page, fields = pending.popitem()
+            try:
+                collection.update({'_id': page}, {'$inc': dict(fields)}, True, False)
+            except Exception:
+                # Keep what could not be written for the next flush
+                self.increment(page, fields)
+                for page, fields in pending.items():
+                    self.increment(page, fields)
+                raise
+
+
+def is_new_visitor(visitor, page, db=None):
+    """Record that a visitor viewed a page, in a collection shared by all processes.
+
+    :return bool: Whether this is the visitor's first view of the page
+    """
+    db = db or database
+    try:
+        db['pagevisitors'].insert({'_id': u'{0} {1}'.format(visitor, page)})
+    except DuplicateKeyError:
+        return False
+    return True
+
+
+counter_buffer = CounterBuffer()
+daily_visitors = DailyVisitors()
+# Flushes what is left in the buffer; increments are lost if the process is killed before this runs
+atexit.register(counter_buffer.flush)
+
+
+@run_postcommit(once_per_request=True, celery=False)
+def flush_counters(db=None):
+    """Write buffered counter increments once the request has finished, outside
+    its transaction, so that a rollback of the request cannot discard them and
+    the request does not hold locks on the counters.
+    """
+    counter_buffer.flush(db)
+
+
 def update_counter(page, db=None):
     """Update counters for page.
 
+    Increments are buffered in memory; see `CounterBuffer`. A visitor counts as
+    unique once per session, and once per day for the daily count. Pages visited by
+    a session are recorded outside of the session, so that counting a view does not
+    modify the session.
+
     :param str page: Colon-delimited page key in analytics collection
     :param db: MongoDB database or `None`
     """
-    db = db or database
-    collection = db['pagecounters']
-
     date = datetime.utcnow()
     date = date.strftime('%Y/%m/%d')
 
     page = clean_page(page)
 
-    d = {'$inc': {}}
-
-    visited_by_date = session.data.get('visited_by_date')
-    if not visited_by_date:
-        visited_by_date = {'date': date, 'pages': []}
-
-    if date == visited_by_date['date']:
-        if page not in visited_by_date['pages']:
-            d['$inc']['date.%s.unique' % date] = 1
-            visited_by_date['pages'].append(page)
-            session.data['visited_by_date'] = visited_by_date
-    else:
-        visited_by_date['date'] = date
-        visited_by_date['pages'] = []
-        d['$inc']['date.%s.unique' % date] = 1
-        visited_by_date['pages'].append(page)
-        session.data['visited_by_date'] = visited_by_date
-
-    d['$inc']['date.%s.total' % date] = 1
+    fields = {
+        'total': 1,
+        'date.%s.total' % date: 1,
+    }
+    # Daily uniques are tracked per process, and over-counted across processes; see `DailyVisitors`
+    if daily_visitors.is_new(session._id, page, date):
+        fields['date.%s.unique' % date] = 1
+    if is_new_visitor(session._id, page, db):
+        fields['unique'] = 1
 
-    visited = session.data.get('visited')  # '/project/x/, project/y/'
-    if not visited:
-        visited = []
-    if page not in visited:
-        d['$inc']['unique'] = 1
-        visited.append(page)
-        session.data['visited'] = visited
-    d['$inc']['total'] = 1
-    collection.update({'_id': page}, d, True, False)
+    counter_buffer.increment(page, fields)
+    if counter_buffer.is_due():
+        flush_counters(db)
 
 
 def update_counters(rex, db=None):
@@ -142,18 +266,51 @@ def update_counters(rex, db=None):
 def get_basic_counters(page, db=None):
     db = db or database
     collection = db['pagecounters']
-    unique = 0
-    total = 0
     collection = database['pagecounters']
+    page = clean_page(page)
     result = collection.find_one(
-        {'_id': clean_page(page)},
+        {'_id': page},
         {'total': 1, 'unique': 1}
     )
-    if result:
-        if 'unique' in result:
-            unique = result['unique']
-        if 'total' in result:
-            total = result['total']
+    # Include increments that have not been flushed yet
+    pending = counter_buffer.get_pending(page)
+    if result or pending:
+        result = result or {}
+        unique = result.get('unique', 0) + pending.get('unique', 0)
+        total = result.get('total', 0) + pending.get('total', 0)
         return unique, total
     else:
         return None, None
+
+
+def get_basic_counters_bulk(pages, db=None):
+    """Look up the counters of many pages with one query.
+
+    :param list pages: Page keys, as passed to `get_basic_counters`
+    :return dict: Page key to ``(unique, total)``, ``(None, None)`` for pages never counted
+    """
+    if not pages:
+        return {}
+    db = db or database
+    collection = db['pagecounters']
+    cleaned = {page: clean_page(page) for page in pages}
+    results = {
+        result['_id']: result
+        for result in collection.find(
+            {'_id': {'$in': list(set(cleaned.values()))}},
+            {'total': 1, 'unique': 1}
+        )
+    }
+    counters = {}
+    for page, key in cleaned.items():
+        result = results.get(key)
+        pending = counter_buffer.get_pending(key)
+        if result or pending:
+            result = result or {}
+            counters[page] = (
+                result.get('unique', 0) + pending.get('unique', 0),
+                result.get('total', 0) + pending.get('total', 0),
+            )
+        else:
+            counters[page] = (None, None)
+    return counters
@@ -1,9 +1,13 @@
 # -*- coding: utf-8 -*-
 
+import copy
 import furl
 import httplib as http
 import json
+import threading
+import time
 import urllib
+from collections import OrderedDict
 
 from lxml import etree
 import requests
@@ -13,6 +17,7 @@ from framework.auth import authenticate, external_first_login_authenticate
 from framework.auth.core import get_user
 from framework.flask import redirect
 from framework.exceptions import HTTPError
+from framework.mongo import database
 from website import settings
 
 
@@ -54,6 +59,82 @@ class CasResponse(object):
         self.attributes = attributes or {}
 
 
+class TokenCache(object):
+    """Bounded in-process cache of the CAS responses to access token profile lookups.
+
+    Successful lookups are kept for ``settings.CAS_TOKEN_CACHE_TTL`` seconds, and the errors
+    CAS returns for rejected tokens for ``settings.CAS_TOKEN_NEGATIVE_CACHE_TTL`` seconds.
+
+    Revoking tokens increments a revocation generation shared by all processes through the
+    ``castokenrevocations`` collection. Entries cached under an older generation are ignored.
+    """
+
+    COLLECTION = 'castokenrevocations'
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+
+    @property
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'negative_hits': self.negative_hits,
+            'misses': self.misses,
+            'size': len(self._entries),
+        }
+
+    def generation(self):
+        """Return the number of revocations recorded by any process."""
+        marker = database[self.COLLECTION].find_one({'_id': 'generation'})
+        return marker['generation'] if marker else 0
+
+    def get(self, access_token, generation):
+        """Return the `CasResponse` or `CasHTTPError` cached for a token in ``generation``, or None."""
+        with self._lock:
+            expires, entry_generation, value = self._entries.get(access_token, (0, None, None))
+            if expires <= time.time() or entry_generation != generation:
+                self._entries.pop(access_token, None)
+                self.misses += 1
+                return None
+            if isinstance(value, CasHTTPError):
+                self.negative_hits += 1
+                return value
+            self.hits += 1
+        # Callers may change the attributes of the response they are given
+        return copy.deepcopy(value)
+
+    def set(self, access_token, value, generation):
+        """Cache a lookup, passing the `generation` read before the lookup was made."""
+        ttl = settings.CAS_TOKEN_NEGATIVE_CACHE_TTL if isinstance(value, CasHTTPError) else settings.CAS_TOKEN_CACHE_TTL
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._entries.pop(access_token, None)
+            while len(self._entries) >= settings.CAS_TOKEN_CACHE_SIZE:
+                self._entries.popitem(last=False)
+            self._entries[access_token] = (time.time() + ttl, generation, copy.deepcopy(value))
+
+    def invalidate(self, access_token=None):
+        """Forget a token, or every token if none is given."""
+        with self._lock:
+            if access_token is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(access_token, None)
+
+    def revoke(self, access_token=None):
+        """Forget a token, or every token if none is given, in this process and all others."""
+        self.invalidate(access_token)
+        database[self.COLLECTION].update({'_id': 'generation'}, {'$inc': {'generation': 1}}, upsert=True)
+
+
+token_cache = TokenCache()
+
+
 class CasClient(object):
     """HTTP client for the CAS server."""
 
@@ -108,13 +189,29 @@ class CasClient(object):
 
     def profile(self, access_token):
         """
-        Send request to get profile information, given an access token.
+        Get profile information, given an access token. Responses are cached in `token_cache`.
 
         :param str access_token: CAS access_token.
         :rtype: CasResponse
         :raises: CasError if an unexpected response is returned.
         """
+        generation = token_cache.generation()
+        cached = token_cache.get(access_token, generation)
+        if isinstance(cached, CasHTTPError):
+            raise cached
+        if cached is not None:
+            return cached
+        try:
+            resp = self._fetch_profile(access_token)
+        except CasHTTPError as err:
+            # Only remember tokens CAS rejected, not its own failures
+            if err.code < 500:
+                token_cache.set(access_token, err, generation)
+            raise
+        token_cache.set(access_token, resp, generation)
+        return resp
 
+    def _fetch_profile(self, access_token):
         url = self.get_profile_url()
         headers = {
             'Authorization': 'Bearer {}'.format(access_token),
@@ -169,6 +266,9 @@ class CasClient(object):
         url = self.get_auth_token_revocation_url()
 
         resp = requests.post(url, data=payload)
+        # Once CAS has revoked them, no process may serve the tokens from its cache. The
+        # tokens of an application are not known here, so forget them all.
+        token_cache.revoke(payload.get('token'))
         if resp.status_code == 204:
             return True
         else:
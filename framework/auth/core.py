@@ -996,7 +996,7 @@ class User(GuidStoredObject, AddonModelMixin):
 
         """
         for node in self.contributed:
-            node.update_search()
+            node.update_search(saved_fields={'visible_contributor_ids'})
 
     def update_search_nodes_contributors(self):
         """
@@ -1266,6 +1266,7 @@ class User(GuidStoredObject, AddonModelMixin):
             raise ValueError('Node is already being watched.')
         watch_config.save()
         self.watched.append(watch_config)
+        watch_config.node.invalidate_counters('watches')
         return None
 
     def unwatch(self, watch_config):
@@ -1284,6 +1285,7 @@ class User(GuidStoredObject, AddonModelMixin):
                     each.__class__.remove_one(each)
                     self.watched.remove(each)
                     self.save()
+                watch_config.node.invalidate_counters('watches')
                 return None
         raise ValueError('Node not being watched.')
 
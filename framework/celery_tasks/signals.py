@@ -9,6 +9,7 @@ from modularodm import storage
 from framework.mongo import set_up_storage, StoredObject
 
 from website import models
+from website.notifications.emails import clear_subscription_cache
 
 
 @signals.task_prerun.connect
@@ -17,6 +18,7 @@ def clear_caches(*args, **kwargs):
     """Clear database cache before and after each task.
     """
     StoredObject._clear_caches()
+    clear_subscription_cache()
 
 
 @signals.worker_process_init.connect
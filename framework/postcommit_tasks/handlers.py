@@ -79,6 +79,7 @@ def enqueue_postcommit_task(fn, args, kwargs, celery=False, once_per_request=Tru
         postcommit_celery_queue().update({key: fn.si(*args, **kwargs)})
     else:
         postcommit_queue().update({key: functools.partial(fn, *args, **kwargs)})
+    return key
 
 handlers = {
     'before_request': postcommit_before_request,
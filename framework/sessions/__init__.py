@@ -1,7 +1,6 @@
 # -*- coding: utf-8 -*-
 
-from datetime import datetime
-
+import copy
 import httplib as http
 import urllib
 import urlparse
@@ -14,9 +13,8 @@ from weakref import WeakKeyDictionary
 from werkzeug.local import LocalProxy
 
 from framework.flask import redirect
-from framework.mongo import database
 from framework.sessions.model import Session
-from framework.sessions.utils import remove_session
+from framework.sessions.utils import load_session, remove_session, update_session, update_date_last_login
 from website import settings
 
 
@@ -84,22 +82,44 @@ def get_session():
     return user_session
 
 
-def set_session(session):
-    sessions[request._get_current_object()] = session
+def set_session(session, stored=False):
+    """Set the session of the current request.
+
+    :param bool stored: Whether the session was loaded from the store, in which case it is only
+        written back if its data changes
+    """
+    request_obj = request._get_current_object()
+    sessions[request_obj] = session
+    if stored:
+        loaded_data[request_obj] = copy.deepcopy(session.data)
+    else:
+        loaded_data.pop(request_obj, None)
+
+
+def save_session(session):
+    """Save the session of the current request if it is new or its data changed."""
+    request_obj = request._get_current_object()
+    if request_obj not in loaded_data:
+        session.save()
+    elif loaded_data[request_obj] != session.data:
+        update_session(session)
+    else:
+        return
+    loaded_data[request_obj] = copy.deepcopy(session.data)
 
 
 def create_session(response, data=None):
     current_session = get_session()
     if current_session:
         current_session.data.update(data or {})
-        current_session.save()
+        save_session(current_session)
         cookie_value = itsdangerous.Signer(settings.SECRET_KEY).sign(current_session._id)
     else:
         session_id = str(bson.objectid.ObjectId())
         new_session = Session(_id=session_id, data=data or {})
         new_session.save()
         cookie_value = itsdangerous.Signer(settings.SECRET_KEY).sign(session_id)
-        set_session(new_session)
+        set_session(new_session, stored=True)
     if response is not None:
         response.set_cookie(settings.COOKIE_NAME, value=cookie_value, domain=settings.OSF_COOKIE_DOMAIN,
                             secure=settings.SESSION_COOKIE_SECURE, httponly=settings.SESSION_COOKIE_HTTPONLY)
@@ -107,6 +127,8 @@ def create_session(response, data=None):
 
 
 sessions = WeakKeyDictionary()
+# Data of the stored sessions as they were loaded, by request
+loaded_data = WeakKeyDictionary()
 session = LocalProxy(get_session)
 
 
@@ -156,20 +178,23 @@ def before_request():
     if cookie:
         try:
             session_id = itsdangerous.Signer(settings.SECRET_KEY).unsign(cookie)
-            user_session = Session.load(session_id) or Session(_id=session_id)
         except itsdangerous.BadData:
             return
+        user_session = load_session(session_id)
+        stored = user_session is not None
+        if not stored:
+            user_session = Session(_id=session_id)
         if not util_time.throttle_period_expired(user_session.date_created, settings.OSF_SESSION_TIMEOUT):
             if user_session.data.get('auth_user_id') and 'api' not in request.url:
-                database['user'].update({'_id': user_session.data.get('auth_user_id')}, {'$set': {'date_last_login': datetime.utcnow()}}, w=0)
-            set_session(user_session)
+                update_date_last_login(user_session.data.get('auth_user_id'))
+            set_session(user_session, stored=stored)
         else:
             remove_session(user_session)
 
 
 def after_request(response):
     if session.data.get('auth_user_id'):
-        session.save()
+        save_session(session._get_current_object())
     # Disallow embedding in frames
     response.headers['X-Frame-Options'] = 'SAMEORIGIN'
     return response
@@ -1,8 +1,117 @@
 # -*- coding: utf-8 -*-
 
+import copy
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
 from modularodm import Q
 
+from framework.mongo import database
 from framework.sessions.model import Session
+from website import settings
+
+
+class SessionCache(object):
+    """In-process LRU cache of the data of stored sessions, by session id. Only used when
+    ``settings.SESSION_CACHE_SIZE`` is set.
+    """
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id):
+        """Return the ``date_created`` and ``data`` of a cached session as a dict, or None."""
+        with self._lock:
+            entry = self._entries.pop(session_id, None)
+            if entry is None or entry[0] <= time.time():
+                return None
+            # Most recently used entries are evicted last
+            self._entries[session_id] = entry
+        return copy.deepcopy(entry[1])
+
+    def set(self, session):
+        if settings.SESSION_CACHE_SIZE <= 0:
+            return
+        value = {'date_created': session.date_created, 'data': copy.deepcopy(session.data)}
+        with self._lock:
+            self._entries.pop(session._id, None)
+            while len(self._entries) >= settings.SESSION_CACHE_SIZE:
+                self._entries.popitem(last=False)
+            self._entries[session._id] = (time.time() + settings.SESSION_CACHE_TTL, value)
+
+    def invalidate(self, session_id=None, user_id=None):
+        """Forget a session, the sessions of a user, or every session if neither is given."""
+        with self._lock:
+            if session_id is not None:
+                self._entries.pop(session_id, None)
+            elif user_id is not None:
+                for key, (_, value) in self._entries.items():
+                    if value['data'].get('auth_user_id') == user_id:
+                        del self._entries[key]
+            else:
+                self._entries.clear()
+
+
+session_cache = SessionCache()
+
+# Users whose date_last_login was updated by this process, and when
+_last_login_updates = {}
+
+
+def load_session(session_id):
+    """Load a stored session, from the in-process cache when it is enabled.
+
+    Sessions served from the cache are not bound to the database; write them back with
+    `update_session` rather than `Session.save`.
+
+    :param str session_id:
+    :return: Session or None
+    """
+    cached = session_cache.get(session_id)
+    if cached is not None:
+        return Session(_id=session_id, **cached)
+    user_session = Session.load(session_id)
+    if user_session:
+        session_cache.set(user_session)
+    return user_session
+
+
+def update_session(session):
+    """Write the data of a stored session without reloading it. Does nothing if the session
+    was removed in the meantime.
+
+    :param session: Session
+    """
+    database['session'].update(
+        {'_id': session._id},
+        {'$set': {'data': session.data, 'date_modified': datetime.utcnow()}},
+    )
+    session_cache.set(session)
+
+
+def update_date_last_login(user_id):
+    """Set the date_last_login of a user to now, at most once per
+    ``settings.DATE_LAST_LOGIN_THROTTLE`` seconds.
+
+    :param str user_id:
+    """
+    now = datetime.utcnow()
+    last_update = _last_login_updates.get(user_id)
+    throttle = timedelta(seconds=settings.DATE_LAST_LOGIN_THROTTLE)
+    if last_update and now - last_update < throttle:
+        return
+    if len(_last_login_updates) >= 10000:
+        _last_login_updates.clear()
+    _last_login_updates[user_id] = now
+    # Other processes may have updated it recently as well
+    database['user'].update(
+        {'_id': user_id, '$or': [{'date_last_login': {'$lt': now - throttle}}, {'date_last_login': None}]},
+        {'$set': {'date_last_login': now}},
+        w=0,
+    )
 
 
 def remove_sessions_for_user(user):
@@ -14,6 +123,7 @@ def remove_sessions_for_user(user):
     """
 
     Session.remove(Q('data.auth_user_id', 'eq', user._id))
+    session_cache.invalidate(user_id=user._id)
 
 
 def remove_session(session):
@@ -25,3 +135,4 @@ def remove_session(session):
     """
 
     Session.remove(Q('_id', 'eq', session._id))
+    session_cache.invalidate(session_id=session._id)
@@ -8,6 +8,10 @@ db['storedfilenode'].create_index([
     ('tags', ASCENDING),
 ])
 
+db['searchoutbox'].create_index([
+    ('date_modified', ASCENDING),
+])
+
 db['user'].create_index([
     ('emails', ASCENDING),
 ])
@@ -15,6 +15,7 @@ from website.app import init_app
 from framework.transactions.context import TokuTransaction
 from website.models import Tag, Conference, Node
 from website.files.models import StoredFileNode
+from website.conferences import utils as conference_utils
 from scripts import utils as scripts_utils
 
 logger = logging.getLogger(__name__)
@@ -55,6 +56,9 @@ def main(dry_run=True):
                     count += 1
 
         logger.info('Get visit counts for {} projects in Conference {}'.format(count, conf.name))
+        if not dry_run:
+            # Re-render the submission rows with the new view and download counts
+            conference_utils.refresh_submissions(conf)
     
 
 @celery_app.task(name='scripts.meeting_visit_count')
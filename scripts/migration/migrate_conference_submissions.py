@@ -0,0 +1,37 @@
+"""
+Populate the conferencesubmission collection, and the num_submissions counts of conferences,
+from the public nodes tagged with each conference endpoint.
+"""
+
+import sys
+import logging
+
+from website.app import init_app
+from website.models import Conference
+from website.conferences import utils
+from scripts import utils as script_utils
+from framework.transactions.context import TokuTransaction
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def do_migration(dry=True):
+    for conf in Conference.find():
+        logger.info('Rebuilding submissions of conference {}'.format(conf._id))
+        if not dry:
+            with TokuTransaction():
+                utils.refresh_submissions(conf)
+            logger.info('{} submissions'.format(conf.num_submissions))
+
+
+def main(dry=True):
+    init_app(set_backends=True, routes=False)  # Sets the storage backends on all models
+    do_migration(dry=dry)
+
+
+if __name__ == '__main__':
+    dry = 'dry' in sys.argv
+    if not dry:
+        script_utils.add_file_logger(logger, __file__)
+    main(dry=dry)
@@ -0,0 +1,36 @@
+"""
+Populate the filearchiveindex collection from the sha256, vault and archive of
+every archived file version.
+"""
+
+import sys
+import logging
+
+from website.app import init_app
+from website.files import archive_index
+from scripts import utils as script_utils
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def do_migration(dry=True):
+    logger.info('Rebuilding file archive index')
+    if not dry:
+        entries = archive_index.rebuild_index()
+        logger.info('Indexed {} archived hashes'.format(len(entries)))
+        logger.info('Deduplication saved {bytes_saved} bytes over {duplicates} versions'.format(
+            **archive_index.get_savings()
+        ))
+
+
+def main(dry=True):
+    init_app(set_backends=True, routes=False)  # Sets the storage backends on all models
+    do_migration(dry=dry)
+
+
+if __name__ == '__main__':
+    dry = 'dry' in sys.argv
+    if not dry:
+        script_utils.add_file_logger(logger, __file__)
+    main(dry=dry)
@@ -0,0 +1,57 @@
+"""
+Backfill the ancestor_ids field on all nodes.
+ancestor_ids lists the primary ancestors of a node, from the top most project down to its parent,
+so that a whole subtree or lineage can be loaded with a single indexed query.
+"""
+
+import sys
+import logging
+from modularodm import Q
+from website import models
+from website.app import init_app
+from scripts import utils as script_utils
+from framework.mongo import database
+from framework.transactions.context import TokuTransaction
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def iter_lineages(node):
+    """Yield ``(node_id, ancestor_ids)`` for ``node`` and each of its primary descendants."""
+    stack = [(node, [])]
+    while stack:
+        current, ancestor_ids = stack.pop()
+        yield current._id, ancestor_ids
+        lineage = ancestor_ids + [current._id]
+        stack.extend((child, lineage) for child in current.nodes_primary)
+
+
+def do_migration(dry=True):
+    roots = models.Node.find(Q('parent_node', 'eq', None))
+    logger.info('Migrating the trees of {} top level nodes'.format(roots.count()))
+    touched_counter = 0
+    for root in roots:
+        if root.parent_id:
+            # parent_node is unset under a deleted parent, but the tree is still walked from its top
+            continue
+        with TokuTransaction():
+            for node_id, ancestor_ids in iter_lineages(root):
+                touched_counter += 1
+                if not dry:
+                    database['node'].update({'_id': node_id}, {'$set': {'ancestor_ids': ancestor_ids}})
+        logger.info('{} nodes touched so far, last tree: {}'.format(touched_counter, root._id))
+        models.Node._clear_caches()
+    logger.info('Finished, {} nodes touched.'.format(touched_counter))
+
+
+def main(dry=True):
+    init_app(set_backends=True, routes=False)  # Sets the storage backends on all models
+    do_migration(dry=dry)
+
+
+if __name__ == '__main__':
+    dry = 'dry' in sys.argv
+    if not dry:
+        script_utils.add_file_logger(logger, __file__)
+    main(dry=dry)
@@ -0,0 +1,54 @@
+"""
+Backfill the effective_admin_ids and effective_reader_ids fields on all nodes.
+Admin permissions are inherited down the primary node tree, so each tree is walked from its top level node.
+"""
+
+import sys
+import logging
+from modularodm import Q
+from website import models
+from website.app import init_app
+from scripts import utils as script_utils
+from framework.mongo import database
+from framework.transactions.context import TokuTransaction
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def do_migration(dry=True):
+    roots = models.Node.find(Q('parent_node', 'eq', None))
+    logger.info('Migrating the trees of {} top level nodes'.format(roots.count()))
+    touched_counter = 0
+    for root in roots:
+        if root.parent_id:
+            # parent_node is unset under a deleted parent, which does not pass on its admins
+            continue
+        with TokuTransaction():
+            stack = [([], root)]
+            while stack:
+                inherited, node = stack.pop()
+                admin_ids, reader_ids = node._compute_permission_index(inherited)
+                touched_counter += 1
+                if not dry:
+                    database['node'].update({'_id': node._id}, {'$set': {
+                        'effective_admin_ids': admin_ids,
+                        'effective_reader_ids': reader_ids,
+                    }})
+                inherited = node.get_inheritable_admin_ids(admin_ids)
+                stack.extend((inherited, child) for child in node.nodes_primary)
+        logger.info('{} nodes touched so far, last tree: {}'.format(touched_counter, root._id))
+        models.Node._clear_caches()
+    logger.info('Finished, {} nodes touched.'.format(touched_counter))
+
+
+def main(dry=True):
+    init_app(set_backends=True, routes=False)  # Sets the storage backends on all models
+    do_migration(dry=dry)
+
+
+if __name__ == '__main__':
+    dry = 'dry' in sys.argv
+    if not dry:
+        script_utils.add_file_logger(logger, __file__)
+    main(dry=dry)
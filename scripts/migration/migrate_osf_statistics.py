@@ -0,0 +1,33 @@
+"""
+Populate the osfstatistics collection of daily counters from the date_created of
+every node and the date_registered of every user.
+"""
+
+import sys
+import logging
+
+from website.app import init_app
+from website import statistics
+from scripts import utils as script_utils
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def do_migration(dry=True):
+    logger.info('Rebuilding daily statistics counters')
+    if not dry:
+        days = statistics.rebuild_statistics()
+        logger.info('Counted {} days'.format(len(days)))
+
+
+def main(dry=True):
+    init_app(set_backends=True, routes=False)  # Sets the storage backends on all models
+    do_migration(dry=dry)
+
+
+if __name__ == '__main__':
+    dry = 'dry' in sys.argv
+    if not dry:
+        script_utils.add_file_logger(logger, __file__)
+    main(dry=dry)
@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""Recount the overview counters stored on nodes and fix any that have drifted."""
+
+import logging
+import sys
+
+from modularodm import Q
+
+from framework.celery_tasks import app as celery_app
+from framework.mongo import database
+from framework.transactions.context import TokuTransaction
+
+from website.app import init_app
+from website.models import Node
+from scripts import utils as scripts_utils
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO)
+
+
+def refresh_counters(node, dry_run=True):
+    stored = node.counters or {}
+    counted = {
+        name: count(node)
+        for name, count in Node.COUNTERS.items()
+        if name in stored
+    }
+    changed = {name: value for name, value in counted.items() if stored[name] != value}
+    if changed:
+        logger.info('Fixing counters {} of node {}'.format(changed, node._id))
+        if not dry_run:
+            database['node'].update({'_id': node._id}, {'$set': {
+                'counters.{}'.format(name): value
+                for name, value in changed.items()
+            }})
+    return changed
+
+
+def main(dry_run=True):
+    count = 0
+    for node in Node.find(Q('counters', 'ne', None) & Q('counters', 'ne', {})):
+        if refresh_counters(node, dry_run=dry_run):
+            count += 1
+    logger.info('Fixed counters of {} nodes'.format(count))
+
+
+@celery_app.task(name='scripts.refresh_node_counters')
+def run_main(dry_run=True):
+    init_app(routes=False)
+    if not dry_run:
+        scripts_utils.add_file_logger(logger, __file__)
+    with TokuTransaction():
+        main(dry_run=dry_run)
+
+
+if __name__ == '__main__':
+    run_main(dry_run='--dry' in sys.argv)
@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""Roll up the logs of the days that ended since the last run and store the
+metrics shown on the admin sales analytics dashboard.
+"""
+
+import logging
+import sys
+from datetime import datetime
+
+from framework.celery_tasks import app as celery_app
+from framework.transactions.context import TokuTransaction
+
+from website.app import init_app
+from admin.sales_analytics.utils import get_rollup_days, rollup_day, update_sales_analytics
+from scripts import utils as scripts_utils
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO)
+
+
+def main(dry_run=True):
+    day = datetime.utcnow().date()
+    if dry_run:
+        with TokuTransaction():
+            metrics = update_sales_analytics(day)
+            logger.info('Updated sales analytics: {}'.format(metrics))
+            raise RuntimeError('Dry run -- transaction rolled back.')
+
+    # Commit each day's rollup on its own, so the first run does not roll up a year of logs
+    # in a single transaction
+    for rollup in get_rollup_days(day):
+        with TokuTransaction():
+            rollup_day(rollup)
+            logger.info('Rolled up logs of {}'.format(rollup))
+    with TokuTransaction():
+        metrics = update_sales_analytics(day, rollup=False)
+    logger.info('Updated sales analytics: {}'.format(metrics))
+
+
+@celery_app.task(name='scripts.sales_analytics')
+def run_main(dry_run=True):
+    init_app(routes=False)
+    if not dry_run:
+        scripts_utils.add_file_logger(logger, __file__)
+    main(dry_run=dry_run)
+
+
+if __name__ == '__main__':
+    run_main(dry_run='--dry' in sys.argv)
@@ -410,10 +410,13 @@ def elasticsearch(ctx):
         print('Your system is not recognized, you will have to start elasticsearch manually')
 
 @task
-def migrate_search(ctx, delete=False, index=settings.ELASTIC_INDEX):
-    """Migrate the search-enabled models."""
+def migrate_search(ctx, delete=False, index=settings.ELASTIC_INDEX, processes=4, resume=False):
+    """Migrate the search-enabled models.
+
+    Pass --resume to continue an interrupted migration from its last checkpoint.
+    """
     from website.search_migration.migrate import migrate
-    migrate(delete, index=index)
+    migrate(delete, index=index, processes=int(processes), resume=resume)
 
 
 @task
@@ -6,12 +6,12 @@ Unit tests for analytics logic in framework/analytics/__init__.py
 import unittest
 
 from nose.tools import *  # flake8: noqa  (PEP8 asserts)
+import mock
 from flask import Flask
 
 from datetime import datetime
 
 from framework import analytics, sessions
-from framework.sessions import session
 
 from tests.base import OsfTestCase
 from tests.factories import UserFactory, ProjectFactory
@@ -75,9 +75,6 @@ class TestUpdateCounters(UpdateCountersTestCase):
         count = analytics.get_basic_counters('download:{0}:{1}'.format(self.node, self.fid), db=self.db)
         assert_equal(count, (1, 1))
 
-        page = 'download:{0}:{1}'.format(self.node, self.fid)
-
-        session.data['visited'].append(page)
         download_file_(node=self.node, fid=self.fid)
 
         count = analytics.get_basic_counters('download:{0}:{1}'.format(self.node, self.fid), db=self.db)
@@ -96,9 +93,6 @@ class TestUpdateCounters(UpdateCountersTestCase):
         count = analytics.get_basic_counters('download:{0}:{1}:{2}'.format(self.node, self.fid, self.vid), db=self.db)
         assert_equal(count, (1, 1))
 
-        page = 'download:{0}:{1}:{2}'.format(self.node, self.fid, self.vid)
-
-        session.data['visited'].append(page)
         download_file_version_(node=self.node, fid=self.fid, vid=self.vid)
 
         count = analytics.get_basic_counters('download:{0}:{1}:{2}'.format(self.node, self.fid, self.vid), db=self.db)
@@ -116,6 +110,64 @@ class TestUpdateCounters(UpdateCountersTestCase):
         count = analytics.get_basic_counters(page, db=self.db)
         assert_equal(count, (3, 5))
 
+    def test_get_basic_counters_bulk(self):
+        page = 'node:' + str(self.node._id)
+        collection = self.db['pagecounters']
+        collection.update({'_id': page}, {'$inc': {'total': 5, 'unique': 3}}, True, False)
+        counters = analytics.get_basic_counters_bulk([page, 'node:missing'], db=self.db)
+        assert_equal(counters, {page: (3, 5), 'node:missing': (None, None)})
+
+    def test_update_counters_new_session_is_unique(self):
+        @analytics.update_counters('download:{target_id}:{fid}', db=self.db)
+        def download_file_(**kwargs):
+            return kwargs.get('node') or kwargs.get('project')
+
+        download_file_(node=self.node, fid=self.fid)
+        sessions.set_session(sessions.Session())
+        download_file_(node=self.node, fid=self.fid)
+
+        count = analytics.get_basic_counters('download:{0}:{1}'.format(self.node, self.fid), db=self.db)
+        assert_equal(count, (2, 2))
+
+    def test_unique_counted_once_per_session_and_daily(self):
+        page = 'node:{0}'.format(self.node._id)
+        with mock.patch('framework.analytics.datetime') as mock_datetime:
+            mock_datetime.utcnow.return_value = datetime(2016, 7, 14)
+            analytics.update_counter(page, db=self.db)
+            analytics.update_counter(page, db=self.db)
+            mock_datetime.utcnow.return_value = datetime(2016, 7, 15)
+            analytics.update_counter(page, db=self.db)
+        analytics.counter_buffer.flush(self.db)
+
+        record = self.db['pagecounters'].find_one({'_id': page})
+        assert_equal((record['unique'], record['total']), (1, 3))
+        assert_equal(record['date']['2016/07/14'], {'unique': 1, 'total': 2})
+        assert_equal(record['date']['2016/07/15'], {'unique': 1, 'total': 1})
+        assert_not_in('visited', sessions.session.data)
+        assert_false(analytics.is_new_visitor(sessions.session._id, page, db=self.db))
+
+    @mock.patch('framework.analytics.flush_counters')
+    def test_update_counter_flushes_when_due(self, mock_flush):
+        page = 'node:{0}'.format(self.node._id)
+        with mock.patch.object(analytics.settings, 'ANALYTICS_FLUSH_INTERVAL', 0):
+            analytics.update_counter(page, db=self.db)
+        mock_flush.assert_called_once_with(self.db)
+        analytics.counter_buffer.flush(self.db)
+
+    def test_buffered_counts_are_flushed_together(self):
+        page = 'node:{0}'.format(self.node._id)
+        with mock.patch.object(analytics.settings, 'ANALYTICS_FLUSH_INTERVAL', 3600):
+            analytics.counter_buffer.flush(self.db)
+            for _ in range(3):
+                analytics.update_counter(page, db=self.db)
+            assert_is_none(self.db['pagecounters'].find_one({'_id': page}))
+            assert_equal(analytics.get_basic_counters(page, db=self.db), (1, 3))
+
+            analytics.counter_buffer.flush(self.db)
+        record = self.db['pagecounters'].find_one({'_id': page})
+        assert_equal((record['unique'], record['total']), (1, 3))
+        assert_equal(analytics.get_basic_counters(page, db=self.db), (1, 3))
+
     @unittest.skip('Reverted the fix for #2281. Unskip this once we use GUIDs for keys in the download counts collection')
     def test_update_counters_different_files(self):
         # Regression test for https://github.com/CenterForOpenScience/osf.io/issues/2281
@@ -133,9 +185,6 @@ class TestUpdateCounters(UpdateCountersTestCase):
         count = analytics.get_basic_counters('download:{0}:{1}'.format(self.node, fid2), db=self.db)
         assert_equal(count, (None, None))
 
-        page = 'download:{0}:{1}'.format(self.node, fid1)
-
-        session.data['visited'].append(page)
         download_file_(node=self.node, fid=fid1)
         download_file_(node=self.node, fid=fid2)
 
@@ -143,3 +192,20 @@ class TestUpdateCounters(UpdateCountersTestCase):
         assert_equal(count, (1, 2))
         count = analytics.get_basic_counters('download:{0}:{1}'.format(self.node, fid2), db=self.db)
         assert_equal(count, (1, 1))
+
+
+class TestBloomFilter(unittest.TestCase):
+
+    def test_add(self):
+        bloom = analytics.BloomFilter(100)
+        assert_false(bloom.add('a'))
+        assert_true(bloom.add('a'))
+        assert_false(bloom.add('b'))
+
+    def test_false_positive_rate(self):
+        bloom = analytics.BloomFilter(1000, error_rate=0.01)
+        for i in range(1000):
+            bloom.add(str(i))
+        assert_true(all(str(i) in bloom for i in range(1000)))
+        false_positives = sum('other:{0}'.format(i) in bloom for i in range(1000))
+        assert_less(false_positives, 30)
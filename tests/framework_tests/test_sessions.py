@@ -1,5 +1,7 @@
+import mock
 from nose.tools import *
 
+from framework.mongo import database
 from framework.sessions import utils
 from tests import factories
 from tests.base import DbTestCase
@@ -49,3 +51,26 @@ class SessionUtilsTestCase(DbTestCase):
         assert_equal(1, Session.find().count())
         utils.remove_session(session)
         assert_equal(0, Session.find().count())
+
+    def test_update_session_writes_data(self):
+        session = SessionFactory(user=self.user)
+        session.data['status'] = ['message']
+        utils.update_session(session)
+        assert_equal(database['session'].find_one({'_id': session._id})['data']['status'], ['message'])
+
+    @mock.patch('website.settings.SESSION_CACHE_SIZE', 10)
+    def test_load_session_from_cache(self):
+        session = SessionFactory(user=self.user)
+        assert_equal(utils.load_session(session._id)._id, session._id)
+        database['session'].remove({'_id': session._id})
+        cached = utils.load_session(session._id)
+        assert_equal(cached.data['auth_user_id'], self.user._id)
+        utils.remove_sessions_for_user(self.user)
+        assert_is_none(utils.load_session(session._id))
+
+    @mock.patch('framework.sessions.utils.database')
+    def test_update_date_last_login_is_throttled(self, mock_database):
+        utils._last_login_updates.clear()
+        utils.update_date_last_login(self.user._id)
+        utils.update_date_last_login(self.user._id)
+        assert_equal(mock_database['user'].update.call_count, 1)
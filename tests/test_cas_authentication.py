@@ -78,6 +78,7 @@ class TestCASClient(OsfTestCase):
         OsfTestCase.setUp(self)
         self.base_url = 'http://accounts.test.test'
         self.client = cas.CasClient(self.base_url)
+        cas.token_cache.invalidate()
 
     @httpretty.activate
     def test_service_validate(self):
@@ -123,6 +124,46 @@ class TestCASClient(OsfTestCase):
         with assert_raises(cas.CasHTTPError):
             self.client.profile('invalid-access-token')
 
+    @mock.patch('framework.auth.cas.requests.get')
+    def test_profile_is_cached_per_token(self, mock_get):
+        mock_get.return_value = mock.Mock(status_code=200, content='{"id": "abc12", "scope": ["osf.full_read"]}')
+        first = self.client.profile('access-token')
+        second = self.client.profile('access-token')
+        assert_equal(mock_get.call_count, 1)
+        assert_equal(second.user, 'abc12')
+        assert_equal(second.attributes['accessTokenScope'], first.attributes['accessTokenScope'])
+        assert_equal(cas.token_cache.stats['hits'], 1)
+
+    @mock.patch('framework.auth.cas.requests.get')
+    def test_profile_rejected_token_is_cached(self, mock_get):
+        mock_get.return_value = mock.Mock(status_code=401, headers={}, content='')
+        for _ in range(2):
+            with assert_raises(cas.CasHTTPError):
+                self.client.profile('rejected-token')
+        assert_equal(mock_get.call_count, 1)
+        assert_equal(cas.token_cache.stats['negative_hits'], 1)
+
+    @mock.patch('framework.auth.cas.requests.post')
+    @mock.patch('framework.auth.cas.requests.get')
+    def test_token_revocation_invalidates_cached_profile(self, mock_get, mock_post):
+        mock_get.return_value = mock.Mock(status_code=200, content='{"id": "abc12"}')
+        mock_post.return_value = mock.Mock(status_code=204)
+        self.client.profile('access-token')
+        self.client.revoke_tokens({'token': 'access-token'})
+        self.client.profile('access-token')
+        assert_equal(mock_get.call_count, 2)
+
+    @mock.patch('framework.auth.cas.requests.get')
+    def test_revocation_in_another_process_invalidates_cached_profile(self, mock_get):
+        mock_get.return_value = mock.Mock(status_code=200, content='{"id": "abc12"}')
+        self.client.profile('access-token')
+        # The cache of another process records the revocation
+        cas.TokenCache().revoke('access-token')
+        self.client.profile('access-token')
+        assert_equal(mock_get.call_count, 2)
+        self.client.profile('access-token')
+        assert_equal(mock_get.call_count, 2)
+
     @httpretty.activate
     def test_application_token_revocation_succeeds(self):
         url = self.client.get_auth_token_revocation_url()
@@ -525,6 +525,30 @@ class TestConferenceEmailViews(OsfTestCase):
         assert_equal(res.status_code, 200)
         assert_equal(len(res.json), n_conference_nodes)
 
+    def test_conference_data_paginated(self):
+        conference = ConferenceFactory()
+        create_fake_conference_nodes(3, conference.endpoint)
+
+        url = api_url_for('conference_data', meeting=conference.endpoint)
+        res = self.app.get(url, {'page': 1, 'size': 2})
+        assert_equal(len(res.json), 1)
+        assert_equal(res.json[0]['id'], 2)
+
+    def test_submissions_follow_tags_and_privacy(self):
+        conference = ConferenceFactory()
+        nodes = create_fake_conference_nodes(3, conference.endpoint)
+        conference.reload()
+        assert_equal(conference.num_submissions, 3)
+
+        nodes[0].remove_tag(conference.endpoint, Auth(nodes[0].creator))
+        nodes[1].set_privacy('private', auth=Auth(nodes[1].creator))
+        conference.reload()
+        assert_equal(conference.num_submissions, 1)
+
+        url = api_url_for('conference_data', meeting=conference.endpoint)
+        res = self.app.get(url)
+        assert_equal([each['nodeUrl'] for each in res.json], [nodes[2].url])
+
     def test_conference_results(self):
         conference = ConferenceFactory()
 
@@ -19,6 +19,7 @@ from modularodm.exceptions import ValidationError, ValidationValueError
 
 from framework.analytics import get_total_activity_count
 from framework.exceptions import PermissionsError
+from framework.mongo import database
 from framework.auth import User, Auth
 from framework.auth import cas
 from framework.sessions.model import Session
@@ -3073,6 +3074,114 @@ class TestProject(OsfTestCase):
         assert_equal(child1.parents, [self.project])
         assert_equal(child2.parents, [child1, self.project])
 
+    def test_ancestor_ids(self):
+        child1 = ProjectFactory(parent=self.project)
+        child2 = ProjectFactory(parent=child1)
+        child1.reload()
+        child2.reload()
+        assert_equal(self.project.ancestor_ids, [])
+        assert_equal(child1.ancestor_ids, [self.project._id])
+        assert_equal(child2.ancestor_ids, [self.project._id, child1._id])
+
+    def test_ancestor_ids_updated_when_subtree_moves(self):
+        child = ProjectFactory(parent=self.project)
+        grandchild = ProjectFactory(parent=child)
+        new_parent = ProjectFactory()
+        self.project.nodes.remove(child)
+        self.project.save()
+        new_parent.nodes.append(child)
+        new_parent.save()
+        child.reload()
+        grandchild.reload()
+        assert_equal(child.ancestor_ids, [new_parent._id])
+        assert_equal(grandchild.ancestor_ids, [new_parent._id, child._id])
+
+    def test_prefetch_subtrees_keeps_unsaved_changes(self):
+        child = ProjectFactory(parent=self.project)
+        grandchild = ProjectFactory(parent=child)
+        grandchild.title = 'Not saved yet'
+        Node.prefetch_subtrees([self.project])
+        assert_equal(Node.load(grandchild._id).title, 'Not saved yet')
+
+    def test_effective_permission_index(self):
+        child = ProjectFactory(parent=self.project)
+        grandchild = ProjectFactory(parent=child)
+        child.reload()
+        grandchild.reload()
+        creator_id = self.project.creator._id
+        assert_in(creator_id, child.effective_admin_ids)
+        assert_in(creator_id, grandchild.effective_admin_ids)
+        assert_in(creator_id, grandchild.effective_reader_ids)
+        assert_true(grandchild.has_permission(self.project.creator, 'read'))
+        assert_false(grandchild.has_permission(self.project.creator, 'write'))
+
+    def test_effective_permission_index_updated_when_parent_admin_changes(self):
+        child = ProjectFactory(parent=self.project)
+        admin = UserFactory()
+        self.project.add_contributor(admin, auth=self.auth, permissions=['read', 'write', 'admin'])
+        self.project.save()
+        child.reload()
+        assert_in(admin._id, child.effective_reader_ids)
+        assert_true(child.is_admin_parent(admin))
+        self.project.remove_contributor(admin, auth=self.auth)
+        self.project.save()
+        child.reload()
+        assert_not_in(admin._id, child.effective_reader_ids)
+        assert_false(child.can_view(Auth(admin)))
+
+    def test_deleted_parent_passes_on_no_admins(self):
+        child = ProjectFactory(parent=self.project)
+        grandchild = ProjectFactory(parent=child)
+        child.is_deleted = True
+        child.save()
+        grandchild.reload()
+        assert_equal(child.get_inheritable_admin_ids(), [])
+        assert_not_in(self.project.creator._id, grandchild.effective_admin_ids)
+        # Saving the descendant applies the same rule as pushing the index down
+        grandchild.save()
+        assert_not_in(self.project.creator._id, grandchild.effective_admin_ids)
+
+    def test_is_admin_parent_falls_back_for_unindexed_parent(self):
+        child = ProjectFactory(parent=self.project)
+        database['node'].update(
+            {'_id': self.project._id},
+            {'$unset': {'effective_admin_ids': '', 'effective_reader_ids': ''}}
+        )
+        Node._clear_caches()
+        child = Node.load(child._id)
+        assert_true(child.is_admin_parent(self.project.creator))
+
+    def test_permission_checks_see_unsaved_permission_changes(self):
+        user = UserFactory()
+        self.project.add_contributor(user, auth=self.auth, permissions=['read', 'write', 'admin'], save=False)
+        assert_true(self.project.has_permission(user, 'read'))
+        assert_true(self.project.is_admin_parent(user))
+        self.project.save()
+
+        self.project.set_permissions(user, ['read'], save=False)
+        assert_false(self.project.is_admin_parent(user))
+        self.project.permissions.pop(user._id)
+        assert_false(self.project.has_permission(user, 'read'))
+        assert_false(self.project.can_view(Auth(user)))
+
+    def test_counters(self):
+        counters = self.project.get_counters()
+        assert_equal(counters['forks'], 0)
+        assert_equal(counters['points'], 0)
+        self.project.reload()
+        assert_equal(self.project.counters['forks'], 0)
+
+    def test_counters_dropped_when_forked_or_pointed_at(self):
+        self.project.get_counters()
+        self.project.fork_node(self.auth)
+        ProjectFactory().add_pointer(self.project, auth=self.auth)
+        self.project.reload()
+        assert_not_in('forks', self.project.counters)
+        assert_not_in('points', self.project.counters)
+        counters = self.project.get_counters()
+        assert_equal(counters['forks'], 1)
+        assert_equal(counters['points'], 1)
+
     def test_admin_contributor_ids(self):
         assert_equal(self.project.admin_contributor_ids, set())
         child1 = ProjectFactory(parent=self.project)
@@ -4329,10 +4438,65 @@ class TestNodeLog(OsfTestCase):
         assert_equal(project._id, log_project_created_original.original_node._id)
         assert_equal(project._id, log_project_created_original.node._id)
         assert_equal(project._id, log_project_created_fork.original_node._id)
-        assert_equal(fork._id, log_project_created_fork.node._id)
+        # Forks read the original's logs instead of copying them
+        assert_equal(project._id, log_project_created_fork.node._id)
         assert_equal(project._id, log_node_forked.original_node._id)
         assert_equal(fork._id, log_node_forked.node._id)
 
+    def test_inherited_log_viewable_through_public_fork(self):
+        user = UserFactory()
+        project = ProjectFactory(creator=user, is_public=False)
+        fork = project.fork_node(auth=Auth(user))
+        fork.set_privacy('public', auth=Auth(user))
+        log = project.logs[0]
+
+        assert_equal(log.get_inheriting_nodes(), [fork])
+        assert_equal(log.get_viewable_node(Auth(UserFactory())), fork)
+        assert_equal(log.get_viewable_node(Auth(user)), project)
+        assert_equal(log.get_listed_node(fork.get_inherited_log_owners(Auth(user))), fork)
+
+    def test_fork_inherits_logs_without_copying(self):
+        user = UserFactory()
+        project = ProjectFactory(creator=user)
+        log_count = NodeLog.find().count()
+        fork = project.fork_node(auth=Auth(user))
+        project.add_tag('after-fork', auth=Auth(user), save=True)
+
+        # Only the fork's own NODE_FORKED log was created
+        assert_equal(NodeLog.find().count(), log_count + 2)
+        assert_equal(
+            [log._id for log in fork.logs[:-1]],
+            [log._id for log in project.logs[:-1]],
+        )
+        assert_equal(fork.logs[-1].action, NodeLog.NODE_FORKED)
+
+    @mock.patch('website.project.model.enqueue_task')
+    def test_fork_defers_children_of_large_projects(self, mock_enqueue):
+        user = UserFactory()
+        project = ProjectFactory(creator=user)
+        NodeFactory(creator=user, parent=project)
+        with mock.patch.object(settings, 'COPY_CHILDREN_SYNC_LIMIT', 0):
+            fork = project.fork_node(auth=Auth(user))
+
+        assert_true(fork.children_pending)
+        assert_equal(fork.nodes, [])
+        assert_true(mock_enqueue.called)
+
+    @mock.patch('website.project.model.enqueue_task')
+    def test_failed_deferred_fork_is_no_longer_pending(self, mock_enqueue):
+        from website.project.tasks import fork_children
+        user = UserFactory()
+        project = ProjectFactory(creator=user)
+        NodeFactory(creator=user, parent=project)
+        with mock.patch.object(settings, 'COPY_CHILDREN_SYNC_LIMIT', 0):
+            fork = project.fork_node(auth=Auth(user))
+        kwargs = mock_enqueue.call_args[0][0].kwargs
+        assert_equal(kwargs['node_id'], fork._id)
+
+        fork_children.on_failure(Exception('copy failed'), 'task-id', (), kwargs, None)
+        fork.reload()
+        assert_false(fork.children_pending)
+
 
 class TestPermissions(OsfTestCase):
 
@@ -13,7 +13,7 @@ from framework.auth import Auth
 from framework.auth.core import User
 from framework.guid.model import Guid
 
-from website.notifications.tasks import get_users_emails, send_users_email, group_by_node, remove_notifications
+from website.notifications.tasks import get_users_emails, iter_users_emails, send_users_email, group_by_node, remove_notifications
 from website.notifications import constants
 from website.notifications.model import NotificationDigest
 from website.notifications.model import NotificationSubscription
@@ -1196,6 +1196,23 @@ class TestCompileSubscriptions(NotificationTestCase):
         subs = emails.compile_subscriptions(node5, 'file_updated')
         assert_equal(subs, {'email_transactional': [], 'email_digest': [self.user_1._id], 'none': []})
 
+    def test_resolved_subscriptions_are_cached(self):
+        self.base_sub.email_transactional.append(self.user_1)
+        self.base_sub.save()
+        with mock.patch.object(NotificationSubscription, 'find', wraps=NotificationSubscription.find) as mock_find:
+            emails.compile_subscriptions(self.shared_node, 'file_updated')
+            result = emails.compile_subscriptions(self.shared_node, 'file_updated')
+        assert_equal(mock_find.call_count, 1)
+        assert_equal(result, {'email_transactional': [self.user_1._id], 'none': [], 'email_digest': []})
+
+    def test_cached_subscriptions_refresh_after_save(self):
+        result = emails.compile_subscriptions(self.shared_node, 'file_updated')
+        assert_equal(result, {'email_transactional': [], 'none': [], 'email_digest': []})
+        self.shared_sub.email_digest.append(self.user_1)
+        self.shared_sub.save()
+        result = emails.compile_subscriptions(self.shared_node, 'file_updated')
+        assert_equal(result, {'email_transactional': [], 'none': [], 'email_digest': [self.user_1._id]})
+
 
 class TestMoveSubscription(NotificationTestCase):
     def setUp(self):
@@ -1508,6 +1525,22 @@ class TestSendEmails(NotificationTestCase):
         node_lineage = emails.get_node_lineage(self.node)
         assert_equal(node_lineage, [self.project._id, self.node._id])
 
+    @mock.patch('website.mails.render_message', return_value='Hello')
+    def test_store_emails_renders_once_per_timezone(self, mock_render):
+        same_zone = [factories.UserFactory(timezone='America/New_York', locale='en_US') for _ in range(2)]
+        other_zone = factories.UserFactory(timezone='Europe/Berlin', locale='de')
+        recipient_ids = [recipient._id for recipient in same_zone + [other_zone]] + [self.user._id]
+        emails.store_emails(recipient_ids, 'email_transactional', 'comments', self.user, self.node,
+                            datetime.datetime.utcnow())
+        assert_equal(mock_render.call_count, 2)
+
+        digests = list(NotificationDigest.find(Q('event', 'eq', 'comments')))
+        assert_equal(sorted(digest.user_id for digest in digests), sorted(recipient_ids[:3]))
+        for digest in digests:
+            assert_equal(digest.message, 'Hello')
+            assert_equal(digest.send_type, 'email_transactional')
+            assert_equal(digest.node_lineage, [self.project._id, self.node._id])
+
     def test_localize_timestamp(self):
         timestamp = datetime.datetime.utcnow().replace(tzinfo=pytz.utc)
         self.user.timezone = 'America/New_York'
@@ -1695,7 +1728,29 @@ class TestSendDigest(OsfTestCase):
         assert_equal(kwargs['name'], user.fullname)
         message = group_by_node(user_groups[last_user_index]['info'])
         assert_equal(kwargs['message'], message)
-        assert_equal(kwargs['callback'], remove_notifications(email_notification_ids=email_notification_ids))
+        assert_equal(NotificationDigest.find(Q('_id', 'in', email_notification_ids)).count(), 0)
+
+    @mock.patch('website.mails.send_mail')
+    def test_send_users_email_removes_digests_per_batch(self, mock_send_mail):
+        send_type = 'email_transactional'
+        for _ in range(3):
+            factories.NotificationDigestFactory(
+                user_id=factories.UserFactory()._id,
+                send_type=send_type,
+                timestamp=datetime.datetime.utcnow(),
+                message='Hello',
+                node_lineage=[factories.ProjectFactory()._id]
+            ).save()
+        batches = list(iter_users_emails(send_type, batch_size=2))
+        assert_equal([len(batch) for batch in batches], [2, 1])
+        assert_equal(sum(batches, []), get_users_emails(send_type))
+
+        with mock.patch('website.notifications.tasks.DIGEST_BATCH_SIZE', 2), \
+                mock.patch.object(NotificationDigest, 'remove', wraps=NotificationDigest.remove) as mock_remove:
+            send_users_email(send_type)
+        assert_equal(mock_send_mail.call_count, 3)
+        assert_equal(mock_remove.call_count, 2)
+        assert_equal(NotificationDigest.find(Q('send_type', 'eq', send_type)).count(), 0)
 
     def test_remove_sent_digest_notifications(self):
         d = factories.NotificationDigestFactory(
@@ -7,6 +7,7 @@ import itertools
 import random
 import copy
 import re
+import time
 
 import celery
 import mock  # noqa
@@ -19,10 +20,13 @@ from modularodm import Q
 from scripts import cleanup_failed_registrations as scripts
 
 from framework.auth import Auth
+from framework.auth import signing
 from framework.celery_tasks import handlers
 
 from website.archiver import (
     ARCHIVER_INITIATED,
+    ARCHIVER_SENDING,
+    ARCHIVER_PENDING,
     ARCHIVER_SUCCESS,
     ARCHIVER_FAILURE,
     ARCHIVER_NETWORK_ERROR,
@@ -35,6 +39,7 @@ from website.archiver import listeners
 from website.archiver.tasks import *   # noqa
 from website.archiver.model import ArchiveTarget, ArchiveJob
 from website.archiver.decorators import fail_archive_on_error
+from website.files import archive_index
 
 from website import mails
 from website import settings
@@ -145,6 +150,14 @@ FILE_TREE = {
     ],
 }
 
+def iter_file_tree(file_tree, folder_names=()):
+    for child in file_tree.get('children', []):
+        if child['kind'] == 'file':
+            yield child, folder_names
+        else:
+            for each in iter_file_tree(child, folder_names + (child['name'], )):
+                yield each
+
 class MockAddon(mock.MagicMock, StorageAddonBase):
 
     complete = True
@@ -152,6 +165,9 @@ class MockAddon(mock.MagicMock, StorageAddonBase):
     def _get_file_tree(self, user, version):
         return FILE_TREE
 
+    def _iter_file_tree(self, user, version):
+        return iter_file_tree(FILE_TREE)
+
     def after_register(self, *args):
         return None, None
 
@@ -453,7 +469,7 @@ class TestArchiverTasks(ArchiverTestCase):
                     'name': 'Fake',
                     'children': []
                 }
-            setattr(mock_addon, '_get_file_tree', empty_file_tree)
+            setattr(mock_addon, '_iter_file_tree', lambda user, version: iter_file_tree(empty_file_tree(user, version)))
             mock_get_addon.return_value = mock_addon
             results = [stat_addon(addon, self.archive_job._id) for addon in ['osfstorage']]
             archive_node(results, job_pk=self.archive_job._id)
@@ -478,31 +494,158 @@ class TestArchiverTasks(ArchiverTestCase):
         assert(mock_group.called_with(archive_dropbox_signature))
 
     @use_fake_addons
-    @mock.patch('website.archiver.tasks.make_copy_request.delay')
-    def test_archive_addon(self, mock_make_copy_request):
-        result = archiver_utils.aggregate_file_tree_metadata('dropbox', FILE_TREE, self.user)
-        archive_addon('dropbox', self.archive_job._id, result)
-        assert_equal(self.archive_job.get_target('dropbox').status, ARCHIVER_INITIATED)
-        cookie = self.user.get_or_create_cookie()
-        assert(mock_make_copy_request.called_with(
-            self.archive_job._id,
-            settings.WATERBUTLER_URL + '/ops/copy',
-            data=dict(
-                source=dict(
-                    cookie=cookie,
-                    nid=self.src._id,
-                    provider='dropbox',
-                    path='/',
-                ),
-                destination=dict(
-                    cookie=cookie,
-                    nid=self.dst._id,
-                    provider=settings.ARCHIVE_PROVIDER,
-                    path='/',
-                ),
-                rename='Archive of DropBox',
-            )
-        ))
+    def test_stat_addon_records_manifest(self):
+        stat_addon('dropbox', self.archive_job._id)
+        manifest = list(self.archive_job.get_target('dropbox').iter_files())
+        assert_equal(
+            sorted((entry['path'], entry['folder_names'], entry['size']) for entry in manifest),
+            [('/1234567', [], 128), ('/qwerty/asdfgh', ['A Folder'], 256)]
+        )
+        assert_true(all(entry['status'] == ARCHIVER_INITIATED for entry in manifest))
+
+    @use_fake_addons
+    def test_stat_addon_reuses_manifest(self):
+        stat_addon('dropbox', self.archive_job._id)
+        with mock.patch.object(MockAddon, '_iter_file_tree') as mock_iter:
+            res = stat_addon('dropbox', self.archive_job._id)
+        assert_false(mock_iter.called)
+        assert_equal(res.num_files, 2)
+
+    @use_fake_addons
+    @mock.patch('website.archiver.utils.create_archive_folders')
+    @mock.patch('website.archiver.tasks.copy_files.delay')
+    def test_archive_addon(self, mock_copy_files, mock_create_folders):
+        result = stat_addon('dropbox', self.archive_job._id)
+        with mock.patch.object(settings, 'ARCHIVE_COPY_BATCH_SIZE', 1):
+            archive_addon('dropbox', self.archive_job._id, result)
+        target = self.archive_job.get_target('dropbox')
+        assert_equal(target.status, ARCHIVER_INITIATED)
+        assert_equal(mock_create_folders.call_args[0][0], target)
+        assert_equal(mock_create_folders.call_args[0][2], 'Some Archive')
+        assert_equal(
+            sorted(each[1]['paths'] for each in mock_copy_files.call_args_list),
+            [['/1234567'], ['/qwerty/asdfgh']]
+        )
+
+    def _stat_for_copy(self):
+        stat_addon('dropbox', self.archive_job._id)
+        target = self.archive_job.get_target('dropbox')
+        target.set_destination([], '/archive/')
+        target.set_destination(['A Folder'], '/archive/')
+        return target
+
+    @use_fake_addons
+    def test_stat_addon_discards_partial_manifest(self):
+        def iter_file_tree(*args, **kwargs):
+            yield {'path': '/1234567', 'name': 'Afile.file', 'size': 128}, ()
+            raise HTTPError(http.BAD_GATEWAY, data={'error': 'Gone'})
+        with mock.patch.object(MockAddon, '_iter_file_tree', side_effect=iter_file_tree):
+            with mock.patch.object(settings, 'ARCHIVE_COPY_BATCH_SIZE', 1):
+                with assert_raises(HTTPError):
+                    stat_addon('dropbox', self.archive_job._id)
+        assert_false(self.archive_job.get_target('dropbox').has_manifest())
+
+    @use_fake_addons
+    @mock.patch('website.project.signals.archive_callback.send')
+    def test_copy_files(self, mock_callback):
+        target = self._stat_for_copy()
+        paths = [entry['path'] for entry in target.iter_files()]
+        with mock.patch('website.archiver.tasks._copy_file', return_value=http.CREATED) as mock_copy:
+            copy_files(job_pk=self.archive_job._id, addon_short_name='dropbox', paths=paths)
+        data = mock_copy.call_args[0][1]
+        assert_equal(data['destination']['path'], '/archive/')
+        assert_in(data['source']['path'], paths)
+        target.reload()
+        assert_equal(target.status, ARCHIVER_SUCCESS)
+        assert_equal(target.progress['copied'], 2)
+        assert_equal(target.progress['bytes_copied'], 128 + 256)
+        assert_true(mock_callback.called)
+
+    @use_fake_addons
+    def test_copy_files_accepted_waits_for_callback(self):
+        target = self._stat_for_copy()
+        paths = [entry['path'] for entry in target.iter_files()]
+        with mock.patch('website.archiver.tasks._copy_file', return_value=http.ACCEPTED):
+            copy_files(job_pk=self.archive_job._id, addon_short_name='dropbox', paths=paths)
+        target.reload()
+        assert_equal(target.status, ARCHIVER_INITIATED)
+        assert_equal(target.progress['pending'], 2)
+        assert_true(all(entry['status'] == ARCHIVER_PENDING for entry in target.iter_files()))
+
+        # A resumed batch does not send accepted files again before they time out
+        with mock.patch('website.archiver.tasks._copy_file') as mock_copy:
+            copy_files(job_pk=self.archive_job._id, addon_short_name='dropbox', paths=paths)
+        assert_false(mock_copy.called)
+
+        for path in paths:
+            self.archive_job.file_copied(self.archive_job.find_file_target('dropbox', path), path)
+        target.reload()
+        assert_equal(target.status, ARCHIVER_SUCCESS)
+
+    @use_fake_addons
+    def test_copy_files_resumes_from_manifest(self):
+        target = self._stat_for_copy()
+        paths = [entry['path'] for entry in target.iter_files()]
+        with mock.patch('website.archiver.tasks._copy_file', side_effect=[http.CREATED, http.SERVICE_UNAVAILABLE]):
+            with assert_raises(HTTPError):
+                copy_files(job_pk=self.archive_job._id, addon_short_name='dropbox', paths=paths)
+        target.reload()
+        remaining = list(target.remaining_files())
+        assert_equal(len(remaining), 1)
+        assert_equal(remaining[0]['status'], ARCHIVER_INITIATED)
+        assert_equal(remaining[0]['attempts'], 1)
+
+        with mock.patch('website.archiver.tasks._copy_file', return_value=http.CREATED) as mock_copy:
+            copy_files(job_pk=self.archive_job._id, addon_short_name='dropbox', paths=paths)
+        assert_equal(mock_copy.call_count, 1)
+        assert_equal(mock_copy.call_args[0][1]['source']['path'], remaining[0]['path'])
+        target.reload()
+        assert_equal(target.status, ARCHIVER_SUCCESS)
+
+    @use_fake_addons
+    def test_copy_files_resends_files_in_flight(self):
+        # The worker died after claiming the first file and the second was
+        # accepted too long ago; both are sent again when the batch is redelivered
+        target = self._stat_for_copy()
+        target.update_file('/1234567', ARCHIVER_SENDING, attempted=True)
+        target.update_file('/qwerty/asdfgh', ARCHIVER_PENDING, attempted=True)
+        with mock.patch.object(settings, 'ARCHIVE_COPY_ACCEPTED_TIMEOUT', datetime.timedelta(0)):
+            with mock.patch('website.archiver.tasks._copy_file', return_value=http.CREATED) as mock_copy:
+                copy_files(job_pk=self.archive_job._id, addon_short_name='dropbox', paths=['/1234567', '/qwerty/asdfgh'])
+        assert_equal(mock_copy.call_count, 2)
+        assert_equal([entry['attempts'] for entry in target.iter_files()], [2, 2])
+        target.reload()
+        assert_equal(target.status, ARCHIVER_SUCCESS)
+
+    @use_fake_addons
+    def test_file_copied_ignores_repeated_callback(self):
+        target = self._stat_for_copy()
+        self.archive_job.file_copied(target, '/1234567')
+        self.archive_job.file_copied(target, '/1234567', errors=['Late failure'])
+        assert_equal(target.get_file('/1234567')['status'], ARCHIVER_SUCCESS)
+        target.reload()
+        assert_equal(target.status, ARCHIVER_INITIATED)
+
+    @use_fake_addons
+    def test_registration_callback_outside_manifest_is_ignored(self):
+        target = self._stat_for_copy()
+        message, signature = signing.default_signer.sign_payload({
+            'source': {'provider': 'dropbox', 'path': '/not-in-manifest'},
+            'destination': {'name': 'Dropbox'},
+            'time': time.time() + 1000,
+        })
+        url = self.dst.api_url_for('registration_callbacks')
+        self.app.put_json(url, {'payload': message, 'signature': signature})
+        target.reload()
+        assert_equal(target.status, ARCHIVER_INITIATED)
+        assert_true(target.has_remaining_files())
+
+    @use_fake_addons
+    def test_copy_files_fails_on_client_error(self):
+        self._stat_for_copy()
+        with mock.patch('website.archiver.tasks._copy_file', return_value=http.FORBIDDEN):
+            with assert_raises(HTTPError):
+                copy_files(job_pk=self.archive_job._id, addon_short_name='dropbox', paths=['/1234567'])
 
     def test_archive_success(self):
         node = factories.NodeFactory(creator=self.user)
@@ -804,6 +947,31 @@ class TestArchiverUtils(ArchiverTestCase):
         assert_equal(len(a_stat_result.targets), 2)
 
     @use_fake_addons
+    def test_create_archive_folders(self):
+        node = factories.NodeFactory(creator=self.user)
+        root = node.get_addon('osfstorage').get_root()
+        target = ArchiveTarget(name='dropbox')
+        target.save()
+        target.add_files([
+            {'path': '/a', 'folder_names': []},
+            {'path': '/sub/b', 'folder_names': ['sub']},
+            {'path': '/sub/c', 'folder_names': ['sub']},
+            {'path': '/d', 'folder_names': ['other']},
+        ])
+        target.set_destination(['other'], '/done/')
+        archiver_utils.create_archive_folders(target, root, 'Archive of Dropbox/Folder')
+
+        archive_folder = root.children[0]
+        assert_equal(archive_folder.name, 'Archive of Dropbox-Folder')
+        assert_equal([child.name for child in archive_folder.children], ['sub'])
+        destinations = [entry['destination'] for entry in target.iter_files().sort('path', 1)]
+        assert_equal(destinations, [
+            archive_folder.path,
+            archive_folder.children[0].path,
+            archive_folder.children[0].path,
+            '/done/',
+        ])
+
     def test_archive_provider_for(self):
         provider = self.src.get_addon(settings.ARCHIVE_PROVIDER)
         assert_equal(archiver_utils.archive_provider_for(self.src, self.user)._id, provider._id)
@@ -842,6 +1010,17 @@ class TestArchiverUtils(ArchiverTestCase):
             else:
                 stack = stack + item['children']
 
+    def test_get_deduplicated_files(self):
+        node = factories.NodeFactory(creator=self.user)
+        file_tree = file_tree_factory(1, 3, 0)
+        archived = file_tree['children'][0]['extra']['hashes']['sha256']
+        archive_index.add(archived, 'vault', 'archive', 10)
+        with mock.patch.object(StorageAddonBase, '_get_file_tree', mock.Mock(return_value=file_tree)):
+            with mock.patch('website.files.archive_index.lookup_many', wraps=archive_index.lookup_many) as mock_lookup:
+                deduplicated = archiver_utils.get_deduplicated_files(node)
+        assert_equal(mock_lookup.call_count, 1)
+        assert_equal([sha256 for sha256, _, _ in deduplicated], [archived])
+
     def test_get_file_map_with_components(self):
         node = factories.NodeFactory()
         comp1 = factories.NodeFactory(parent=node)
@@ -1229,6 +1408,28 @@ class TestArchiveTarget(OsfTestCase):
         assert_in('ArchiveTarget', result)
         assert_in(str(target._id), result)
 
+    def test_progress(self):
+        target = ArchiveTarget()
+        target.save()
+        target.add_files([
+            {'path': '/a', 'size': 10},
+            {'path': '/b', 'size': 20},
+            {'path': '/c', 'size': 30},
+        ])
+        target.update_file('/a', ARCHIVER_SUCCESS)
+        target.update_file('/b', ARCHIVER_FAILURE)
+        assert_equal(target.progress, {
+            'num_files': 3,
+            'copied': 1,
+            'failed': 1,
+            'pending': 1,
+            'disk_usage': 60,
+            'bytes_copied': 10,
+        })
+        assert_equal(sorted(entry['path'] for entry in target.remaining_files()), ['/b', '/c'])
+        assert_false(target.update_file('/a', ARCHIVER_FAILURE, current=[ARCHIVER_INITIATED]))
+        assert_equal(target.get_file('/a')['status'], ARCHIVER_SUCCESS)
+
 
 class TestArchiveJobModel(OsfTestCase):
 
@@ -1260,6 +1461,7 @@ class TestArchiveJobModel(OsfTestCase):
         assert_equal(item['status'], target.status)
         assert_equal(item['stat_result'], target.stat_result)
         assert_equal(item['errors'], target.errors)
+        assert_equal(item['progress']['num_files'], 0)
 
     @use_fake_addons
     def test_get_target(self):
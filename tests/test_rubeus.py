@@ -5,6 +5,7 @@ import os
 from types import NoneType
 from xmlrpclib import DateTime
 
+import gevent
 import mock
 from nose.tools import *
 from webtest_plus import TestApp
@@ -335,6 +336,23 @@ class TestSerializingNodeWithAddon(OsfTestCase):
         ret = self.serializer._collect_addons(self.project)
         assert_equal(ret, [serialized])
 
+    def test_collect_addons_caches_root_folder(self):
+        addon = mock.Mock()
+        addon.config.get_hgrid_data.return_value = [serialized]
+        self.project.get_addons.return_value = [addon]
+        assert_equal(self.serializer._collect_addons(self.project), [serialized])
+        assert_equal(self.serializer._collect_addons(self.project), [serialized])
+        assert_equal(addon.config.get_hgrid_data.call_count, 1)
+
+    def test_collect_addons_unavailable_on_timeout(self):
+        addon = mock.Mock()
+        addon.config.get_hgrid_data.side_effect = lambda *args, **kwargs: gevent.sleep(1)
+        self.project.get_addons.return_value = [addon]
+        with mock.patch('website.settings.ADDON_HGRID_TIMEOUT', 0.01):
+            ret = self.serializer._collect_addons(self.project)
+        assert_equal(len(ret), 1)
+        assert_true(ret[0]['unavailable'])
+
     def test_sort_by_name(self):
         files = [
             {'name': 'F.png'},
@@ -13,9 +13,11 @@ from modularodm import Q
 from framework.auth.core import Auth
 from website import settings
 import website.search.search as search
-from website.search import elastic_search
+from website.search import elastic_search, outbox
 from website.search.util import build_query
-from website.search_migration.migrate import migrate
+from framework.mongo import handlers as mongo_handlers
+from website.search_migration import migrate as migrate_module
+from website.search_migration.migrate import ACTIONS, checkpoints, migrate, plan_migration, set_up_index
 from website.models import Retraction, NodeLicense, Tag
 
 from tests import factories
@@ -800,6 +802,48 @@ class TestSearchMigration(SearchTestCase):
             assert_equal(var[settings.ELASTIC_INDEX + '_v{}'.format(n + 1)]['aliases'].keys()[0], settings.ELASTIC_INDEX)
             assert not var.get(settings.ELASTIC_INDEX + '_v{}'.format(n))
 
+    def test_migration_indexes_documents(self):
+        migrate(delete=False, index=settings.ELASTIC_INDEX, app=self.app.app)
+        assert_equal(len(query_user('David Bowie')['results']), 1)
+        assert_is_none(checkpoints.find_one({'_id': settings.ELASTIC_INDEX}))
+
+    def test_resume_skips_completed_ranges(self):
+        new_index = set_up_index(settings.ELASTIC_INDEX)
+        checkpoint = plan_migration(settings.ELASTIC_INDEX, new_index)
+        for range_ in checkpoint['ranges']:
+            if range_['doc_type'] == 'user':
+                range_.update(done=True, counts={}, failures=0)
+        checkpoints.save(checkpoint)
+
+        user_actions = mock.Mock(return_value=[])
+        with mock.patch.dict(ACTIONS, {'user': user_actions}):
+            migrate(delete=False, index=settings.ELASTIC_INDEX, app=self.app.app, resume=True)
+        assert_false(user_actions.called)
+        var = self.es.indices.get_aliases()
+        assert_equal(var[new_index]['aliases'].keys()[0], settings.ELASTIC_INDEX)
+
+    def test_failed_validation_keeps_checkpoint(self):
+        def failing_actions(index, start, end):
+            yield {'_op_type': 'delete', '_index': index, '_type': 'user', '_id': 'missing'}
+
+        with mock.patch.dict(ACTIONS, {'user': failing_actions}):
+            with assert_raises(RuntimeError):
+                migrate(delete=False, index=settings.ELASTIC_INDEX, app=self.app.app)
+        assert_is_not_none(checkpoints.find_one({'_id': settings.ELASTIC_INDEX}))
+
+        migrate(delete=False, index=settings.ELASTIC_INDEX, app=self.app.app, resume=True)
+        assert_is_none(checkpoints.find_one({'_id': settings.ELASTIC_INDEX}))
+
+    @mock.patch('website.search_migration.migrate.do_set_backends')
+    def test_worker_does_not_share_mongo_clients(self, mock_set_backends):
+        parent_client = mongo_handlers.client._get_current_object()
+        with mock.patch.object(mongo_handlers, 'CLIENT_POOL', mongo_handlers.CLIENT_POOL):
+            with mock.patch.object(migrate_module, 'worker_es', None):
+                migrate_module.init_worker()
+                assert_is_not(mongo_handlers.client._get_current_object(), parent_client)
+                assert_is_not_none(migrate_module.worker_es)
+        assert_true(mock_set_backends.called)
+
 class TestSearchFiles(SearchTestCase):
 
     def setUp(self):
@@ -874,3 +918,106 @@ class TestSearchFiles(SearchTestCase):
         node.save()
         find = query_file('The Dock of the Bay.mp3')['results']
         assert_equal(len(find), 0)
+
+    def test_rename_node_updates_file_node_title(self):
+        self.root.append_file('Respect.mp3')
+        self.node.set_title('Otis Blue', auth=Auth(self.node.creator), save=True)
+        find = query_file('Respect.mp3')['results']
+        assert_equal(find[0]['node_title'], 'Otis Blue')
+
+    @mock.patch('website.search.elastic_search.bulk_update_node_files')
+    def test_file_documents_not_reindexed_for_unrelated_fields(self, mock_update_files):
+        self.node.set_description('Soul', auth=Auth(self.node.creator), save=True)
+        assert_false(mock_update_files.called)
+        self.node.set_title('Otis Blue', auth=Auth(self.node.creator), save=True)
+        assert_equal(mock_update_files.call_count, 1)
+
+
+class TestSearchOutbox(SearchTestCase):
+
+    def setUp(self):
+        super(TestSearchOutbox, self).setUp()
+        outbox.collection.remove()
+        self.node = factories.ProjectFactory(is_public=True, title='Green Onions')
+
+    def tearDown(self):
+        super(TestSearchOutbox, self).tearDown()
+        outbox.collection.remove()
+        outbox.dead_letters.remove()
+
+    def test_repeated_marks_collapse(self):
+        outbox.mark_dirty('node', self.node._id, saved_fields={'title'})
+        outbox.mark_dirty('node', self.node._id, saved_fields={'description'})
+        entries = list(outbox.collection.find())
+        assert_equal(len(entries), 1)
+        assert_equal(set(outbox.get_saved_fields(entries[0])), {'title', 'description'})
+        outbox.mark_dirty('node', self.node._id)
+        assert_is_none(outbox.get_saved_fields(outbox.collection.find_one()))
+
+    def test_acknowledge_keeps_entries_marked_again(self):
+        outbox.mark_dirty('node', self.node._id)
+        entries = list(outbox.collection.find())
+        outbox.mark_dirty('node', self.node._id, saved_fields={'title'})
+        outbox.acknowledge(entries)
+        assert_equal(outbox.stats()['depth'], 1)
+
+    def test_drain_indexes_queued_documents(self):
+        self.node.title = 'Time Is Tight'
+        with mock.patch.object(settings, 'USE_CELERY', True):
+            self.node.save()
+        assert_equal(len(query('Time Is Tight')['results']), 0)
+        assert_equal(outbox.stats()['depth'], 1)
+
+        assert_equal(search.drain_outbox(), 1)
+        assert_equal(len(query('Time Is Tight')['results']), 1)
+        assert_equal(outbox.stats(), {'depth': 0, 'lag': 0})
+
+    def test_drain_deletes_unsearchable_documents(self):
+        user = factories.UserFactory(fullname='Booker Jones')
+        assert_equal(len(query_user('Booker Jones')['results']), 1)
+        user.is_disabled = True
+        with mock.patch.object(settings, 'USE_CELERY', True):
+            user.save()
+        search.drain_outbox()
+        assert_equal(len(query_user('Booker Jones')['results']), 0)
+
+    def test_drain_skips_entries_still_settling(self):
+        outbox.mark_dirty('node', self.node._id)
+        assert_equal(elastic_search.drain_outbox(settle_seconds=60), 0)
+        assert_equal(outbox.stats()['depth'], 1)
+
+    @mock.patch('website.search.elastic_search.serialize_user')
+    def test_drain_skips_entries_that_fail_to_serialize(self, mock_serialize_user):
+        mock_serialize_user.side_effect = ValueError('unserializable')
+        user = factories.UserFactory()
+        outbox.collection.remove()
+        outbox.mark_dirty('user', user._id)
+        outbox.mark_dirty('node', self.node._id)
+
+        assert_equal(search.drain_outbox(), 1)
+        entry = outbox.collection.find_one()
+        assert_equal(entry['object_id'], user._id)
+        assert_equal(entry['attempts'], 1)
+
+    def test_drain_keeps_entries_that_fail_to_index(self):
+        outbox.mark_dirty('node', self.node._id)
+        def failing_bulk(client, actions, **kwargs):
+            for action in actions:
+                yield False, {'index': {'_type': action['_type'], '_id': action['_id'], 'status': 400, 'error': 'MapperParsingException'}}
+
+        with mock.patch.object(elastic_search.helpers, 'streaming_bulk', failing_bulk):
+            assert_equal(search.drain_outbox(), 0)
+        entry = outbox.collection.find_one()
+        assert_equal(entry['attempts'], 1)
+        assert_equal(entry['last_error'], 'MapperParsingException')
+
+    @mock.patch('website.search.elastic_search.serialize_node')
+    def test_drain_dead_letters_entries_after_max_attempts(self, mock_serialize_node):
+        mock_serialize_node.side_effect = ValueError('unserializable')
+        outbox.mark_dirty('node', self.node._id)
+        with mock.patch.object(settings, 'SEARCH_OUTBOX_MAX_ATTEMPTS', 2):
+            search.drain_outbox()
+            assert_equal(outbox.stats()['depth'], 1)
+            search.drain_outbox()
+        assert_equal(outbox.stats()['depth'], 0)
+        assert_equal(outbox.dead_letters.find_one()['object_id'], self.node._id)
@@ -198,6 +198,20 @@ class TestViewProject(OsfTestCase):
         assert_equal(result['node']['disapproval_link'], '')
         pending_reg.remove()
 
+    def test_view_project_date_modified_skips_hidden_logs(self):
+        visible_log = self.node.logs[-1]
+        hidden_log = self.node.add_log('tag_added', params={'node': self.node._id}, auth=Auth(self.user))
+        hidden_log.should_hide = True
+        hidden_log.save()
+        result = _view_project(self.node, Auth(self.user))
+        assert_equal(result['node']['date_modified'], framework_utils.iso8601format(visible_log.date))
+
+    def test_view_project_date_modified_of_fork_includes_inherited_logs(self):
+        fork = self.node.fork_node(Auth(self.user))
+        result = _view_project(fork, Auth(self.user))
+        assert_equal(result['node']['date_modified'], framework_utils.iso8601format(fork.logs[-1].date))
+        assert_false(result['node']['children_pending'])
+
 
 class TestNodeLogSerializers(OsfTestCase):
 
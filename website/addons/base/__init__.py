@@ -804,6 +804,22 @@ class StorageAddonBase(object):
         ]
         return filenode
 
+    def _iter_file_tree(self, user=None, cookie=None, version=None):
+        """
+        Lazily walk the file tree, fetching one folder's metadata at a time.
+        Yields ``(file_metadata, folder_names)`` pairs, where ``folder_names``
+        are the names of the folders containing the file, from the root down
+        """
+        stack = [({'path': '/', 'kind': 'folder', 'name': self.root_node.name}, ())]
+        while stack:
+            filenode, folder_names = stack.pop()
+            children = self._get_fileobj_child_metadata(filenode, user, cookie=cookie, version=version)
+            for child in children:
+                if child.get('kind') == 'file':
+                    yield child, folder_names
+                else:
+                    stack.append((child, folder_names + (child['name'], )))
+
 class AddonOAuthNodeSettingsBase(AddonNodeSettingsBase):
     _meta = {
         'abstract': True,
@@ -14,7 +14,9 @@ import datetime
 from modularodm import exceptions as modm_errors
 
 
+from framework.mongo import database
 from website.files import models
+from website.files import archive_index
 from website.addons.osfstorage import utils
 from website.addons.osfstorage import settings
 from website.files.exceptions import FileNodeCheckedOutError
@@ -178,6 +180,21 @@ class TestOsfstorageFileNode(StorageTestCase):
         assert_equals(child.get_download_count(1), 1)
         assert_equals(child.get_download_count(2), 1)
 
+    @mock.patch('framework.analytics.session')
+    def test_prefetch_download_counts(self, mock_session):
+        mock_session.data = {}
+        root = self.node_settings.get_root()
+        downloaded = root.append_file('Downloaded')
+        untouched = root.append_file('Untouched')
+        utils.update_analytics(self.project, downloaded._id, 0)
+        utils.update_analytics(self.project, downloaded._id, 1)
+
+        models.OsfStorageFile.prefetch_download_counts([downloaded, untouched])
+        with mock.patch('website.files.models.base.get_basic_counters') as mock_get_counters:
+            assert_equals(downloaded.get_download_count(), 2)
+            assert_equals(untouched.get_download_count(), 0)
+        assert_false(mock_get_counters.called)
+
     @unittest.skip
     def test_create_version(self):
         pass
@@ -660,8 +677,56 @@ class TestOsfStorageFileVersion(StorageTestCase):
 
         assert_equal(version2.archive, 'erchiv')
 
+    def test_matching_archive_counts_savings(self):
+        archived = factories.FileVersionFactory(
+            location={
+                'service': 'cloud',
+                settings.WATERBUTLER_RESOURCE: 'osf',
+                'object': '06d80e',
+            },
+            metadata={'sha256': 'saved'},
+        )
+        archived.update_metadata({'size': 1024, 'vault': 'the cloud', 'archive': 'erchiv'})
+        assert_equal(archive_index.lookup('saved')['archive'], 'erchiv')
+
+        savings = archive_index.get_savings()
+        for _ in range(2):
+            version = factories.FileVersionFactory(
+                location={
+                    'service': 'cloud',
+                    settings.WATERBUTLER_RESOURCE: 'osf',
+                    'object': 'd077f2',
+                },
+                metadata={'sha256': 'saved'}
+            )
+            assert_is(version._find_matching_archive(), True)
+
+        assert_equal(archive_index.lookup('saved')['duplicates'], 2)
+        assert_equal(archive_index.get_savings()['bytes_saved'], savings['bytes_saved'] + 2048)
+
+    def test_rebuild_archive_index(self):
+        for sha256, archive in [('first', 'a1'), ('first', 'a1'), ('first', 'a2'), ('second', 'b1')]:
+            factories.FileVersionFactory(
+                location={
+                    'service': 'cloud',
+                    settings.WATERBUTLER_RESOURCE: 'osf',
+                    'object': '06d80e',
+                },
+                metadata={'sha256': sha256, 'vault': 'the cloud', 'archive': archive},
+                size=10,
+            )
+        database[archive_index.COLLECTION].remove({})
+
+        archive_index.rebuild_index()
+        entries = archive_index.lookup_many(['first', 'second', 'missing'])
+        assert_equal(sorted(entries), ['first', 'second'])
+        assert_equal(entries['first']['archive'], 'a1')
+        assert_equal(entries['first']['duplicates'], 1)
+        assert_equal(entries['second']['duplicates'], 0)
+
     def test_no_matching_archive(self):
         models.FileVersion.remove()
+        database[archive_index.COLLECTION].remove({})
         assert_is(False, factories.FileVersionFactory(
             location={
                 'service': 'cloud',
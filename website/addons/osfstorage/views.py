@@ -77,6 +77,7 @@ def osfstorage_update_metadata(node_addon, payload, **kwargs):
 @decorators.autoload_filenode(must_be='file')
 def osfstorage_get_revisions(file_node, node_addon, payload, **kwargs):
     is_anon = has_anonymous_link(node_addon.owner, Auth(private_key=request.args.get('view_only')))
+    models.OsfStorageFile.prefetch_download_counts([file_node], versions=True)
 
     # Return revisions in descending order
     return {
@@ -130,9 +131,11 @@ def osfstorage_get_metadata(file_node, **kwargs):
 @must_be_signed
 @decorators.autoload_filenode(must_be='folder')
 def osfstorage_get_children(file_node, **kwargs):
+    children = list(file_node.children)
+    models.OsfStorageFile.prefetch_download_counts([child for child in children if child.is_file])
     return [
         child.serialize()
-        for child in file_node.children
+        for child in children
     ]
 
 
@@ -2,6 +2,8 @@
 
 import datetime
 import functools
+import hashlib
+import json
 import logging
 import urllib
 
@@ -13,6 +15,7 @@ import markdown
 from markdown.extensions import codehilite, fenced_code, wikilinks
 from modularodm import fields
 
+from framework.mongo import database
 from framework.mongo.utils import to_mongo_key
 from framework.forms.utils import sanitize
 from framework.guid.model import GuidStoredObject
@@ -21,7 +24,7 @@ from framework.mongo import utils as mongo_utils
 from website import settings
 from website.addons.base import AddonNodeSettingsBase
 from website.addons.wiki import utils as wiki_utils
-from website.addons.wiki.settings import WIKI_CHANGE_DATE
+from website.addons.wiki.settings import WIKI_CHANGE_DATE, WIKI_RENDER_VERSION
 from website.project.commentable import Commentable
 from website.project.model import Node
 from website.project.signals import write_permissions_revoked
@@ -176,6 +179,13 @@ class NodeWikiPage(GuidStoredObject, Commentable):
     user = fields.ForeignField('user')
     node = fields.ForeignField('node')
 
+    # HTML and plain text rendering of ``content``, along with a hash of the node and content
+    # they were rendered for and of how they were rendered. Wiki links only depend on the node
+    # id and the link text, so renaming or deleting pages does not invalidate them.
+    rendered_html = fields.StringField()
+    rendered_text = fields.StringField()
+    rendered_key = fields.StringField()
+
     # For Django compatibility
     @property
     def pk(self):
@@ -233,22 +243,49 @@ class NodeWikiPage(GuidStoredObject, Commentable):
     def get_absolute_url(self):
         return self.absolute_api_v2_url
 
-    def html(self, node):
-        """The cleaned HTML of the page"""
+    def _render_key(self, node):
+        renderer = u'{}:{}'.format(WIKI_RENDER_VERSION, json.dumps(settings.WIKI_WHITELIST, sort_keys=True))
+        return hashlib.md5(u'{}:{}:{}'.format(renderer, node._id, self.content).encode('utf-8')).hexdigest()
+
+    def _render(self, node):
+        """Return the cleaned HTML and the raw text of the page"""
         sanitized_content = render_content(self.content, node=node)
         try:
-            return linkify(
+            html = linkify(
                 sanitized_content,
                 [nofollow, ],
             )
         except TypeError:
             logger.warning('Returning unlinkified content.')
-            return sanitized_content
+            html = sanitized_content
+        return html, sanitize(html, tags=[], strip=True)
+
+    def _rendered(self, node):
+        """Return the cached rendering of the page for ``node``, rendering and storing it
+        if the page was rendered for another node or content, or not at all.
+        """
+        key = self._render_key(node)
+        if self.rendered_key == key:
+            return self.rendered_html, self.rendered_text
+        if node != self.node:
+            return self._render(node)
+        self.rendered_html, self.rendered_text = self._render(node)
+        self.rendered_key = key
+        # Store without a full save, which would re-index the node
+        database[self._name].update({'_id': self._id}, {'$set': {
+            'rendered_html': self.rendered_html,
+            'rendered_text': self.rendered_text,
+            'rendered_key': self.rendered_key,
+        }})
+        return self.rendered_html, self.rendered_text
+
+    def html(self, node):
+        """The cleaned HTML of the page"""
+        return self._rendered(node)[0]
 
     def raw_text(self, node):
         """ The raw text of the page, suitable for using in a test search"""
-
-        return sanitize(self.html(node), tags=[], strip=True)
+        return self._rendered(node)[1]
 
     def get_draft(self, node):
         """
@@ -289,9 +326,15 @@ class NodeWikiPage(GuidStoredObject, Commentable):
                                         data=contributors)
 
     def save(self, *args, **kwargs):
+        # New versions are rendered as they are written; clones and old versions are rendered on
+        # first view, see `_rendered`
+        render = kwargs.pop('render', True)
+        if render and not self._is_loaded and self.node:
+            self.rendered_html, self.rendered_text = self._render(self.node)
+            self.rendered_key = self._render_key(self.node)
         rv = super(NodeWikiPage, self).save(*args, **kwargs)
         if self.node:
-            self.node.update_search()
+            self.node.update_search(saved_fields={'wiki_pages_current'})
         return rv
 
     def rename(self, new_name, save=True):
@@ -313,7 +356,9 @@ class NodeWikiPage(GuidStoredObject, Commentable):
         clone = self.clone()
         clone.node = node
         clone.user = self.user
-        clone.save()
+        # Links in the rendering point at the original node
+        clone.rendered_html = clone.rendered_text = clone.rendered_key = None
+        clone.save(render=False)
         return clone
 
     @classmethod
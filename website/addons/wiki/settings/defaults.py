@@ -11,3 +11,7 @@ SHAREJS_DB_URL = 'mongodb://{}:{}/{}'.format(settings.DB_HOST, settings.DB_PORT,
 
 # TODO: Change to release date for wiki change
 WIKI_CHANGE_DATE = datetime.datetime.utcfromtimestamp(1423760098)
+
+# Version of the rendering of wiki pages, part of the key of their cached HTML. Bump it when the
+# Markdown extensions or post-processing in `render_content` change, to re-render cached pages.
+WIKI_RENDER_VERSION = 1
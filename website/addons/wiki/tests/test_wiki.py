@@ -761,6 +761,45 @@ class TestWikiLinks(OsfTestCase):
         assert_equal(expected, wiki.html(node))
 
 
+class TestWikiRenderCache(OsfTestCase):
+
+    def setUp(self):
+        super(TestWikiRenderCache, self).setUp()
+        self.project = ProjectFactory()
+        self.wiki = NodeWikiFactory(content='**bold** [[wiki2]]', node=self.project)
+
+    def test_rendered_on_save(self):
+        assert_in('<strong>bold</strong>', self.wiki.rendered_html)
+        assert_equal(self.wiki.rendered_text.strip(), 'bold wiki2')
+
+    @mock.patch('website.addons.wiki.model.render_content')
+    def test_html_and_raw_text_use_cache(self, mock_render):
+        html = self.wiki.html(self.project)
+        raw_text = self.wiki.raw_text(self.project)
+        assert_false(mock_render.called)
+        assert_in('/{}/wiki/wiki2/'.format(self.project._id), html)
+        assert_equal(raw_text, self.wiki.rendered_text)
+
+    def test_rendered_again_for_clone(self):
+        fork = ProjectFactory()
+        clone = self.wiki.clone_wiki(fork._id)
+        assert_is_none(clone.rendered_key)
+        assert_in('/{}/wiki/wiki2/'.format(fork._id), clone.html(fork))
+        assert_not_in(self.project._id, clone.rendered_html)
+
+    @mock.patch('website.addons.wiki.model.render_content')
+    def test_old_version_not_rendered_when_saved_again(self, mock_render):
+        self.wiki.save()
+        assert_false(mock_render.called)
+
+    def test_rendered_again_when_renderer_changes(self):
+        key = self.wiki.rendered_key
+        with mock.patch('website.addons.wiki.model.WIKI_RENDER_VERSION', 2):
+            assert_not_equal(self.wiki._render_key(self.project), key)
+            self.wiki.html(self.project)
+            assert_equal(self.wiki.rendered_key, self.wiki._render_key(self.project))
+
+
 class TestWikiUuid(OsfTestCase):
 
     def setUp(self):
@@ -28,8 +28,10 @@ from website import maintenance
 
 # This import is necessary to set up the archiver signal listeners
 from website.archiver import listeners  # noqa
+from website.conferences import listeners  # noqa
 from website.mails import listeners  # noqa
 from website.notifications import listeners  # noqa
+from website import statistics  # noqa
 from api.caching import listeners  # noqa
 
 
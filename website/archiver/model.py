@@ -4,9 +4,12 @@ from modularodm import fields
 
 from framework.mongo import ObjectId
 from framework.mongo import StoredObject
+from framework.mongo import database
 
 from website.archiver import (
     ARCHIVER_INITIATED,
+    ARCHIVER_SENDING,
+    ARCHIVER_PENDING,
     ARCHIVER_SUCCESS,
     ARCHIVER_FAILURE,
     ARCHIVER_FAILURE_STATUSES
@@ -15,6 +18,12 @@ from website.archiver import (
 from website.addons.base import StorageAddonBase
 from website import settings
 
+# One document per (ArchiveTarget, path) to copy, see ArchiveTarget.add_files
+MANIFEST_COLLECTION = 'archivemanifest'
+# Manifest statuses of a file that has not finished copying: not sent yet, being
+# sent, or accepted by WaterButler and waiting for its callback
+MANIFEST_COPYING_STATUSES = (ARCHIVER_INITIATED, ARCHIVER_SENDING, ARCHIVER_PENDING)
+
 
 class ArchiveTarget(StoredObject):
     """Stores the results of archiving a single addon
@@ -48,6 +57,106 @@ class ArchiveTarget(StoredObject):
             self.status
         )
 
+    # The manifest has one document per file to copy, in its own collection so
+    # that entries are updated atomically and independently of each other
+    # Format: {
+    #     'target': <str> _id of the ArchiveTarget,
+    #     'path': <str> path of the file on the source addon,
+    #     'name': <str>,
+    #     'size': <float>,
+    #     'folder_names': <list> names of the folders containing the file,
+    #     'destination': <str> path of the archive folder the file is copied into,
+    #     'status': ARCHIVER_INITIATED | ARCHIVER_SENDING | ARCHIVER_PENDING | ARCHIVER_SUCCESS | ARCHIVER_FAILURE,
+    #     'attempts': <int>,
+    #     'date_modified': <datetime>,
+    # }
+    @property
+    def _manifest(self):
+        return database[MANIFEST_COLLECTION]
+
+    def add_files(self, entries):
+        """Add ``entries``, dicts of path, name, size and folder_names, to the manifest."""
+        self._manifest.ensure_index([('target', 1), ('path', 1)], unique=True)
+        self._manifest.ensure_index([('target', 1), ('status', 1)])
+        now = datetime.datetime.utcnow()
+        docs = [
+            dict(entry, target=self._id, destination=None, status=ARCHIVER_INITIATED, attempts=0, date_modified=now)
+            for entry in entries
+        ]
+        if docs:
+            self._manifest.insert(docs)
+
+    def clear_manifest(self):
+        self._manifest.remove({'target': self._id})
+
+    def has_manifest(self):
+        return self._manifest.find_one({'target': self._id}, {'_id': True}) is not None
+
+    def iter_files(self, paths=None, status=None):
+        query = {'target': self._id}
+        if paths is not None:
+            query['path'] = {'$in': list(paths)}
+        if status is not None:
+            query['status'] = status
+        return self._manifest.find(query)
+
+    def get_file(self, path):
+        return self._manifest.find_one({'target': self._id, 'path': path})
+
+    def remaining_files(self, paths=None):
+        """Manifest entries that have not been copied yet, i.e. where to
+        resume from
+        """
+        return self.iter_files(paths=paths, status={'$ne': ARCHIVER_SUCCESS})
+
+    def has_remaining_files(self):
+        return self._manifest.find_one(
+            {'target': self._id, 'status': {'$ne': ARCHIVER_SUCCESS}}, {'_id': True}
+        ) is not None
+
+    def update_file(self, path, status, attempted=False, current=None):
+        """Atomically set the status of one manifest entry.
+
+        :param current: if given, only update the entry while its status is one of these
+        :return: whether an entry was updated
+        """
+        query = {'target': self._id, 'path': path}
+        if current is not None:
+            query['status'] = {'$in': list(current)}
+        update = {'$set': {'status': status, 'date_modified': datetime.datetime.utcnow()}}
+        if attempted:
+            update['$inc'] = {'attempts': 1}
+        return self._manifest.find_and_modify(query, update, fields={'_id': True}) is not None
+
+    def set_destination(self, folder_names, destination):
+        """Record the archive folder for every entry in ``folder_names`` that has none yet."""
+        self._manifest.update(
+            {'target': self._id, 'folder_names': list(folder_names), 'destination': None},
+            {'$set': {'destination': destination}},
+            multi=True,
+        )
+
+    @property
+    def progress(self):
+        totals = {
+            each['_id']: each
+            for each in self._manifest.aggregate([
+                {'$match': {'target': self._id}},
+                {'$group': {'_id': '$status', 'count': {'$sum': 1}, 'size': {'$sum': '$size'}}},
+            ])['result']
+        }
+        num_files = sum(each['count'] for each in totals.values())
+        copied = totals.get(ARCHIVER_SUCCESS, {}).get('count', 0)
+        failed = totals.get(ARCHIVER_FAILURE, {}).get('count', 0)
+        return {
+            'num_files': num_files,
+            'copied': copied,
+            'failed': failed,
+            'pending': num_files - copied - failed,
+            'disk_usage': sum(each['size'] for each in totals.values()),
+            'bytes_copied': totals.get(ARCHIVER_SUCCESS, {}).get('size', 0),
+        }
+
 
 class ArchiveJob(StoredObject):
 
@@ -95,6 +204,10 @@ class ArchiveJob(StoredObject):
             if target.status not in (ARCHIVER_SUCCESS, ARCHIVER_FAILURE)
         ])
 
+    @property
+    def progress(self):
+        return {target.name: target.progress for target in self.target_addons}
+
     def info(self):
         return self.src_node, self.dst_node, self.initiator
 
@@ -104,7 +217,8 @@ class ArchiveJob(StoredObject):
                 'name': target.name,
                 'status': target.status,
                 'stat_result': target.stat_result,
-                'errors': target.errors
+                'errors': target.errors,
+                'progress': target.progress,
             }
             for target in self.target_addons
         ]
@@ -184,3 +298,33 @@ class ArchiveJob(StoredObject):
         target.stat_result = stat_result
         target.save()
         self._post_update_target()
+
+    def find_file_target(self, provider, path):
+        """Return the target of ``provider`` whose manifest lists ``path``,
+        preferring one that is still copying it, or None if no manifest does
+        """
+        # Dataverse draft and published files are separate targets of the same provider
+        entries = [
+            (target, target.get_file(path)) for target in self.target_addons
+            if target.name == provider or target.name.startswith(provider + '-')
+        ]
+        entries = [(target, entry) for target, entry in entries if entry]
+        entries.sort(key=lambda pair: pair[1]['status'] not in MANIFEST_COPYING_STATUSES)
+        return entries[0][0] if entries else None
+
+    def file_copied(self, target, path, errors=None):
+        """Record the outcome of copying the file at ``path`` of ``target``, and
+        finish the target once every file in its manifest has been copied
+        """
+        updated = target.update_file(
+            path,
+            ARCHIVER_FAILURE if errors else ARCHIVER_SUCCESS,
+            current=MANIFEST_COPYING_STATUSES,
+        )
+        if not updated:
+            # Already recorded
+            return
+        if errors:
+            self.update_target(target.name, ARCHIVER_FAILURE, errors=errors)
+        elif not target.has_remaining_files():
+            self.update_target(target.name, ARCHIVER_SUCCESS, stat_result=target.stat_result)
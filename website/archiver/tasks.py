@@ -1,3 +1,4 @@
+import datetime
 import requests
 import json
 import httplib as http
@@ -11,6 +12,9 @@ from framework.celery_tasks.utils import logged
 from framework.exceptions import HTTPError
 
 from website.archiver import (
+    ARCHIVER_INITIATED,
+    ARCHIVER_SENDING,
+    ARCHIVER_PENDING,
     ARCHIVER_SUCCESS,
     ARCHIVER_FAILURE,
     ARCHIVER_SIZE_EXCEEDED,
@@ -18,6 +22,7 @@ from website.archiver import (
     ARCHIVER_FILE_NOT_FOUND,
     ARCHIVER_UNCAUGHT_ERROR,
     NO_ARCHIVE_LIMIT,
+    StatResult,
     AggregateStatResult,
 )
 from website.archiver import utils
@@ -39,6 +44,16 @@ def create_app_context():
 
 logger = get_task_logger(__name__)
 
+# Copy responses worth retrying; anything else fails the archive
+TRANSIENT_STATUS_CODES = (
+    http.REQUEST_TIMEOUT,
+    429,  # Too Many Requests
+    http.INTERNAL_SERVER_ERROR,
+    http.BAD_GATEWAY,
+    http.SERVICE_UNAVAILABLE,
+    http.GATEWAY_TIMEOUT,
+)
+
 
 class ArchiverSizeExceeded(Exception):
     def __init__(self, result, *args, **kwargs):
@@ -104,80 +119,160 @@ class ArchiverTask(celery.Task):
         archiver_signals.archive_fail.send(dst, errors=errors)
 
 
+def _addon_version(addon_short_name):
+    """Dataverse requires special handling for draft and published content.
+    Return the addon name, version and archive folder suffix for a target.
+    """
+    if 'dataverse' in addon_short_name:
+        if addon_short_name.split('-')[-1] == 'draft':
+            return 'dataverse', 'latest', 'draft'
+        return 'dataverse', 'latest-published', 'published'
+    return addon_short_name, None, None
+
+
 @celery_app.task(base=ArchiverTask, ignore_result=False)
 @logged('stat_addon')
 def stat_addon(addon_short_name, job_pk):
-    """Collect metadata about the file tree of a given addon
+    """Collect metadata about the file tree of a given addon, streaming the
+    tree one folder at a time, and record the files to copy in the target's
+    manifest. A target that already has a manifest is not listed again.
 
     :param addon_short_name: AddonConfig.short_name of the addon to be examined
     :param job_pk: primary key of archive_job
     :return: AggregateStatResult containing file tree metadata
     """
-    # Dataverse reqires special handling for draft and
-    # published content
-    addon_name = addon_short_name
-    version = None
-    if 'dataverse' in addon_short_name:
-        addon_name = 'dataverse'
-        version = 'latest' if addon_short_name.split('-')[-1] == 'draft' else 'latest-published'
+    addon_name, version, _ = _addon_version(addon_short_name)
     create_app_context()
     job = ArchiveJob.load(job_pk)
     src, dst, user = job.info()
     src_addon = src.get_addon(addon_name)
-    try:
-        file_tree = src_addon._get_file_tree(user=user, version=version)
-    except HTTPError as e:
-        dst.archive_job.update_target(
-            addon_short_name,
-            ARCHIVER_NETWORK_ERROR,
-            errors=[e.data['error']],
-        )
-        raise
+    target = job.get_target(addon_short_name)
+    if not target.has_manifest():
+        try:
+            batch = []
+            for metadata, folder_names in src_addon._iter_file_tree(user=user, version=version):
+                batch.append({
+                    'path': metadata['path'],
+                    'name': metadata['name'],
+                    'size': float(metadata.get('size') or 0),
+                    'folder_names': list(folder_names),
+                })
+                if len(batch) >= settings.ARCHIVE_COPY_BATCH_SIZE:
+                    target.add_files(batch)
+                    batch = []
+            target.add_files(batch)
+        except HTTPError as e:
+            # Only a complete manifest may be resumed from
+            target.clear_manifest()
+            dst.archive_job.update_target(
+                addon_short_name,
+                ARCHIVER_NETWORK_ERROR,
+                errors=[e.data['error']],
+            )
+            raise
     result = AggregateStatResult(
         src_addon._id,
         addon_short_name,
-        targets=[utils.aggregate_file_tree_metadata(addon_short_name, file_tree, user)],
+        targets=[
+            StatResult(
+                target_id=entry['path'].lstrip('/'),
+                target_name=entry['name'],
+                disk_usage=entry['size'],
+            )
+            for entry in target.iter_files()
+        ],
     )
     return result
 
 
-@celery_app.task(base=ArchiverTask, ignore_result=False)
-@logged('make_copy_request')
-def make_copy_request(job_pk, url, data):
-    """Make the copy request to the WaterBulter API and handle
-    successful and failed responses
+def _copy_file(url, data):
+    """Send one copy request to WaterButler.
+
+    :return: the response status code, or None if the request did not complete
+    """
+    try:
+        return requests.post(url, data=json.dumps(data)).status_code
+    except requests.exceptions.RequestException as e:
+        logger.warning('Copy request for {0} failed: {1}'.format(data['source']['path'], e))
+        return None
+
+
+@celery_app.task(base=ArchiverTask, bind=True, ignore_result=False, acks_late=True,
+                 max_retries=settings.ARCHIVE_COPY_MAX_RETRIES)
+@logged('copy_files')
+def copy_files(self, job_pk, addon_short_name, paths):
+    """Copy a batch of files from an addon into the registration's archive
+    folders. Files that fail with a transient error are retried with the
+    task; files already copied according to the manifest are skipped, so a
+    retried batch resumes where it stopped. The task is acknowledged once it
+    finishes, so a batch whose worker died is delivered again and re-sends the
+    files that were in flight.
 
     :param job_pk: primary key of ArchiveJob
-    :param url: URL to send request to
-    :param data: <dict> of setting to send in POST to WaterBulter API
+    :param addon_short_name: AddonConfig.short_name of the addon being archived
+    :param paths: source paths of the files in this batch
     :return: None
     """
+    addon_name, revision, _ = _addon_version(addon_short_name)
     create_app_context()
     job = ArchiveJob.load(job_pk)
     src, dst, user = job.info()
-    provider = data['source']['provider']
-    logger.info('Sending copy request for addon: {0} on node: {1}'.format(provider, dst._id))
-    res = requests.post(url, data=json.dumps(data))
-    if res.status_code not in (http.OK, http.CREATED, http.ACCEPTED):
-        raise HTTPError(res.status_code)
+    target = job.get_target(addon_short_name)
+    cookie = user.get_or_create_cookie()
+    copy_url = settings.WATERBUTLER_URL + '/ops/copy'
+    accepted_before = datetime.datetime.utcnow() - settings.ARCHIVE_COPY_ACCEPTED_TIMEOUT
+    failed = None
+    for entry in target.remaining_files(paths=paths):
+        if entry['status'] == ARCHIVER_PENDING and entry['date_modified'] > accepted_before:
+            # Accepted by WaterButler, which has not reported back yet
+            continue
+        # Claim the entry; a callback may have recorded it since it was read
+        if not target.update_file(entry['path'], ARCHIVER_SENDING, attempted=True, current=[entry['status']]):
+            continue
+        data = make_waterbutler_payload(
+            src, dst, addon_name, cookie,
+            path=entry['path'], destination=entry['destination'], revision=revision,
+        )
+        status_code = _copy_file(copy_url, data)
+        if status_code in (http.OK, http.CREATED):
+            job.file_copied(target, entry['path'])
+        elif status_code == http.ACCEPTED:
+            # WaterButler copies in the background and reports back to registration_callbacks
+            target.update_file(entry['path'], ARCHIVER_PENDING, current=[ARCHIVER_SENDING])
+        elif status_code is None or status_code in TRANSIENT_STATUS_CODES:
+            target.update_file(entry['path'], ARCHIVER_INITIATED, current=[ARCHIVER_SENDING])
+            failed = status_code or http.SERVICE_UNAVAILABLE
+        else:
+            raise HTTPError(status_code)
+
+    target.reload()
+    logger.info('Archived {copied} of {num_files} files ({bytes_copied} bytes) of {0} for node {1}'.format(
+        addon_short_name, dst._id, **target.progress
+    ))
+    if failed:
+        countdown = settings.ARCHIVE_COPY_RETRY_DELAY * 2 ** self.request.retries
+        raise self.retry(exc=HTTPError(failed), countdown=countdown)
+    if target.status == ARCHIVER_SUCCESS:
+        project_signals.archive_callback.send(dst)
 
 
-def make_waterbutler_payload(src, dst, addon_short_name, rename, cookie, revision=None):
+def make_waterbutler_payload(src, dst, addon_short_name, cookie, path='/', destination='/', rename=None, revision=None):
     ret = {
         'source': {
             'cookie': cookie,
             'nid': src._id,
             'provider': addon_short_name,
-            'path': '/',
+            'path': path,
         },
         'destination': {
             'cookie': cookie,
             'nid': dst._id,
             'provider': settings.ARCHIVE_PROVIDER,
-            'path': '/',
+            'path': destination,
         },
-        'rename': rename.replace('/', '-')
     }
+    if rename:
+        ret['rename'] = rename.replace('/', '-')
     if revision:
         ret['source']['revision'] = revision
     return ret
@@ -186,41 +281,37 @@ def make_waterbutler_payload(src, dst, addon_short_name, rename, cookie, revisio
 @celery_app.task(base=ArchiverTask, ignore_result=False)
 @logged('archive_addon')
 def archive_addon(addon_short_name, job_pk, stat_result):
-    """Archive the contents of an addon by making a copy request to the
-    WaterBulter API
+    """Archive the contents of an addon: recreate its folders in the archive
+    provider, then copy the files in the manifest that have not been copied
+    yet, in batches of ``settings.ARCHIVE_COPY_BATCH_SIZE``
 
     :param addon_short_name: AddonConfig.short_name of the addon to be archived
     :param job_pk: primary key of ArchiveJob
     :return: None
     """
-    # Dataverse requires special handling for draft
-    # and published content
-    addon_name = addon_short_name
-    if 'dataverse' in addon_short_name:
-        addon_name = 'dataverse'
-        revision = 'latest' if addon_short_name.split('-')[-1] == 'draft' else 'latest-published'
-        folder_name_suffix = 'draft' if addon_short_name.split('-')[-1] == 'draft' else 'published'
+    addon_name, _, folder_name_suffix = _addon_version(addon_short_name)
     create_app_context()
     job = ArchiveJob.load(job_pk)
     src, dst, user = job.info()
     logger.info('Archiving addon: {0} on node: {1}'.format(addon_short_name, src._id))
     src_provider = src.get_addon(addon_name)
     folder_name = src_provider.archive_folder_name
-    cookie = user.get_or_create_cookie()
-    copy_url = settings.WATERBUTLER_URL + '/ops/copy'
-    if addon_name == 'dataverse':
+    if folder_name_suffix:
         # The dataverse API will not differentiate between published and draft files
         # unless expcicitly asked. We need to create seperate folders for published and
         # draft in the resulting archive.
-        #
-        # Additionally trying to run the archive without this distinction creates a race
-        # condition that non-deterministically caused archive jobs to fail.
-        data = make_waterbutler_payload(src, dst, addon_name, '{0} ({1})'.format(folder_name, folder_name_suffix),
-                                        cookie, revision=revision)
-        make_copy_request.delay(job_pk=job_pk, url=copy_url, data=data)
-    else:
-        data = make_waterbutler_payload(src, dst, addon_name, folder_name, cookie)
-        make_copy_request.delay(job_pk=job_pk, url=copy_url, data=data)
+        folder_name = '{0} ({1})'.format(folder_name, folder_name_suffix)
+    target = job.get_target(addon_short_name)
+    utils.create_archive_folders(target, utils.archive_provider_for(dst, user).get_root(), folder_name)
+
+    paths = [entry['path'] for entry in target.remaining_files()]
+    batch_size = settings.ARCHIVE_COPY_BATCH_SIZE
+    for start in range(0, len(paths), batch_size):
+        copy_files.delay(
+            job_pk=job_pk,
+            addon_short_name=addon_short_name,
+            paths=paths[start:start + batch_size],
+        )
 
 
 @celery_app.task(base=ArchiverTask, ignore_result=False)
@@ -322,6 +413,11 @@ def archive_success(dst_pk, job_pk):
     for schema in dst.registered_schema:
         if schema.has_files:
             utils.migrate_file_metadata(dst, schema)
+    if any(schema.has_files for schema in dst.registered_schema):
+        # The file map has already been fetched for the schemas above
+        logger.info('{0} files of registration {1} reuse existing archives'.format(
+            len(utils.get_deduplicated_files(dst)), dst._id
+        ))
     job = ArchiveJob.load(job_pk)
     if not job.sent:
         job.sent = True
@@ -14,6 +14,7 @@ from website import (
     mails,
     settings
 )
+from website.files import archive_index
 
 def send_archiver_size_exceeded_mails(src, user, stat_result):
     mails.send_mail(
@@ -156,6 +157,32 @@ def aggregate_file_tree_metadata(addon_short_name, fileobj_metadata, user):
             targets=[aggregate_file_tree_metadata(addon_short_name, child, user) for child in fileobj_metadata.get('children', [])],
         )
 
+def create_archive_folders(target, root, folder_name):
+    """Recreate the folders of ``target``'s manifest in a new folder named
+    ``folder_name`` under ``root``, and record on each manifest entry the path
+    of the folder it is copied into. Entries that already have a destination,
+    from an earlier attempt, keep it. Only folders containing files are in the
+    manifest, so empty folders are not recreated in the archive.
+
+    :param target: ArchiveTarget being archived
+    :param root: root folder of the archive provider on the registration
+    :param folder_name: name of the folder to archive the target into
+    """
+    folders = {}
+
+    def get_folder(folder_names):
+        if folder_names not in folders:
+            if folder_names:
+                folders[folder_names] = get_folder(folder_names[:-1]).append_folder(folder_names[-1])
+            else:
+                folders[folder_names] = root.append_folder(folder_name.replace('/', '-'))
+        return folders[folder_names]
+
+    for entry in target.iter_files():
+        folder_names = tuple(entry['folder_names'])
+        if not entry['destination'] and folder_names not in folders:
+            target.set_destination(folder_names, get_folder(folder_names).path)
+
 def before_archive(node, user):
     link_archive_provider(node, user)
     job = ArchiveJob(
@@ -202,6 +229,15 @@ def get_file_map(node, file_map):
         for key, value, node_id in get_file_map(child):
             yield (key, value, node_id)
 
+def get_deduplicated_files(node):
+    """Return the ``(<sha256>, <file_metadata>, <node_id>)`` entries of ``node``'s
+    file map whose content was already archived, checking the archive index
+    once for the whole map
+    """
+    file_map = list(get_file_map(node))
+    archived = archive_index.lookup_many(sha256 for sha256, _, _ in file_map)
+    return [entry for entry in file_map if entry[0] in archived]
+
 def find_registration_file(value, node):
     from website.models import Node
 
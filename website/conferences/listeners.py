@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+
+from modularodm import signals
+
+from website.models import Node
+from website.conferences import utils
+
+# Node fields that decide whether a node is a conference submission, or that are shown in its row
+SUBMISSION_FIELDS = {
+    'tags',
+    'system_tags',
+    'is_public',
+    'is_deleted',
+    'title',
+    'creator',
+    'visible_contributor_ids',
+}
+
+
+@signals.save.connect
+def update_conference_submissions(sender, instance, fields_changed, cached_data):
+    if isinstance(instance, Node) and SUBMISSION_FIELDS.intersection(fields_changed or ()):
+        utils.update_submissions(instance)
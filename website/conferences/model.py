@@ -64,6 +64,19 @@ class Conference(StoredObject):
             raise ConferenceError('Endpoint {0} not found'.format(endpoint))
 
 
+class ConferenceSubmission(StoredObject):
+    """A public node tagged with a conference endpoint, along with its pre-rendered row for
+    the meetings pages. Kept up to date by `website.conferences.listeners`.
+    """
+    #: "<conference endpoint>:<node id>"
+    _id = fields.StringField(primary=True)
+    conference = fields.ForeignField('conference', index=True)
+    node = fields.StringField(index=True)
+    date_created = fields.DateTimeField(index=True)
+    #: Row data, less the URLs that need the routing context to build
+    data = fields.DictionaryField()
+
+
 class MailRecord(StoredObject):
     _id = fields.StringField(primary=True, default=lambda: str(bson.ObjectId()))
     data = fields.DictionaryField()
@@ -1,5 +1,8 @@
 # -*- coding: utf-8 -*-
 
+import functools
+import operator
+
 import requests
 from modularodm import Q
 from modularodm.exceptions import ModularOdmException
@@ -9,7 +12,9 @@ from framework.auth import Auth
 from website import util
 from website import settings
 from website.project import new_node
-from website.models import Node, MailRecord
+from website.models import Node, MailRecord, Tag
+from website.files.models import StoredFileNode
+from website.conferences.model import Conference, ConferenceSubmission
 
 
 def record_message(message, created):
@@ -88,3 +93,104 @@ def upload_attachment(user, node, attachment):
 def upload_attachments(user, node, attachments):
     for attachment in attachments:
         upload_attachment(user, node, attachment)
+
+
+def get_tagged_conferences(node):
+    """Return the conferences whose endpoint matches one of the node's tags."""
+    if not node.tags:
+        return []
+    query = functools.reduce(operator.or_, [Q('endpoint', 'iexact', tag._id) for tag in node.tags])
+    return list(Conference.find(query))
+
+
+def render_submission(node, conf):
+    """Render the meetings page row of a submission, less the URLs added by
+    `website.conferences.views.serialize_submission`.
+    """
+    try:
+        record = next(
+            x for x in
+            StoredFileNode.find(
+                Q('node', 'eq', node) &
+                Q('is_file', 'eq', True)
+            ).limit(1)
+        ).wrapped()
+        view_and_download = record.get_download_count() + record.visit
+        download_path = record.path.strip('/')
+    except StopIteration:
+        download_path = None
+        view_and_download = 0
+
+    author = node.visible_contributors[0]
+    tags = [tag._id for tag in node.tags]
+
+    return {
+        'title': node.title,
+        'nodeUrl': node.url,
+        'author': author.family_name if author.family_name else author.fullname,
+        'authorUrl': node.creator.url,
+        'category': conf.field_names['submission1'] if conf.field_names['submission1'] in node.system_tags else conf.field_names['submission2'],
+        'download': view_and_download,
+        'downloadPath': download_path,
+        'dateCreated': node.date_created.isoformat(),
+        'confName': conf.name,
+        'tags': ' '.join(tags)
+    }
+
+
+def save_submission(node, conf):
+    """Create or re-render the submission of a node to a conference.
+
+    :return: Whether the submission was created
+    """
+    key = '{}:{}'.format(conf._id, node._id)
+    submission = ConferenceSubmission.load(key)
+    created = submission is None
+    if created:
+        submission = ConferenceSubmission(_id=key, conference=conf, node=node._id)
+    submission.date_created = node.date_created
+    submission.data = render_submission(node, conf)
+    submission.save()
+    return created
+
+
+def update_submission_count(conf):
+    conf.num_submissions = ConferenceSubmission.find(Q('conference', 'eq', conf._id)).count()
+    conf.save()
+
+
+def update_submissions(node):
+    """Bring the conference submissions of a node in line with its tags, privacy and
+    deletion, and update the counts of the conferences it joined or left.
+    """
+    conferences = []
+    if node.is_public and not node.is_deleted:
+        conferences = get_tagged_conferences(node)
+
+    stale_query = Q('node', 'eq', node._id) & Q('conference', 'nin', [conf._id for conf in conferences])
+    changed = {submission.conference for submission in ConferenceSubmission.find(stale_query)}
+    if changed:
+        ConferenceSubmission.remove(stale_query)
+    for conf in conferences:
+        if save_submission(node, conf):
+            changed.add(conf)
+
+    for conf in changed:
+        update_submission_count(conf)
+
+
+def refresh_submissions(conf):
+    """Rebuild all submissions of a conference, e.g. to pick up new download counts."""
+    tags = Tag.find(Q('lower', 'eq', conf.endpoint.lower())).get_keys()
+    nodes = list(Node.find(
+        Q('tags', 'in', tags) &
+        Q('is_public', 'eq', True) &
+        Q('is_deleted', 'ne', True)
+    ))
+    ConferenceSubmission.remove(
+        Q('conference', 'eq', conf._id) &
+        Q('node', 'nin', [node._id for node in nodes])
+    )
+    for node in nodes:
+        save_submission(node, conf)
+    update_submission_count(conf)
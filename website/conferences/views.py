@@ -4,6 +4,7 @@ import httplib
 import logging
 from datetime import datetime
 
+from flask import request
 from modularodm import Q
 from modularodm.exceptions import ModularOdmException
 
@@ -14,15 +15,13 @@ from framework.transactions.context import TokuTransaction
 from framework.transactions.handlers import no_auto_transaction
 
 from website import settings
-from website.models import Node, Tag
 from website.util import web_url_for
 from website.mails import send_mail
-from website.files.models import StoredFileNode
 from website.mails import CONFERENCE_SUBMITTED, CONFERENCE_INACTIVE, CONFERENCE_FAILED
 
 from website.conferences import utils, signals
 from website.conferences.message import ConferenceMessage, ConferenceError
-from website.conferences.model import Conference
+from website.conferences.model import Conference, ConferenceSubmission
 
 
 logger = logging.getLogger(__name__)
@@ -106,6 +105,8 @@ def add_poster_by_email(conference, message):
         auth_signals.user_confirmed.send(user)
 
     utils.upload_attachments(user, node, message.attachments)
+    # The row of the submission links to its first file, which was only just uploaded
+    utils.update_submissions(node)
 
     download_url = node.web_url_for(
         'addon_view_or_download_file',
@@ -138,45 +139,49 @@ def add_poster_by_email(conference, message):
         signals.osf4m_user_created.send(user, conference=conference, node=node)
 
 
-def _render_conference_node(node, idx, conf):
-    try:
-        record = next(
-            x for x in
-            StoredFileNode.find(
-                Q('node', 'eq', node) &
-                Q('is_file', 'eq', True)
-            ).limit(1)
-        ).wrapped()
-        view_and_download = record.get_download_count() + record.visit
-
-        download_url = node.web_url_for(
+def serialize_submission(submission, idx):
+    """Add the URLs and the position of a submission to its pre-rendered row."""
+    data = dict(submission.data)
+    download_path = data.pop('downloadPath', None)
+    if download_path:
+        download_url = web_url_for(
             'addon_view_or_download_file',
-            path=record.path.strip('/'),
+            pid=submission.node,
+            path=download_path,
             provider='osfstorage',
             action='download',
             _absolute=True,
         )
-    except StopIteration:
+    else:
         download_url = ''
-        view_and_download = 0
-
-    author = node.visible_contributors[0]
-    tags = [tag._id for tag in node.tags]
-
-    return {
+    data.update({
         'id': idx,
-        'title': node.title,
-        'nodeUrl': node.url,
-        'author': author.family_name if author.family_name else author.fullname,
-        'authorUrl': node.creator.url,
-        'category': conf.field_names['submission1'] if conf.field_names['submission1'] in node.system_tags else conf.field_names['submission2'],
-        'download': view_and_download,
         'downloadUrl': download_url,
-        'dateCreated': node.date_created.isoformat(),
-        'confName': conf.name,
-        'confUrl': web_url_for('conference_results', meeting=conf.endpoint),
-        'tags': ' '.join(tags)
-    }
+        'confUrl': web_url_for('conference_results', meeting=submission.conference.endpoint),
+    })
+    return data
+
+
+def _paginated_submissions(query, sort):
+    """Return the serialized submissions matching ``query``, or only one page of them if the
+    ``page`` (0-based) and ``size`` query parameters are given.
+    """
+    submissions = ConferenceSubmission.find(query).sort(sort)
+    start = 0
+    if 'page' in request.args:
+        try:
+            page = int(request.args['page'])
+            size = int(request.args.get('size', settings.CONFERENCE_SUBMISSIONS_PAGE_SIZE))
+        except ValueError:
+            raise HTTPError(httplib.BAD_REQUEST)
+        if page < 0 or size < 1:
+            raise HTTPError(httplib.BAD_REQUEST)
+        start = page * size
+        submissions = submissions.offset(start).limit(size)
+    return [
+        serialize_submission(submission, idx)
+        for idx, submission in enumerate(submissions, start)
+    ]
 
 
 def conference_data(meeting):
@@ -185,17 +190,7 @@ def conference_data(meeting):
     except ModularOdmException:
         raise HTTPError(httplib.NOT_FOUND)
 
-    nodes = Node.find(
-        Q('tags', 'iexact', meeting) &
-        Q('is_public', 'eq', True) &
-        Q('is_deleted', 'eq', False)
-    )
-
-    ret = [
-        _render_conference_node(each, idx, conf)
-        for idx, each in enumerate(nodes)
-    ]
-    return ret
+    return _paginated_submissions(Q('conference', 'eq', conf._id), 'date_created')
 
 
 def redirect_to_meetings(**kwargs):
@@ -225,36 +220,11 @@ def conference_results(meeting):
 def conference_submissions(**kwargs):
     """Return data for all OSF4M submissions.
 
-    The total number of submissions for each meeting is calculated and cached
-    in the Conference.num_submissions field.
+    Submissions and the Conference.num_submissions counts are maintained as nodes are
+    tagged, made public or deleted; see `website.conferences.listeners`.
     """
-    submissions = []
-    #  TODO: Revisit this loop, there has to be a way to optimize it
-    for conf in Conference.find():
-        if (hasattr(conf, 'is_meeting') and (conf.is_meeting is False)):
-            break
-        # For efficiency, we filter by tag first, then node
-        # instead of doing a single Node query
-        projects = set()
-
-        tags = Tag.find(Q('lower', 'eq', conf.endpoint.lower())).get_keys()
-        nodes = Node.find(
-            Q('tags', 'in', tags) &
-            Q('is_public', 'eq', True) &
-            Q('is_deleted', 'ne', True)
-        )
-        projects.update(list(nodes))
-
-        for idx, node in enumerate(projects):
-            submissions.append(_render_conference_node(node, idx, conf))
-        num_submissions = len(projects)
-        # Cache the number of submissions
-        conf.num_submissions = num_submissions
-        conf.save()
-        if num_submissions < settings.CONFERENCE_MIN_COUNT:
-            continue
-    submissions.sort(key=lambda submission: submission['dateCreated'], reverse=True)
-    return {'submissions': submissions}
+    meetings = Conference.find(Q('is_meeting', 'ne', False)).get_keys()
+    return {'submissions': _paginated_submissions(Q('conference', 'in', meetings), '-date_created')}
 
 def conference_view(**kwargs):
     meetings = []
@@ -0,0 +1,92 @@
+"""Content-addressed index of archived file contents.
+
+Each document in the ``filearchiveindex`` collection is keyed by a sha256 and
+records the vault and archive holding content with that hash, its size, and
+how many later versions reused that archive instead of being archived again.
+Looking up a hash is a primary key lookup, rather than a query over every
+FileVersion.
+"""
+from framework.mongo import database
+
+COLLECTION = 'filearchiveindex'
+
+# Maximum number of hashes to send in a single $in query
+LOOKUP_CHUNK_SIZE = 1000
+
+
+def lookup(sha256):
+    """Return the index entry for ``sha256``, or None if that content is not archived."""
+    return database[COLLECTION].find_one({'_id': sha256})
+
+
+def lookup_many(hashes):
+    """Return ``{sha256: entry}`` for every one of ``hashes`` that is archived."""
+    hashes = list(set(hashes))
+    entries = {}
+    for start in range(0, len(hashes), LOOKUP_CHUNK_SIZE):
+        for entry in database[COLLECTION].find({'_id': {'$in': hashes[start:start + LOOKUP_CHUNK_SIZE]}}):
+            entries[entry['_id']] = entry
+    return entries
+
+
+def add(sha256, vault, archive, size=None):
+    """Index an archived version. Content that is already indexed keeps its
+    original archive.
+    """
+    database[COLLECTION].update({'_id': sha256}, {'$setOnInsert': {
+        'vault': vault,
+        'archive': archive,
+        'size': size or 0,
+        'duplicates': 0,
+    }}, upsert=True)
+
+
+def record_duplicate(sha256):
+    """Count a version that reused the archive of ``sha256``."""
+    database[COLLECTION].update({'_id': sha256}, {'$inc': {'duplicates': 1}})
+
+
+def get_savings():
+    """Return the number of versions that reused an archive, and the bytes
+    they would otherwise have taken up.
+    """
+    result = database[COLLECTION].aggregate([
+        {'$group': {
+            '_id': None,
+            'duplicates': {'$sum': '$duplicates'},
+            'bytes_saved': {'$sum': {'$multiply': ['$size', '$duplicates']}},
+        }},
+    ])['result']
+    if not result:
+        return {'duplicates': 0, 'bytes_saved': 0}
+    return {'duplicates': result[0]['duplicates'], 'bytes_saved': result[0]['bytes_saved']}
+
+
+def rebuild_index():
+    """Rebuild the index in one pass over every archived version. The first
+    version archived with a hash provides its archive; later versions sharing
+    the archive count as duplicates.
+    """
+    entries = {}
+    versions = database['fileversion'].find(
+        {'metadata.archive': {'$ne': None}, 'metadata.vault': {'$ne': None}, 'metadata.sha256': {'$ne': None}},
+        {'metadata.sha256': True, 'metadata.vault': True, 'metadata.archive': True, 'size': True},
+    ).sort('date_created', 1)
+    for version in versions:
+        metadata = version['metadata']
+        entry = entries.get(metadata['sha256'])
+        if entry is None:
+            entries[metadata['sha256']] = {
+                '_id': metadata['sha256'],
+                'vault': metadata['vault'],
+                'archive': metadata['archive'],
+                'size': version.get('size') or 0,
+                'duplicates': 0,
+            }
+        elif (entry['vault'], entry['archive']) == (metadata['vault'], metadata['archive']):
+            entry['duplicates'] += 1
+
+    database[COLLECTION].remove({})
+    if entries:
+        database[COLLECTION].insert(entries.values())
+    return entries
@@ -15,10 +15,11 @@ from dateutil.parser import parse as parse_date
 from framework.guid.model import Guid
 from framework.mongo import StoredObject
 from framework.mongo.utils import unique_on
-from framework.analytics import get_basic_counters
+from framework.analytics import get_basic_counters, get_basic_counters_bulk
 
 from website import util
 from website.files import utils
+from website.files import archive_index
 from website.files import exceptions
 from website.project.commentable import Commentable
 
@@ -711,16 +712,39 @@ class File(FileNode):
         self.save()
         return version
 
+    def _download_page(self, version=None):
+        parts = ['download', self.node._id, self._id]
+        if version is not None:
+            parts.append(version)
+        return ':'.join([format(part) for part in parts])
+
+    @classmethod
+    def prefetch_download_counts(cls, files, versions=False):
+        """Load the download counts of ``files``, and of each of their versions if
+        ``versions``, with one query so that ``get_download_count`` doesn't query.
+        """
+        pages = {}
+        for file_node in files:
+            # Kept on the proxy rather than forwarded to the stored object
+            object.__setattr__(file_node, '_download_counts', {})
+            pages[file_node._download_page()] = (file_node, None)
+            if versions:
+                for index in range(len(file_node.versions)):
+                    pages[file_node._download_page(index)] = (file_node, index)
+        counters = get_basic_counters_bulk(pages.keys())
+        for page, (file_node, version) in pages.items():
+            _, count = counters[page]
+            file_node._download_counts[version] = count or 0
+
     def get_download_count(self, version=None):
         """Pull the download count from the pagecounter collection
         Limit to version if specified.
         Currently only useful for OsfStorage
         """
-        parts = ['download', self.node._id, self._id]
-        if version is not None:
-            parts.append(version)
-        page = ':'.join([format(part) for part in parts])
-        _, count = get_basic_counters(page)
+        prefetched = getattr(self, '_download_counts', None)
+        if prefetched and version in prefetched:
+            return prefetched[version]
+        _, count = get_basic_counters(self._download_page(version))
 
         return count or 0
 
@@ -869,8 +893,15 @@ class FileVersion(StoredObject):
         if save:
             self.save()
 
+    def save(self, *args, **kwargs):
+        saved_fields = super(FileVersion, self).save(*args, **kwargs)
+        # Index the archive so later uploads of the same content can reuse it
+        if 'metadata' in saved_fields and self.archive and self.metadata.get('vault') and self.metadata.get('sha256'):
+            archive_index.add(self.metadata['sha256'], self.metadata['vault'], self.archive, self.size)
+        return saved_fields
+
     def _find_matching_archive(self, save=True):
-        """Find another version with the same sha256 as this file.
+        """Find an archive of content with the same sha256 as this file.
         If found copy its vault name and glacier id, no need to create additional backups.
         returns True if found otherwise false
         """
@@ -881,20 +912,12 @@ class FileVersion(StoredObject):
             # Shouldn't ever happen, but we already have an archive
             return True  # We've found ourself
 
-        qs = self.__class__.find(
-            Q('_id', 'ne', self._id) &
-            Q('metadata.vault', 'ne', None) &
-            Q('metadata.archive', 'ne', None) &
-            Q('metadata.sha256', 'eq', self.metadata['sha256'])
-        ).limit(1)
-        if qs.count() < 1:
-            return False
-        other = qs[0]
-        try:
-            self.metadata['vault'] = other.metadata['vault']
-            self.metadata['archive'] = other.metadata['archive']
-        except KeyError:
+        entry = archive_index.lookup(self.metadata['sha256'])
+        if entry is None:
             return False
+        self.metadata['vault'] = entry['vault']
+        self.metadata['archive'] = entry['archive']
+        archive_index.record_duplicate(self.metadata['sha256'])
         if save:
             self.save()
         return True
@@ -38,6 +38,13 @@ class IdentifierMixin(object):
         identifier = self.get_identifier(category)
         return identifier.value if identifier else None
 
+    def get_identifier_values(self):
+        """Return a dict of category to value for all of this object's identifiers."""
+        return {
+            identifier.category: identifier.value
+            for identifier in Identifier.find(Q('referent', 'eq', self))
+        }
+
     def set_identifier_value(self, category, value):
         try:
             identifier = Identifier(referent=self, category=category, value=value)
@@ -30,7 +30,7 @@ from website.mails import QueuedMail
 from website.files.models.base import FileVersion
 from website.files.models.base import StoredFileNode
 from website.files.models.base import TrashedFileNode
-from website.conferences.model import Conference, MailRecord
+from website.conferences.model import Conference, ConferenceSubmission, MailRecord
 from website.notifications.model import NotificationDigest
 from website.notifications.model import NotificationSubscription
 from website.archiver.model import ArchiveJob, ArchiveTarget
@@ -43,7 +43,7 @@ MODELS = (
     ApiOAuth2Application, ApiOAuth2PersonalToken, Node,
     NodeLog, StoredFileNode, TrashedFileNode, FileVersion,
     Tag, WatchConfig, Session, Guid, MetaSchema, Pointer,
-    MailRecord, Comment, PrivateLink, MetaData, Conference,
+    MailRecord, Comment, PrivateLink, MetaData, Conference, ConferenceSubmission,
     NotificationSubscription, NotificationDigest, CitationStyle,
     CitationStyle, ExternalAccount, Identifier,
     Embargo, Retraction, RegistrationApproval, EmbargoTerminationApproval,
@@ -1,13 +1,21 @@
+from weakref import WeakKeyDictionary
+
 from babel import dates, core, Locale
+from bson import ObjectId
+from modularodm import Q
 
+from framework.mongo import database, get_cache_key
 from website import mails
 from website import models as website_models
 from website.notifications import constants
 from website.notifications import utils
-from website.notifications.model import NotificationDigest
 from website.notifications.model import NotificationSubscription
+from website.notifications.model import validate_subscription_type
 from website.util import web_url_for
 
+# Subscriptions resolved by `compile_subscriptions`, per request or task
+_resolved_subscriptions = WeakKeyDictionary()
+
 
 def notify(event, user, node, timestamp, **context):
     """Retrieve appropriate ***subscription*** and passe user list
@@ -79,52 +87,113 @@ def store_emails(recipient_ids, notification_type, event, user, node, timestamp,
     context['user'] = user
     node_lineage_ids = get_node_lineage(node) if node else []
 
+    validate_subscription_type(notification_type)
+
+    recipient_ids = [user_id for user_id in recipient_ids if user_id != user._id]
+    recipients = {
+        recipient._id: recipient
+        for recipient in website_models.User.find(Q('_id', 'in', recipient_ids))
+    }
+
+    # The localized timestamp is the only part of the message that differs between
+    # recipients, so render it once for each timezone and locale
+    messages = {}
+    digests = []
     for user_id in recipient_ids:
-        if user_id == user._id:
+        recipient = recipients.get(user_id)
+        if recipient is None:
             continue
-        recipient = website_models.User.load(user_id)
-        context['localized_timestamp'] = localize_timestamp(timestamp, recipient)
-        message = mails.render_message(template, **context)
+        locale_key = (recipient.timezone, recipient.locale)
+        if locale_key not in messages:
+            context['localized_timestamp'] = localize_timestamp(timestamp, recipient)
+            messages[locale_key] = mails.render_message(template, **context)
 
-        digest = NotificationDigest(
-            timestamp=timestamp,
-            send_type=notification_type,
-            event=event,
-            user_id=user_id,
-            message=message,
-            node_lineage=node_lineage_ids
-        )
-        digest.save()
+        digests.append({
+            '_id': str(ObjectId()),
+            'timestamp': timestamp,
+            'send_type': notification_type,
+            'event': event,
+            'user_id': user_id,
+            'message': messages[locale_key],
+            'node_lineage': node_lineage_ids,
+        })
+    if digests:
+        database['notificationdigest'].insert(digests)
 
 
-def compile_subscriptions(node, event_type, event=None, level=0):
-    """Recurse through node and parents for subscriptions.
+def compile_subscriptions(node, event_type, event=None):
+    """Resolve the subscriptions that apply to an event on a node.
+
+    Subscriptions on a node override those of its parents, and an ``event`` specific
+    subscription on the node overrides its ``event_type`` subscription. Only users who can
+    read the node are included. Results are cached for the rest of the request or task.
 
     :param node: current node
     :param event_type: Generally node_subscriptions_available
     :param event: Particular event such a file_updated that has specific file subs
-    :param level: How deep the recursion is
     :return: a dict of notification types with lists of users.
     """
-    subscriptions = check_node(node, event_type)
+    lineage = get_lineage_nodes(node)
+    key = (event_type, event, tuple(
+        (each._id, tuple(sorted((user_id, tuple(perms)) for user_id, perms in each.permissions.items())))
+        for each in lineage
+    ))
+    cache = _resolved_subscriptions.setdefault(get_cache_key(), {})
+    if key not in cache:
+        cache[key] = resolve_subscriptions(lineage, event_type, event)
+    # Callers modify the lists they are given
+    return {notification_type: list(users) for notification_type, users in cache[key].items()}
+
+
+def resolve_subscriptions(lineage, event_type, event=None):
+    """Compute the subscriptions that apply to the first node of ``lineage``.
+
+    :param list lineage: A node followed by its ancestors, as returned by `get_lineage_nodes`
+    :return: a dict of notification types with sets of user ids.
+    """
+    # Subscriptions from the top most project down; later ones override earlier ones
+    levels = [(each, utils.to_subscription_key(each._id, event_type)) for each in reversed(lineage)]
     if event:
-        subscriptions = check_node(node, event)  # Gets particular event subscriptions
-        parent_subscriptions = compile_subscriptions(node, event_type, level=level + 1)  # get node and parent subs
-    elif node.parent_id:
-        parent_subscriptions = \
-            compile_subscriptions(website_models.Node.load(node.parent_id), event_type, level=level + 1)
-    else:
-        parent_subscriptions = check_node(None, event_type)
-    for notification_type in parent_subscriptions:
-        p_sub_n = parent_subscriptions[notification_type]
-        p_sub_n.extend(subscriptions[notification_type])
-        for nt in subscriptions:
-            if notification_type != nt:
-                p_sub_n = list(set(p_sub_n).difference(set(subscriptions[nt])))
-        if level == 0:
-            p_sub_n, removed = utils.separate_users(node, p_sub_n)
-        parent_subscriptions[notification_type] = p_sub_n
-    return parent_subscriptions
+        levels.append((lineage[0], utils.to_subscription_key(lineage[0]._id, event)))
+    subscriptions = {
+        subscription._id: subscription
+        for subscription in NotificationSubscription.find(Q('_id', 'in', [key for _, key in levels]))
+    }
+
+    # Users who can read each node: its contributors, and admins of its ancestors
+    readers = {}
+    parent_admins = set()
+    for each in reversed(lineage):
+        readers[each._id] = parent_admins | {
+            user_id for user_id, perms in each.permissions.items() if 'read' in perms
+        }
+        parent_admins = parent_admins | {
+            user_id for user_id, perms in each.permissions.items() if 'admin' in perms
+        }
+
+    resolved = {notification_type: set() for notification_type in constants.NOTIFICATION_TYPES}
+    for each, key in levels:
+        subscription = subscriptions.get(key)
+        if subscription is None:
+            continue
+        level = {
+            notification_type: set(getattr(subscription, notification_type)._to_primary_keys()) & readers[each._id]
+            for notification_type in constants.NOTIFICATION_TYPES
+        }
+        for notification_type in resolved:
+            overridden = set().union(*[
+                users for other_type, users in level.items()
+                if other_type != notification_type
+            ])
+            resolved[notification_type] = (resolved[notification_type] | level[notification_type]) - overridden
+
+    node_readers = readers[lineage[0]._id]
+    return {notification_type: users & node_readers for notification_type, users in resolved.items()}
+
+
+def clear_subscription_cache():
+    """Forget the subscriptions resolved during the current request or task."""
+    _resolved_subscriptions.pop(get_cache_key(), None)
 
 
 def check_node(node, event):
@@ -145,19 +214,24 @@ def get_user_subscriptions(user, event):
     return {key: getattr(user_subscription, key, []) for key in constants.NOTIFICATION_TYPES}
 
 
-def get_node_lineage(node):
-    """ Get a list of node ids in order from the node to top most project
-        e.g. [parent._id, node._id]
+def get_lineage_nodes(node):
+    """Get a list of nodes in order from the node to the top most project
+        e.g. [node, parent]
     """
-    lineage = [node._id]
-
+    lineage = [node]
     while node.parent_id:
         node = website_models.Node.load(node.parent_id)
-        lineage = [node._id] + lineage
-
+        lineage.append(node)
     return lineage
 
 
+def get_node_lineage(node):
+    """ Get a list of node ids in order from the node to top most project
+        e.g. [parent._id, node._id]
+    """
+    return [each._id for each in reversed(get_lineage_nodes(node))]
+
+
 def get_settings_url(uid, user):
     if uid == user._id:
         return web_url_for('user_notifications', _absolute=True)
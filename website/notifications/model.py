@@ -23,6 +23,12 @@ class NotificationSubscription(StoredObject):
     email_digest = fields.ForeignField('user', list=True)
     email_transactional = fields.ForeignField('user', list=True)
 
+    def save(self, *args, **kwargs):
+        from website.notifications.emails import clear_subscription_cache
+        ret = super(NotificationSubscription, self).save(*args, **kwargs)
+        clear_subscription_cache()
+        return ret
+
     def add_user_to_subscription(self, user, notification_type, save=True):
         for nt in NOTIFICATION_TYPES:
             if user in getattr(self, nt):
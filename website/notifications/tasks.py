@@ -1,7 +1,9 @@
 """
 Tasks for making even transactional emails consolidated.
 """
-from bson.code import Code
+import collections
+import itertools
+
 from modularodm import Q
 
 from framework.celery_tasks import app as celery_app
@@ -16,6 +18,10 @@ from website.notifications.model import NotificationDigest
 from website import mails
 
 
+# Number of users whose digests are loaded, sent and removed together
+DIGEST_BATCH_SIZE = 500
+
+
 @celery_app.task(name='website.notifications.tasks.send_users_email', max_retries=0)
 def send_users_email(send_type):
     """Find pending Emails and amalgamates them into a single Email.
@@ -23,26 +29,26 @@ def send_users_email(send_type):
     :param send_type
     :return:
     """
-    grouped_emails = get_users_emails(send_type)
-    if not grouped_emails:
-        return
-    for group in grouped_emails:
-        user = User.load(group['user_id'])
-        if not user:
-            log_exception()
-            continue
-        info = group['info']
-        notification_ids = [message['_id'] for message in info]
-        sorted_messages = group_by_node(info)
-        if sorted_messages:
-            mails.send_mail(
-                to_addr=user.username,
-                mimetype='html',
-                mail=mails.DIGEST,
-                name=user.fullname,
-                message=sorted_messages,
-                callback=remove_notifications(email_notification_ids=notification_ids)
-            )
+    for grouped_emails in iter_users_emails(send_type):
+        sent_notification_ids = []
+        for group in grouped_emails:
+            user = User.load(group['user_id'])
+            if not user:
+                log_exception()
+                continue
+            info = group['info']
+            sorted_messages = group_by_node(info)
+            if sorted_messages:
+                mails.send_mail(
+                    to_addr=user.username,
+                    mimetype='html',
+                    mail=mails.DIGEST,
+                    name=user.fullname,
+                    message=sorted_messages,
+                )
+                sent_notification_ids.extend(message['_id'] for message in info)
+        remove_notifications(email_notification_ids=sent_notification_ids)
+        User._clear_caches()
 
 
 def get_users_emails(send_type):
@@ -65,26 +71,42 @@ def get_users_emails(send_type):
                 'user_id': ...
               }]
     """
+    return list(itertools.chain.from_iterable(iter_users_emails(send_type)))
+
+
+def iter_users_emails(send_type, batch_size=None):
+    """Yield the emails that need to be sent in batches of at most ``batch_size`` users, in the
+    format returned by `get_users_emails`. Users are ordered by their oldest pending notification.
+    """
+    batch_size = batch_size or DIGEST_BATCH_SIZE
     with TokuTransaction():
-        emails = db['notificationdigest'].group(
-            key={'user_id': 1},
-            condition={
-                'send_type': send_type
-            },
-            initial={'info': []},
-            reduce=Code(
-                """
-                function(curr, result) {
-                    result.info.push({
-                        'message': curr.message,
-                        'node_lineage': curr.node_lineage,
-                        '_id': curr._id
-                    });
-                };
-                """
-            )
-        )
-    return emails
+        # Only user ids are grouped on the server; their digests are loaded one batch at a time
+        users = db['notificationdigest'].aggregate([
+            {'$match': {'send_type': send_type}},
+            {'$group': {'_id': '$user_id', 'first_id': {'$min': '$_id'}}},
+            {'$sort': {'first_id': 1}},
+        ])['result']
+    user_ids = [user['_id'] for user in users]
+
+    for start in xrange(0, len(user_ids), batch_size):
+        batch = user_ids[start:start + batch_size]
+        grouped = collections.OrderedDict((user_id, []) for user_id in batch)
+        with TokuTransaction():
+            digests = db['notificationdigest'].find(
+                {'send_type': send_type, 'user_id': {'$in': batch}},
+                {'user_id': True, 'message': True, 'node_lineage': True},
+            ).sort('_id', 1)
+            for digest in digests:
+                grouped[digest['user_id']].append({
+                    'message': digest.get('message'),
+                    'node_lineage': digest.get('node_lineage'),
+                    '_id': digest['_id'],
+                })
+        yield [
+            {'user_id': user_id, 'info': info}
+            for user_id, info in grouped.items()
+            if info
+        ]
 
 
 def group_by_node(notifications):
@@ -105,5 +127,5 @@ def remove_notifications(email_notification_ids=None):
     :param email_notification_ids:
     :return:
     """
-    for email_id in email_notification_ids:
-        NotificationDigest.remove(Q('_id', 'eq', email_id))
+    if email_notification_ids:
+        NotificationDigest.remove(Q('_id', 'in', list(email_notification_ids)))
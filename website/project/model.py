@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 import itertools
+import collections
 import functools
 import os
 import re
@@ -21,11 +22,13 @@ from modularodm.exceptions import NoResultsFound
 from modularodm.exceptions import ValidationValueError
 
 from framework import status
+from framework.mongo import database
 from framework.mongo import ObjectId
 from framework.mongo import StoredObject
 from framework.mongo import validators
 from framework.addons import AddonModelMixin
 from framework.auth import get_user, User, Auth
+from framework.celery_tasks.handlers import enqueue_task
 from framework.exceptions import PermissionsError
 from framework.guid.model import GuidStoredObject, Guid
 from framework.auth.utils import privacy_info_handle
@@ -53,7 +56,7 @@ from website.institutions.model import Institution, AffiliatedInstitutionsList
 from website.citations.utils import datetime_to_csl
 from website.identifiers.model import IdentifierMixin
 from website.util.permissions import expand_permissions, reduce_permissions
-from website.util.permissions import CREATOR_PERMISSIONS, DEFAULT_CONTRIBUTOR_PERMISSIONS, ADMIN
+from website.util.permissions import CREATOR_PERMISSIONS, DEFAULT_CONTRIBUTOR_PERMISSIONS, READ, ADMIN
 from website.project.commentable import Commentable
 from website.project.metadata.schemas import OSF_META_SCHEMAS
 from website.project.metadata.utils import create_jsonschema_from_metaschema
@@ -360,6 +363,7 @@ class Comment(GuidStoredObject, SpamMixin, Commentable):
             save=False,
         )
 
+        comment.node.invalidate_counters('comments')
         comment.node.save()
         project_signals.comment_added.send(comment, auth=auth)
 
@@ -610,6 +614,46 @@ class NodeLog(StoredObject):
     def can_view(self, node, auth):
         return node.can_view(auth)
 
+    def get_inheriting_nodes(self):
+        """Forks that list this log because they inherited it from its node."""
+        if not self.node:
+            return []
+        return [
+            node for node in Node.find(
+                Q('inherited_log_sources.node', 'eq', self.node._id) &
+                Q('is_deleted', 'eq', False)
+            )
+            if any(
+                source['node'] == self.node._id and self.date <= source['until']
+                for source in node.inherited_log_sources
+            )
+        ]
+
+    def get_listed_node(self, inherited_by):
+        """Return the node this log is listed under: the fork that inherited it,
+        if any, else its own node.
+
+        :param dict inherited_by: as returned by ``Node.get_inherited_log_owners``
+        """
+        if not self.node:
+            return self.node
+        for until, node in inherited_by.get(self.node._id, ()):
+            if self.date <= until:
+                return node
+        return self.node
+
+    def get_viewable_node(self, auth):
+        """Return the node ``auth`` may see this log under: its own node if
+        viewable, else a viewable fork that inherited it. Falls back to its own
+        node, which the caller's permission check then rejects.
+        """
+        if self.node.can_view(auth):
+            return self.node
+        for node in self.get_inheriting_nodes():
+            if node.can_view(auth):
+                return node
+        return self.node
+
     def _render_log_contributor(self, contributor, anonymous=False):
         user = User.load(contributor)
         if not user:
@@ -824,6 +868,24 @@ class Node(GuidStoredObject, AddonModelMixin, IdentifierMixin, Commentable):
                 ('registration_approval', pymongo.ASCENDING),
             ]
         },
+        {
+            'unique': False,
+            'key_or_list': [
+                ('ancestor_ids', pymongo.ASCENDING),
+            ]
+        },
+        {
+            'unique': False,
+            'key_or_list': [
+                ('effective_reader_ids', pymongo.ASCENDING),
+            ]
+        },
+        {
+            'unique': False,
+            'key_or_list': [
+                ('inherited_log_sources.node', pymongo.ASCENDING),
+            ]
+        },
     ]
 
     # Node fields that trigger an update to Solr on save
@@ -870,6 +932,14 @@ class Node(GuidStoredObject, AddonModelMixin, IdentifierMixin, Commentable):
     # User mappings
     permissions = fields.DictionaryField()
     visible_contributor_ids = fields.StringField(list=True)
+    # Users with admin permissions on this node or any of its parents, and users who can read it
+    # either directly or through such an admin permission; kept up to date on save
+    effective_admin_ids = fields.StringField(list=True)
+    effective_reader_ids = fields.StringField(list=True)
+
+    # Counts shown on the project overview; computed on first use and dropped
+    # by the code paths that change them, see ``get_counters``
+    counters = fields.DictionaryField()
 
     # Project Organization
     is_bookmark_collection = fields.BooleanField(default=False, index=True)
@@ -911,6 +981,11 @@ class Node(GuidStoredObject, AddonModelMixin, IdentifierMixin, Commentable):
 
     is_fork = fields.BooleanField(default=False, index=True)
     forked_date = fields.DateTimeField(index=True)
+    # Forks read the logs of the nodes they were forked from, up to the date of the fork,
+    # instead of copying them; each entry is a dict with a 'node' id and an 'until' date
+    inherited_log_sources = fields.DictionaryField(list=True)
+    # Whether a background job is still forking or templating this node's children
+    children_pending = fields.BooleanField(default=False)
 
     title = fields.StringField(validate=validate_title)
     description = fields.StringField()
@@ -943,6 +1018,9 @@ class Node(GuidStoredObject, AddonModelMixin, IdentifierMixin, Commentable):
     registered_from = fields.ForeignField('node', index=True)
     root = fields.ForeignField('node', index=True)
     parent_node = fields.ForeignField('node', index=True)
+    # Primary ancestors from the top most project down to the parent, kept up to date on save
+    # so that a whole subtree or lineage can be loaded with one query
+    ancestor_ids = fields.StringField(list=True)
 
     # The node (if any) used as a template for this node's creation
     template_node = fields.ForeignField('node', index=True)
@@ -1008,7 +1086,15 @@ class Node(GuidStoredObject, AddonModelMixin, IdentifierMixin, Commentable):
     @property
     def logs(self):
         """ List of logs associated with this node"""
-        return NodeLog.find(Q('node', 'eq', self._id)).sort('date')
+        return NodeLog.find(self.logs_query).sort('date')
+
+    @property
+    def logs_query(self):
+        """Query for this node's own logs and the logs it inherited when forked."""
+        query = Q('node', 'eq', self._id)
+        for source in self.inherited_log_sources:
+            query = query | (Q('node', 'eq', source['node']) & Q('date', 'lte', source['until']))
+        return query
 
     @property
     def license(self):
@@ -1226,9 +1312,16 @@ class Node(GuidStoredObject, AddonModelMixin, IdentifierMixin, Commentable):
     def is_admin_parent(self, user):
         if self.has_permission(user, 'admin', check_parent=False):
             return True
-        if self.parent_node:
-            return self.parent_node.is_admin_parent(user)
-        return False
+        # The node's own permissions may have changed since it was saved, so only
+        # admin permissions inherited from its ancestors come from the index
+        parent = self.parent_node
+        if user is None or parent is None:
+            return False
+        if not parent.effective_admin_ids:
+            # Every indexed node has an admin, so the parent was not indexed yet; see
+            # scripts/migration/migrate_node_effective_permissions.py
+            return parent.is_admin_parent(user)
+        return user._id in parent.get_inheritable_admin_ids()
 
     def can_view(self, auth):
         if auth and getattr(auth.private_link, 'anonymous', False):
@@ -1350,12 +1443,15 @@ class Node(GuidStoredObject, AddonModelMixin, IdentifierMixin, Commentable):
         """
         if self.has_permission(user, permission):
             return True
+        Node.prefetch_subtrees([self])
+        return self._has_permission_on_children(user, permission)
 
+    def _has_permission_on_children(self, user, permission):
         for node in self.nodes:
             if not node.primary or node.is_deleted:
                 continue
 
-            if node.has_permission_on_children(user, permission):
+            if node.has_permission(user, permission) or node._has_permission_on_children(user, permission):
                 return True
 
         return False
@@ -1374,6 +1470,10 @@ class Node(GuidStoredObject, AddonModelMixin, IdentifierMixin, Commentable):
         """ Returns a generator of first descendant node(s) readable by <user>
         in each descendant branch.
         """
+        Node.prefetch_subtrees([self])
+        return self._find_readable_descendants(auth)
+
+    def _find_readable_descendants(self, auth):
         new_branches = []
         for node in self.nodes:
             if not node.primary or node.is_deleted:
@@ -1385,7 +1485,7 @@ class Node(GuidStoredObject, AddonModelMixin, IdentifierMixin, Commentable):
                 new_branches.append(node)
 
         for bnode in new_branches:
-            for node in bnode.find_readable_descendants(auth):
+            for node in bnode._find_readable_descendants(auth):
                 yield node
 
     def has_addon_on_children(self, addon):
@@ -1427,9 +1527,15 @@ class Node(GuidStoredObject, AddonModelMixin, IdentifierMixin, Commentable):
 
     @property
     def parents(self):
-        if self.parent_node:
-            return [self.parent_node] + self.parent_node.parents
-        return []
+        uncached = [each for each in self.ancestor_ids if not Node._is_cached(each)]
+        if uncached:
+            list(Node.find(Q('_id', 'in', uncached)))
+        parents = []
+        parent = self.parent_node
+        while parent:
+            parents.append(parent)
+            parent = parent.parent_node
+        return parents
 
     @property
     def admin_contributor_ids(self, contributors=None):
@@ -1754,10 +1860,27 @@ class Node(GuidStoredObject, AddonModelMixin, IdentifierMixin, Commentable):
 
         self.root = self._root._id
         self.parent_node = self._parent_node
+        parent_id = self.parent_id
+        if parent_id:
+            parent = Node.load(parent_id)
+            self.ancestor_ids = parent.ancestor_ids + [parent._id]
+        else:
+            parent = None
+            self.ancestor_ids = []
+        self.effective_admin_ids, self.effective_reader_ids = self._compute_permission_index(
+            parent.get_inheritable_admin_ids() if parent else []
+        )
 
         # If you're saving a property, do it above this super call
         saved_fields = super(Node, self).save(*args, **kwargs)
 
+        if 'nodes' in saved_fields or 'ancestor_ids' in saved_fields:
+            self._update_tree_index()
+        if {'nodes', 'effective_admin_ids', 'is_deleted'}.intersection(saved_fields):
+            self._update_permission_index()
+        if first_save or {'is_deleted', 'is_registration'}.intersection(saved_fields):
+            self._invalidate_related_counters()
+
         if first_save and is_original and not suppress_log:
             # TODO: This logic also exists in self.use_as_template()
             for addon in settings.ADDONS_AVAILABLE:
@@ -1796,7 +1919,7 @@ class Node(GuidStoredObject, AddonModelMixin, IdentifierMixin, Commentable):
         if self.is_collection or self.archiving:
             need_update = False
         if need_update:
-            self.update_search()
+            self.update_search(saved_fields=saved_fields)
 
         if 'node_license' in saved_fields:
             children = [c for c in self.get_descendants_recursive(
@@ -1805,7 +1928,7 @@ class Node(GuidStoredObject, AddonModelMixin, IdentifierMixin, Commentable):
             # this returns generator, that would get unspooled anyways
             while len(children):
                 batch = children[:99]
-                Node.bulk_update_search(batch)
+                Node.bulk_update_search(batch, saved_fields={'node_license'})
                 children = children[99:]
 
         # Return expected value for StoredObject::save
@@ -1859,6 +1982,7 @@ class Node(GuidStoredObject, AddonModelMixin, IdentifierMixin, Commentable):
         new.add_contributor(contributor=auth.user, permissions=CREATOR_PERMISSIONS, log=False, save=False)
         new.is_fork = False
         new.is_registration = False
+        new.inherited_log_sources = []
         new.node_license = self.license.copy() if self.license else None
 
         # If that title hasn't been changed, apply the default prefix (once)
@@ -1898,16 +2022,44 @@ class Node(GuidStoredObject, AddonModelMixin, IdentifierMixin, Commentable):
             if 'node' in addon.added_default:
                 new.add_addon(addon.short_name, auth=None, log=False)
 
-        # deal with the children of the node, if any
+        # deal with the children of the node, if any; large trees are templated
+        # by a background job
+        if self._defer_children():
+            new.children_pending = True
+            new.save()
+            from website.project.tasks import template_children  # Avoid circular import
+            enqueue_task(template_children.s(template_id=self._id, node_id=new._id, user_id=auth.user._id, changes=changes))
+        else:
+            self._template_children(new, auth, changes)
+            new.save()
+        return new
+
+    def _defer_children(self):
+        """Whether copying this node's subtree is large enough to run in the background."""
+        return Node.find(
+            Q('ancestor_ids', 'eq', self._id) & Q('is_deleted', 'eq', False)
+        ).count() > settings.COPY_CHILDREN_SYNC_LIMIT
+
+    def _fork_children(self, forked, auth):
+        """Fork the children of this node into ``forked``."""
+        for node_contained in self.nodes:
+            if not node_contained.is_deleted:
+                forked_node = None
+                try:  # Catch the potential PermissionsError above
+                    forked_node = node_contained.fork_node(auth=auth, title='')
+                except PermissionsError:
+                    pass  # If this exception is thrown omit the node from the result set
+                if forked_node is not None:
+                    forked.nodes.append(forked_node)
+
+    def _template_children(self, new, auth, changes):
+        """Create the children of ``new`` from the children of this node."""
         new.nodes = [
             x.use_as_template(auth, changes, top_level=False)
             for x in self.nodes
             if x.can_view(auth) and not x.is_deleted
         ]
 
-        new.save()
-        return new
-
     ############
     # Pointers #
     ############
@@ -1946,6 +2098,7 @@ class Node(GuidStoredObject, AddonModelMixin, IdentifierMixin, Commentable):
         pointer = Pointer(node=node)
         pointer.save()
         self.nodes.append(pointer)
+        node.invalidate_counters('points')
 
         # Add log
         self.add_log(
@@ -1982,6 +2135,7 @@ class Node(GuidStoredObject, AddonModelMixin, IdentifierMixin, Commentable):
         # Remove `Pointer` object; will also remove self from `nodes` list of
         # parent node
         Pointer.remove_one(pointer)
+        pointer.node.invalidate_counters('points')
 
         # Add log
         self.add_log(
@@ -2043,20 +2197,152 @@ class Node(GuidStoredObject, AddonModelMixin, IdentifierMixin, Commentable):
         return ret
 
     def get_descendants_recursive(self, include=lambda n: True):
+        Node.prefetch_subtrees([self])
+        return self._get_descendants_recursive(include)
+
+    def _get_descendants_recursive(self, include):
         for node in self.nodes:
             if include(node):
                 yield node
             if node.primary:
-                for descendant in node.get_descendants_recursive(include):
+                for descendant in node._get_descendants_recursive(include):
                     if include(descendant):
                         yield descendant
 
+    @classmethod
+    def prefetch_subtrees(cls, nodes):
+        """Load the primary descendants of ``nodes`` with a single query, so that walking
+        their ``nodes`` lists reads from the cache instead of loading one node per hop.
+        Descendants that are already cached are not loaded again, which would discard
+        their unsaved changes.
+        """
+        node_ids = [node._id for node in nodes if node.nodes]
+        if not node_ids:
+            return
+        descendant_ids = database[cls._name].find({'ancestor_ids': {'$in': node_ids}}, {'_id': True})
+        uncached = [each['_id'] for each in descendant_ids if not cls._is_cached(each['_id'])]
+        if uncached:
+            list(cls.find(Q('_id', 'in', uncached)))
+
+    def _update_tree_index(self):
+        """Bring the ``ancestor_ids`` of this node's primary descendants in line with its own."""
+        lineage = self.ancestor_ids + [self._id]
+        stale = [child for child in self.nodes_primary if child.ancestor_ids != lineage]
+        if not stale:
+            return
+        for child in stale:
+            # Descendants of the child keep their path below it
+            for descendant in Node.find(Q('ancestor_ids', 'eq', child._id)):
+                path = descendant.ancestor_ids[descendant.ancestor_ids.index(child._id):]
+                # ``Node.update`` is shadowed by the instance method, so go through StoredObject's
+                super(Node, Node).update(Q('_id', 'eq', descendant._id), data={'ancestor_ids': lineage + path})
+        super(Node, Node).update(Q('_id', 'in', [child._id for child in stale]), data={'ancestor_ids': lineage})
+
+    def get_inheritable_admin_ids(self, admin_ids=None):
+        """Return the admins this node passes on to its children: its effective admins, or
+        ``admin_ids`` if given, unless the node is deleted.
+        """
+        if self.is_deleted:
+            return []
+        return self.effective_admin_ids if admin_ids is None else admin_ids
+
+    def _compute_permission_index(self, inherited_admin_ids):
+        """Return the ``effective_admin_ids`` and ``effective_reader_ids`` of this node given
+        the admins it inherits from its parents.
+        """
+        admin_ids = {user_id for user_id, perms in self.permissions.iteritems() if ADMIN in perms}
+        admin_ids.update(inherited_admin_ids)
+        reader_ids = admin_ids.union(user_id for user_id, perms in self.permissions.iteritems() if READ in perms)
+        return sorted(admin_ids), sorted(reader_ids)
+
+    COUNTERS = {
+        'registrations': lambda node: node.registrations_all.count(),
+        'forks': lambda node: node.forks.count(),
+        'templated': lambda node: node.templated_list.count(),
+        'watches': lambda node: node.watches.count(),
+        'points': lambda node: len(node.get_points(deleted=False, folders=False)),
+        'comments': lambda node: Comment.find(Q('node', 'eq', node._id)).count(),
+    }
+
+    def get_counters(self):
+        """Return the overview counts of this node, counting and storing any
+        that are missing.
+        """
+        if self.counters is None:
+            self.counters = {}
+        missing = {
+            name: count(self)
+            for name, count in self.COUNTERS.items()
+            if name not in self.counters
+        }
+        if missing:
+            self.counters.update(missing)
+            database[self._name].update({'_id': self._id}, {'$set': {
+                'counters.{}'.format(name): value
+                for name, value in missing.items()
+            }})
+        return self.counters
+
+    def invalidate_counters(self, *names):
+        """Drop the named counters so that they are counted again on next use."""
+        for name in names:
+            (self.counters or {}).pop(name, None)
+        database[self._name].update({'_id': self._id}, {'$unset': {
+            'counters.{}'.format(name): ''
+            for name in names
+        }})
+
+    def _invalidate_related_counters(self):
+        """Drop the counters this node contributes to on other nodes."""
+        if self.forked_from:
+            self.forked_from.invalidate_counters('forks')
+        if self.template_node:
+            self.template_node.invalidate_counters('templated')
+        if self.registered_from:
+            self.registered_from.invalidate_counters('registrations')
+        for pointer in self.nodes_pointer:
+            pointer.node.invalidate_counters('points')
+
+    def _update_permission_index(self):
+        """Push admin permissions inherited from this node down to its primary descendants,
+        only writing the descendants whose effective permissions change.
+        """
+        Node.prefetch_subtrees([self])
+        inherited = self.get_inheritable_admin_ids()
+        branches = [(inherited, child) for child in self.nodes_primary]
+        while branches:
+            inherited, node = branches.pop()
+            admin_ids, reader_ids = node._compute_permission_index(inherited)
+            if admin_ids == node.effective_admin_ids and reader_ids == node.effective_reader_ids:
+                continue
+            super(Node, Node).update(
+                Q('_id', 'eq', node._id),
+                data={'effective_admin_ids': admin_ids, 'effective_reader_ids': reader_ids}
+            )
+            inherited = node.get_inheritable_admin_ids(admin_ids)
+            branches.extend((inherited, child) for child in node.nodes_primary)
+
+    def _get_aggregate_log_nodes(self, auth):
+        return [self] + [n for n in self.get_descendants_recursive() if n.can_view(auth)]
+
+    def get_inherited_log_owners(self, auth):
+        """Map the _id of each node whose logs this node, or one of its descendants
+        that ``auth`` can view, inherited to ``[(until, inheriting node)]``, so that
+        aggregate logs can be presented under the node that lists them.
+        """
+        owners = collections.defaultdict(list)
+        for node in self._get_aggregate_log_nodes(auth):
+            for source in node.inherited_log_sources:
+                owners[source['node']].append((source['until'], node))
+        return owners
+
     def get_aggregate_logs_query(self, auth):
-        ids = [self._id] + [n._id
-                            for n in self.get_descendants_recursive()
-                            if n.can_view(auth)]
-        query = Q('node', 'in', ids) & Q('should_hide', 'ne', True)
-        return query
+        nodes = self._get_aggregate_log_nodes(auth)
+        query = Q('node', 'in', [n._id for n in nodes])
+        for node in nodes:
+            if node.inherited_log_sources:
+                query = query | node.logs_query
+        return query & Q('should_hide', 'ne', True)
 
     def get_aggregate_logs_queryset(self, auth):
         query = self.get_aggregate_logs_query(auth)
@@ -2235,19 +2521,25 @@ class Node(GuidStoredObject, AddonModelMixin, IdentifierMixin, Commentable):
             self.save()
         return None
 
-    def update_search(self):
+    def update_search(self, saved_fields=None):
+        """Update the search index for this node.
+
+        :param saved_fields: Fields changed by the save that triggered the update; the node's
+            file documents are only re-indexed if they copy one of these. None re-indexes everything.
+        """
         from website import search
         try:
-            search.search.update_node(self, bulk=False, async=True)
+            search.search.update_node(self, bulk=False, async=True, saved_fields=saved_fields)
         except search.exceptions.SearchUnavailableError as e:
             logger.exception(e)
             log_exception()
 
     @classmethod
-    def bulk_update_search(cls, nodes, index=None):
+    def bulk_update_search(cls, nodes, index=None, saved_fields=None):
         from website import search
         try:
-            serialize = functools.partial(search.search.update_node, index=index, bulk=True, async=False)
+            serialize = functools.partial(search.search.update_node, index=index, bulk=True, async=False,
+                                          saved_fields=saved_fields)
             search.search.bulk_update_nodes(serialize, nodes, index=index)
         except search.exceptions.SearchUnavailableError as e:
             logger.exception(e)
@@ -2363,16 +2655,10 @@ class Node(GuidStoredObject, AddonModelMixin, IdentifierMixin, Commentable):
 
         forked.tags = self.tags
 
-        # Recursively fork child nodes
-        for node_contained in original.nodes:
-            if not node_contained.is_deleted:
-                forked_node = None
-                try:  # Catch the potential PermissionsError above
-                    forked_node = node_contained.fork_node(auth=auth, title='')
-                except PermissionsError:
-                    pass  # If this exception is thrown omit the node from the result set
-                if forked_node is not None:
-                    forked.nodes.append(forked_node)
+        # Recursively fork child nodes; large trees are forked by a background job
+        defer_children = original._defer_children()
+        if not defer_children:
+            original._fork_children(forked, auth)
 
         if title is None:
             forked.title = PREFIX + original.title
@@ -2385,6 +2671,12 @@ class Node(GuidStoredObject, AddonModelMixin, IdentifierMixin, Commentable):
         forked.is_registration = False
         forked.forked_date = when
         forked.forked_from = original
+        forked.children_pending = bool(defer_children)
+        # Read the original's logs up to now rather than copying them
+        forked.inherited_log_sources = [{'node': original._id, 'until': when}] + [
+            dict(source, until=min(source['until'], when))
+            for source in original.inherited_log_sources
+        ]
         forked.creator = user
         forked.node_license = original.license.copy() if original.license else None
         forked.wiki_private_uuids = {}
@@ -2430,10 +2722,9 @@ class Node(GuidStoredObject, AddonModelMixin, IdentifierMixin, Commentable):
             save=False,
         )
 
-        # Clone each log from the original node for this fork.
-        logs = original.logs
-        for log in logs:
-            log.clone_node_log(forked._id)
+        if defer_children:
+            from website.project.tasks import fork_children  # Avoid circular import
+            enqueue_task(fork_children.s(original_id=original._id, node_id=forked._id, user_id=user._id))
 
         forked.reload()
 
@@ -2492,6 +2783,7 @@ class Node(GuidStoredObject, AddonModelMixin, IdentifierMixin, Commentable):
         registered.alternative_citations = self.alternative_citations
         registered.node_license = original.license.copy() if original.license else None
         registered.wiki_private_uuids = {}
+        registered.inherited_log_sources = []
 
         registered.save()
 
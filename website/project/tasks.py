@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""Background jobs that copy the children of large forks and templates."""
+import celery
+from celery.utils.log import get_task_logger
+
+from framework.auth import Auth, User
+from framework.celery_tasks import app as celery_app
+from framework.celery_tasks.utils import log_to_sentry
+from framework.transactions.context import TokuTransaction
+
+from website import settings
+from website.app import init_addons, do_set_backends
+from website.project.model import Node
+
+logger = get_task_logger(__name__)
+
+
+def create_app_context():
+    try:
+        init_addons(settings)
+        do_set_backends(settings)
+    except AssertionError:  # ignore AssertionErrors
+        pass
+
+
+class CopyChildrenTask(celery.Task):
+    """Copies run in a transaction, so a failed attempt leaves nothing behind
+    and can be retried. Once retries are exhausted the node is no longer
+    marked as pending and the failure is reported.
+
+    A task runs outside of a request context, so children large enough to be
+    copied in the background themselves are not queued again: `enqueue_task`
+    runs their copy synchronously, inside the transaction of the task. This is
+    intended; the whole subtree is copied, and retried, as one unit.
+    """
+    abstract = True
+    max_retries = 3
+    default_retry_delay = 60
+    ignore_result = True
+
+    def on_failure(self, exc, task_id, args, kwargs, einfo):
+        node = Node.load(kwargs.get('node_id'))
+        logger.error('Copying the children of node {0} failed: {1!r}'.format(kwargs.get('node_id'), exc))
+        log_to_sentry('Copying node children failed', task=self.name, exception=repr(exc), **kwargs)
+        if node and node.children_pending:
+            node.children_pending = False
+            node.save()
+
+
+@celery_app.task(base=CopyChildrenTask, bind=True)
+def fork_children(self, original_id, node_id, user_id):
+    """Fork the children of ``original_id`` into the fork ``node_id``."""
+    create_app_context()
+    try:
+        with TokuTransaction():
+            original = Node.load(original_id)
+            forked = Node.load(node_id)
+            original._fork_children(forked, Auth(User.load(user_id)))
+            forked.children_pending = False
+            forked.save()
+    except Exception as exc:
+        raise self.retry(exc=exc)
+
+
+@celery_app.task(base=CopyChildrenTask, bind=True)
+def template_children(self, template_id, node_id, user_id, changes):
+    """Create the children of ``node_id`` from the children of the template ``template_id``."""
+    create_app_context()
+    try:
+        with TokuTransaction():
+            template = Node.load(template_id)
+            new = Node.load(node_id)
+            template._template_children(new, Auth(User.load(user_id)), changes)
+            new.children_pending = False
+            new.save()
+    except Exception as exc:
+        raise self.retry(exc=exc)
@@ -35,7 +35,7 @@ from website.util.rubeus import collect_addon_js
 from website.project.model import has_anonymous_link, get_pointer_parent, NodeUpdateError, validate_title
 from website.project.forms import NewNodeForm
 from website.project.metadata.utils import serialize_meta_schemas
-from website.models import Node, Pointer, WatchConfig, PrivateLink, Comment
+from website.models import Node, Pointer, WatchConfig, PrivateLink
 from website import settings
 from website.views import _render_nodes, find_bookmark_collection, validate_page_num
 from website.profile import utils
@@ -656,8 +656,12 @@ def _view_project(node, auth, primary=False):
         bookmark_collection_id = ''
     view_only_link = auth.private_key or request.args.get('view_only', '').strip('/')
     anonymous = has_anonymous_link(node, auth)
+    # Same logs as the node's log list in the API, including those inherited by forks
+    last_log = next(iter(node.get_aggregate_logs_queryset(auth)[:1]), None)
     widgets, configs, js, css = _render_addon(node)
     redirect_url = node.url + '?view_only=None'
+    counters = node.get_counters()
+    identifiers = node.get_identifier_values()
 
     disapproval_link = ''
     if (node.is_pending_registration and node.has_permission(user, ADMIN)):
@@ -692,7 +696,7 @@ def _view_project(node, auth, primary=False):
             'is_public': node.is_public,
             'is_archiving': node.archiving,
             'date_created': iso8601format(node.date_created),
-            'date_modified': iso8601format(node.logs[-1].date) if node.logs else '',
+            'date_modified': iso8601format(last_log.date) if last_log else '',
             'tags': [tag._primary_key for tag in node.tags],
             'children': bool(node.nodes_active),
             'is_registration': node.is_registration,
@@ -712,24 +716,25 @@ def _view_project(node, auth, primary=False):
             'root_id': node.root._id if node.root else None,
             'registered_meta': node.registered_meta,
             'registered_schemas': serialize_meta_schemas(node.registered_schema),
-            'registration_count': node.registrations_all.count(),
+            'registration_count': counters['registrations'],
             'is_fork': node.is_fork,
             'forked_from_id': node.forked_from._primary_key if node.is_fork else '',
             'forked_from_display_absolute_url': node.forked_from.display_absolute_url if node.is_fork else '',
             'forked_date': iso8601format(node.forked_date) if node.is_fork else '',
-            'fork_count': node.forks.count(),
-            'templated_count': node.templated_list.count(),
-            'watched_count': node.watches.count(),
+            'children_pending': node.children_pending,
+            'fork_count': counters['forks'],
+            'templated_count': counters['templated'],
+            'watched_count': counters['watches'],
             'private_links': [x.to_json() for x in node.private_links_active],
             'link': view_only_link,
             'anonymous': anonymous,
-            'points': len(node.get_points(deleted=False, folders=False)),
+            'points': counters['points'],
             'comment_level': node.comment_level,
-            'has_comments': bool(Comment.find(Q('node', 'eq', node))),
-            'has_children': bool(Comment.find(Q('node', 'eq', node))),
+            'has_comments': bool(counters['comments']),
+            'has_children': bool(counters['comments']),
             'identifiers': {
-                'doi': node.get_identifier_value('doi'),
-                'ark': node.get_identifier_value('ark'),
+                'doi': identifiers.get('doi'),
+                'ark': identifiers.get('ark'),
             },
             'institutions': get_affiliated_institutions(node) if node else [],
             'alternative_citations': [citation.to_json() for citation in node.alternative_citations],
@@ -847,10 +852,11 @@ def get_editable_children(auth, node, **kwargs):
     }
 
 
+@collect_auth
 @must_be_valid_project
-def get_recent_logs(node, **kwargs):
-    logs = list(reversed(node.logs._to_primary_keys()))[:3]
-    return {'logs': logs}
+def get_recent_logs(auth, node, **kwargs):
+    logs = node.get_aggregate_logs_queryset(auth)[:3]
+    return {'logs': [log._id for log in logs]}
 
 
 def _get_summary(node, auth, primary=True, link_id=None, show_path=False):
@@ -943,6 +949,10 @@ def get_readable_descendants(auth, node, **kwargs):
 def node_child_tree(user, node_ids):
     """ Format data to test for node privacy settings for use in treebeard.
     """
+    Node.prefetch_subtrees([node for node in Node.find(Q('_id', 'in', node_ids))])
+    return _node_child_tree(user, node_ids)
+
+def _node_child_tree(user, node_ids):
     items = []
 
     for node_id in node_ids:
@@ -950,8 +960,8 @@ def node_child_tree(user, node_ids):
         assert node, '{} is not a valid Node.'.format(node_id)
 
         can_read = node.has_permission(user, READ)
-        can_read_children = node.has_permission_on_children(user, 'read')
-        if not can_read and not can_read_children:
+        # The subtree was prefetched by node_child_tree, so skip the per-call prefetch
+        if not can_read and not node._has_permission_on_children(user, 'read'):
             continue
 
         contributors = []
@@ -970,7 +980,7 @@ def node_child_tree(user, node_ids):
         children = []
         # List project/node if user has at least 'read' permissions (contributor or admin viewer) or if
         # user is contributor on a component of the project/node
-        children.extend(node_child_tree(
+        children.extend(_node_child_tree(
             user,
             [
                 n._id
@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 import httplib as http
 import itertools
+import logging
 
 from flask import request
 from modularodm import Q
@@ -12,7 +13,7 @@ from framework.flask import redirect  # VOL-aware redirect
 
 from framework.auth.decorators import must_be_signed
 
-from website.archiver import ARCHIVER_SUCCESS, ARCHIVER_FAILURE
+from website.archiver import ARCHIVER_FAILURE
 
 from website import settings
 from website.exceptions import NodeStateError
@@ -38,6 +39,9 @@ from website.identifiers.client import EzidClient
 
 from .node import _view_project
 
+logger = logging.getLogger(__name__)
+
+
 @must_be_valid_project
 @must_be_contributor_or_public
 def node_register_page(auth, node, **kwargs):
@@ -314,19 +318,20 @@ def get_referent_by_identifier(category, value):
 def registration_callbacks(node, payload, *args, **kwargs):
     errors = payload.get('errors')
     src_provider = payload['source']['provider']
-    if errors:
+    # Archives are copied file by file; record the copy in its target's manifest
+    target = node.archive_job.find_file_target(src_provider, payload['source'].get('path'))
+    if target:
+        node.archive_job.file_copied(target, payload['source']['path'], errors=errors)
+    elif errors:
         node.archive_job.update_target(
             src_provider,
             ARCHIVER_FAILURE,
             errors=errors,
         )
     else:
-        # Dataverse requires two seperate targets, one
-        # for draft files and one for published files
-        if src_provider == 'dataverse':
-            src_provider += '-' + (payload['destination']['name'].split(' ')[-1].lstrip('(').rstrip(')').strip())
-        node.archive_job.update_target(
-            src_provider,
-            ARCHIVER_SUCCESS,
-        )
+        # Only files in a manifest are copied, and a target is done once all of them are
+        logger.warning('Ignoring archive callback for {0} {1!r} on {2}, which is in no manifest'.format(
+            src_provider, payload['source'].get('path'), node._id
+        ))
+        return
     project_signals.archive_callback.send(node)
@@ -3,7 +3,9 @@
 from __future__ import division
 
 import copy
+import datetime
 import functools
+import itertools
 import logging
 import math
 import re
@@ -26,9 +28,10 @@ from framework.mongo.utils import paginated
 
 from website import settings
 from website.filters import gravatar
-from website.models import User, Node
+from website.models import Institution, User, Node
 from website.project.licenses import serialize_node_license_record
 from website.search import exceptions
+from website.search import outbox
 from website.search.util import build_query
 from website.util import sanitize
 from website.views import validate_page_num
@@ -281,79 +284,101 @@ def get_doctype_from_node(node):
     else:
         return node.category
 
+# Node fields whose values are copied into the search documents of the node's files
+FILE_DENORMALIZED_FIELDS = {
+    'title',
+    'is_public',
+    'is_deleted',
+    'archiving',
+    'parent_node',
+    'is_registration',
+    'retraction',
+    'is_retracted',
+}
+
 @celery_app.task(bind=True, max_retries=5, default_retry_delay=60)
-def update_node_async(self, node_id, index=None, bulk=False):
+def update_node_async(self, node_id, index=None, bulk=False, saved_fields=None):
     node = Node.load(node_id)
     try:
-        update_node(node=node, index=index, bulk=bulk)
+        update_node(node=node, index=index, bulk=bulk, saved_fields=saved_fields)
     except Exception as exc:
         self.retry(exc=exc)
 
+def serialize_node(node, category=None):
+    """Build the search document for a node, or return None if it should not be searchable."""
+    from website.addons.wiki.model import NodeWikiPage
+
+    if node.is_deleted or not node.is_public or node.archiving:
+        return None
+
+    category = category or get_doctype_from_node(node)
+    try:
+        normalized_title = six.u(node.title)
+    except TypeError:
+        normalized_title = node.title
+    normalized_title = unicodedata.normalize('NFKD', normalized_title).encode('ascii', 'ignore')
+
+    elastic_document = {
+        'id': node._id,
+        'contributors': [
+            {
+                'fullname': x.fullname,
+                'url': x.profile_url if x.is_active else None
+            }
+            for x in node.visible_contributors
+            if x is not None
+        ],
+        'title': node.title,
+        'normalized_title': normalized_title,
+        'category': category,
+        'public': node.is_public,
+        'tags': [tag._id for tag in node.tags if tag],
+        'description': node.description,
+        'url': node.url,
+        'is_registration': node.is_registration,
+        'is_pending_registration': node.is_pending_registration,
+        'is_retracted': node.is_retracted,
+        'is_pending_retraction': node.is_pending_retraction,
+        'embargo_end_date': node.embargo_end_date.strftime('%A, %b. %d, %Y') if node.embargo_end_date else False,
+        'is_pending_embargo': node.is_pending_embargo,
+        'registered_date': node.registered_date,
+        'wikis': {},
+        'parent_id': node.parent_id,
+        'date_created': node.date_created,
+        'license': serialize_node_license_record(node.license),
+        'affiliated_institutions': [inst.name for inst in node.affiliated_institutions],
+        'boost': int(not node.is_registration) + 1,  # This is for making registered projects less relevant
+    }
+    if not node.is_retracted:
+        for wiki in [
+            NodeWikiPage.load(x)
+            for x in node.wiki_pages_current.values()
+        ]:
+            elastic_document['wikis'][wiki.page_name] = wiki.raw_text(node)
+    return elastic_document
+
 @requires_search
-def update_node(node, index=None, bulk=False):
+def update_node(node, index=None, bulk=False, saved_fields=None):
+    """Update the search document of a node, and those of its files if they may be stale.
+
+    :param iterable saved_fields: Node fields changed since the last update. If None, any field
+        may have changed and the node's files are always re-indexed.
+    """
     index = index or INDEX
-    from website.addons.wiki.model import NodeWikiPage
 
     category = get_doctype_from_node(node)
-
     elastic_document_id = node._id
-    parent_id = node.parent_id
 
-    from website.files.models.osfstorage import OsfStorageFile
-    for file_ in paginated(OsfStorageFile, Q('node', 'eq', node)):
-        update_file(file_, index=index)
+    if saved_fields is None or FILE_DENORMALIZED_FIELDS.intersection(saved_fields):
+        bulk_update_node_files(node, index=index)
 
-    if node.is_deleted or not node.is_public or node.archiving:
+    elastic_document = serialize_node(node, category=category)
+    if elastic_document is None:
         delete_doc(elastic_document_id, node, index=index)
+    elif bulk:
+        return elastic_document
     else:
-        try:
-            normalized_title = six.u(node.title)
-        except TypeError:
-            normalized_title = node.title
-        normalized_title = unicodedata.normalize('NFKD', normalized_title).encode('ascii', 'ignore')
-
-        elastic_document = {
-            'id': elastic_document_id,
-            'contributors': [
-                {
-                    'fullname': x.fullname,
-                    'url': x.profile_url if x.is_active else None
-                }
-                for x in node.visible_contributors
-                if x is not None
-            ],
-            'title': node.title,
-            'normalized_title': normalized_title,
-            'category': category,
-            'public': node.is_public,
-            'tags': [tag._id for tag in node.tags if tag],
-            'description': node.description,
-            'url': node.url,
-            'is_registration': node.is_registration,
-            'is_pending_registration': node.is_pending_registration,
-            'is_retracted': node.is_retracted,
-            'is_pending_retraction': node.is_pending_retraction,
-            'embargo_end_date': node.embargo_end_date.strftime('%A, %b. %d, %Y') if node.embargo_end_date else False,
-            'is_pending_embargo': node.is_pending_embargo,
-            'registered_date': node.registered_date,
-            'wikis': {},
-            'parent_id': parent_id,
-            'date_created': node.date_created,
-            'license': serialize_node_license_record(node.license),
-            'affiliated_institutions': [inst.name for inst in node.affiliated_institutions],
-            'boost': int(not node.is_registration) + 1,  # This is for making registered projects less relevant
-        }
-        if not node.is_retracted:
-            for wiki in [
-                NodeWikiPage.load(x)
-                for x in node.wiki_pages_current.values()
-            ]:
-                elastic_document['wikis'][wiki.page_name] = wiki.raw_text(node)
-
-        if bulk:
-            return elastic_document
-        else:
-            es.index(index=index, doc_type=category, id=elastic_document_id, body=elastic_document, refresh=True)
+        es.index(index=index, doc_type=category, id=elastic_document_id, body=elastic_document, refresh=True)
 
 def bulk_update_nodes(serialize, nodes, index=None):
     """Updates the list of input projects
@@ -394,16 +419,10 @@ def serialize_contributors(node):
 bulk_update_contributors = functools.partial(bulk_update_nodes, serialize_contributors)
 
 
-@requires_search
-def update_user(user, index=None):
-
-    index = index or INDEX
+def serialize_user(user):
+    """Build the search document for a user, or return None if they should not be searchable."""
     if not user.is_active:
-        try:
-            es.delete(index=index, doc_type='user', id=user._id, refresh=True, ignore=[404])
-        except NotFoundError:
-            pass
-        return
+        return None
 
     names = dict(
         fullname=user.fullname,
@@ -422,7 +441,7 @@ def update_user(user, index=None):
                 pass  # This is fine, will only happen in 2.x if val is already unicode
             normalized_names[key] = unicodedata.normalize('NFKD', val).encode('ascii', 'ignore')
 
-    user_doc = {
+    return {
         'id': user._id,
         'user': user.fullname,
         'normalized_user': normalized_names['fullname'],
@@ -439,23 +458,25 @@ def update_user(user, index=None):
         'boost': 2,  # TODO(fabianvf): Probably should make this a constant or something
     }
 
-    es.index(index=index, doc_type='user', body=user_doc, id=user._id, refresh=True)
-
 @requires_search
-def update_file(file_, index=None, delete=False):
+def update_user(user, index=None):
 
     index = index or INDEX
-
-    if not file_.node.is_public or delete or file_.node.is_deleted or file_.node.archiving:
-        es.delete(
-            index=index,
-            doc_type='file',
-            id=file_._id,
-            refresh=True,
-            ignore=[404]
-        )
+    user_doc = serialize_user(user)
+    if user_doc is None:
+        try:
+            es.delete(index=index, doc_type='user', id=user._id, refresh=True, ignore=[404])
+        except NotFoundError:
+            pass
         return
 
+    es.index(index=index, doc_type='user', body=user_doc, id=user._id, refresh=True)
+
+def serialize_file(file_):
+    """Build the search document for an OSF Storage file, or return None if it should not be searchable."""
+    if not file_.node.is_public or file_.node.is_deleted or file_.node.archiving:
+        return None
+
     # We build URLs manually here so that this function can be
     # run outside of a Flask request context (e.g. in a celery task)
     file_deep_url = '/{node_id}/files/{provider}{path}/'.format(
@@ -465,7 +486,7 @@ def update_file(file_, index=None, delete=False):
     )
     node_url = '/{node_id}/'.format(node_id=file_.node._id)
 
-    file_doc = {
+    return {
         'id': file_._id,
         'deep_url': file_deep_url,
         'tags': [tag._id for tag in file_.tags],
@@ -478,6 +499,22 @@ def update_file(file_, index=None, delete=False):
         'is_retracted': file_.node.is_retracted
     }
 
+@requires_search
+def update_file(file_, index=None, delete=False):
+
+    index = index or INDEX
+
+    file_doc = None if delete else serialize_file(file_)
+    if file_doc is None:
+        es.delete(
+            index=index,
+            doc_type='file',
+            id=file_._id,
+            refresh=True,
+            ignore=[404]
+        )
+        return
+
     es.index(
         index=index,
         doc_type='file',
@@ -486,23 +523,165 @@ def update_file(file_, index=None, delete=False):
         refresh=True
     )
 
+@requires_search
+def bulk_update_node_files(node, index=None):
+    """Re-index all OSF Storage files of a node with bulk requests and a single refresh at the end.
+
+    :param Node node: Project, component or registration whose files to update
+    :param str index: Index of the files
+    """
+    index = index or INDEX
+    failed = [result for ok, result in bulk_results(node_file_actions(node, index)) if not ok]
+    es.indices.refresh(index=index)
+    if failed:
+        raise exceptions.SearchException('Failed to index {0} files of node {1}: {2}'.format(len(failed), node._id, failed[0]))
+
+def node_file_actions(node, index):
+    """Yield bulk actions re-indexing all OSF Storage files of a node."""
+    from website.files.models.osfstorage import OsfStorageFile
+
+    for file_ in paginated(OsfStorageFile, Q('node', 'eq', node)):
+        yield bulk_action(index, 'file', file_._id, serialize_file(file_))
+
+def bulk_action(index, doc_type, id_, document):
+    """Return a bulk action indexing ``document``, or deleting its previous version if it is None."""
+    if document is None:
+        return {'_op_type': 'delete', '_index': index, '_type': doc_type, '_id': id_}
+    return {'_op_type': 'index', '_index': index, '_type': doc_type, '_id': id_, '_source': document}
+
+def bulk_results(actions):
+    """Send bulk actions and yield whether each one succeeded, with its result, in the order of ``actions``.
+
+    Deleting a document that was never indexed is not a failure.
+    """
+    for ok, item in helpers.streaming_bulk(es, actions, raise_on_error=False):
+        op_type, result = item.items()[0]
+        if not ok and not (op_type == 'delete' and result.get('status') == 404):
+            logger.error('Failed to {0} {1} {2}: {3}'.format(op_type, result.get('_type'), result.get('_id'), result.get('error')))
+            yield False, result
+        else:
+            yield True, result
+
+def serialize_institution(institution):
+    """Build the search document for an institution, or return None if it should not be searchable."""
+    if institution.is_deleted:
+        return None
+    return {
+        'id': institution._id,
+        'url': '/institutions/{}/'.format(institution._id),
+        'logo_path': institution.logo_path,
+        'category': 'institution',
+        'name': institution.name,
+    }
+
 @requires_search
 def update_institution(institution, index=None):
     index = index or INDEX
     id_ = institution._id
-    if institution.is_deleted:
+    institution_doc = serialize_institution(institution)
+    if institution_doc is None:
         es.delete(index=index, doc_type='institution', id=id_, refresh=True, ignore=[404])
     else:
-        institution_doc = {
-            'id': id_,
-            'url': '/institutions/{}/'.format(institution._id),
-            'logo_path': institution.logo_path,
-            'category': 'institution',
-            'name': institution.name,
-        }
-
         es.index(index=index, doc_type='institution', body=institution_doc, id=id_, refresh=True)
 
+def outbox_actions(entry, index):
+    """Return the bulk actions that bring the search documents of a search outbox entry up to date."""
+    from website.files.models.osfstorage import OsfStorageFile
+
+    doc_type, object_id = entry['doc_type'], entry['object_id']
+    if doc_type == 'node':
+        node = Node.load(object_id)
+        if node is None:
+            return []
+        saved_fields = outbox.get_saved_fields(entry)
+        actions = [bulk_action(index, get_doctype_from_node(node), node._id, serialize_node(node))]
+        if saved_fields is None or FILE_DENORMALIZED_FIELDS.intersection(saved_fields):
+            actions = itertools.chain(actions, node_file_actions(node, index))
+        return actions
+    if doc_type == 'user':
+        user = User.load(object_id)
+        return [bulk_action(index, 'user', object_id, user and serialize_user(user))]
+    if doc_type == 'file':
+        # Deleted files are moved to the trash and no longer load
+        file_ = OsfStorageFile.load(object_id)
+        return [bulk_action(index, 'file', object_id, file_ and serialize_file(file_))]
+    if doc_type == 'institution':
+        institution = Institution.load(object_id)
+        return [bulk_action(index, 'institution', object_id, institution and serialize_institution(institution))]
+    logger.error('Unknown search outbox doc_type {!r} for {!r}'.format(doc_type, object_id))
+    return []
+
+@celery_app.task(bind=True, max_retries=5, default_retry_delay=60)
+def drain_outbox(self, index=None, batch_size=None, settle_seconds=None):
+    """Index the documents queued in the search outbox.
+
+    Only entries left untouched for ``settle_seconds`` are drained, so that an object saved
+    several times in quick succession is serialized once.
+    """
+    if settle_seconds is None:
+        settle_seconds = settings.SEARCH_OUTBOX_SETTLE_SECONDS
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(seconds=settle_seconds)
+    try:
+        return flush_outbox(cutoff, index=index, batch_size=batch_size)
+    except Exception as exc:
+        self.retry(exc=exc)
+
+@requires_search
+def flush_outbox(cutoff, index=None, batch_size=None):
+    """Index the search outbox entries last marked before ``cutoff``, one bulk request per batch.
+
+    Only entries whose documents were all indexed are acknowledged. Entries that fail to serialize or
+    index are skipped until the next drain, and moved to the dead letters after
+    ``settings.SEARCH_OUTBOX_MAX_ATTEMPTS`` failed drains.
+
+    :return int: Number of entries drained
+    """
+    index = index or INDEX
+    batch_size = batch_size or settings.SEARCH_OUTBOX_BATCH_SIZE
+
+    logger.info('Search outbox depth: {depth}, lag: {lag:.0f}s'.format(**outbox.stats()))
+
+    drained = 0
+    failed_ids = set()
+    try:
+        while True:
+            entries = outbox.pending(cutoff, batch_size, exclude=failed_ids)
+            if not entries:
+                break
+            errors = {}
+            # Id of the entry of each action sent, in order
+            owners = []
+
+            def actions():
+                for entry in entries:
+                    try:
+                        entry_actions = list(outbox_actions(entry, index))
+                    except Exception as error:
+                        logger.exception('Failed to serialize search outbox entry {}'.format(entry['_id']))
+                        errors[entry['_id']] = repr(error)
+                        continue
+                    for action in entry_actions:
+                        owners.append(entry['_id'])
+                        yield action
+
+            # Results come back in the order of the actions, after those actions were generated
+            for i, (ok, result) in enumerate(bulk_results(actions())):
+                if not ok:
+                    errors.setdefault(owners[i], result.get('error'))
+
+            for entry in entries:
+                if entry['_id'] in errors:
+                    outbox.record_failure(entry, errors[entry['_id']], settings.SEARCH_OUTBOX_MAX_ATTEMPTS)
+            failed_ids.update(errors)
+            indexed = [entry for entry in entries if entry['_id'] not in errors]
+            outbox.acknowledge(indexed)
+            drained += len(indexed)
+    finally:
+        if drained:
+            es.indices.refresh(index=index)
+    logger.info('Drained {0} search outbox entries, {1} failed'.format(drained, len(failed_ids)))
+    return drained
+
 @requires_search
 def delete_all():
     delete_index(INDEX)
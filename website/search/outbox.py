@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""Outbox of search documents waiting to be re-indexed.
+
+Instead of indexing on every save, models mark their ``(doc_type, id)`` pair dirty here and
+``elastic_search.drain_outbox`` rebuilds the dirty documents in batches. Marking an object that
+is already queued only merges the saved fields into the existing entry, so repeated saves of the
+same object collapse into a single document build.
+"""
+import datetime
+import logging
+
+from framework.mongo import database
+
+logger = logging.getLogger(__name__)
+
+collection = database['searchoutbox']
+# Entries that failed to index too many times, kept for inspection
+dead_letters = database['searchoutboxdead']
+
+
+def _key(doc_type, object_id):
+    return '{0}:{1}'.format(doc_type, object_id)
+
+
+def mark_dirty(doc_type, object_id, saved_fields=None):
+    """Queue the search document of an object for re-indexing.
+
+    :param str doc_type: One of 'node', 'user', 'file' or 'institution'
+    :param str object_id: Primary key of the object
+    :param iterable saved_fields: Fields changed by the save; None if any field may have changed
+    """
+    now = datetime.datetime.utcnow()
+    update = {
+        '$set': {
+            'doc_type': doc_type,
+            'object_id': object_id,
+            'date_modified': now,
+        },
+        '$setOnInsert': {'date_queued': now},
+        # Lets the drain tell whether an entry was marked again while it was being indexed
+        '$inc': {'version': 1},
+    }
+    if saved_fields is None:
+        update['$set']['all_fields'] = True
+    else:
+        update['$addToSet'] = {'saved_fields': {'$each': list(saved_fields)}}
+    collection.update({'_id': _key(doc_type, object_id)}, update, upsert=True, manipulate=False)
+
+
+def pending(cutoff, limit, exclude=()):
+    """Return up to ``limit`` entries last marked no later than ``cutoff``, oldest first.
+
+    :param iterable exclude: Ids of entries to leave out
+    """
+    query = {'date_modified': {'$lte': cutoff}}
+    if exclude:
+        query['_id'] = {'$nin': list(exclude)}
+    cursor = collection.find(query).sort('date_queued', 1).limit(limit)
+    return list(cursor)
+
+
+def acknowledge(entries):
+    """Remove drained entries, keeping those that were marked again after they were read."""
+    if entries:
+        collection.remove({
+            '$or': [
+                {'_id': entry['_id'], 'version': entry['version']}
+                for entry in entries
+            ]
+        })
+
+
+def record_failure(entry, error, max_attempts):
+    """Count a failed attempt to index an entry, moving it to the dead letters after ``max_attempts``."""
+    updated = collection.find_and_modify(
+        {'_id': entry['_id']},
+        {'$inc': {'attempts': 1}, '$set': {'last_error': error}},
+        new=True,
+    )
+    if updated is not None and updated['attempts'] >= max_attempts:
+        logger.error('Giving up on search outbox entry {0} after {1} attempts: {2}'.format(
+            updated['_id'], updated['attempts'], error
+        ))
+        dead_letters.save(updated)
+        collection.remove({'_id': updated['_id']})
+
+
+def get_saved_fields(entry):
+    """Return the fields saved since an entry was queued, or None if any field may have changed."""
+    if entry.get('all_fields'):
+        return None
+    return entry.get('saved_fields', [])
+
+
+def stats():
+    """Return the number of queued entries and the age in seconds of the oldest one."""
+    oldest = collection.find_one({}, {'date_queued': 1}, sort=[('date_queued', 1)])
+    lag = 0
+    if oldest is not None:
+        lag = (datetime.datetime.utcnow() - oldest['date_queued']).total_seconds()
+    return {
+        'depth': collection.count(),
+        'lag': lag,
+    }
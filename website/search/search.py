@@ -3,6 +3,7 @@ import logging
 from framework.celery_tasks.handlers import enqueue_task
 
 from website import settings
+from website.search import outbox
 from website.search import share_search
 
 logger = logging.getLogger(__name__)
@@ -26,20 +27,25 @@ def search(query, index=None, doc_type=None):
     return search_engine.search(query, index=index, doc_type=doc_type)
 
 @requires_search
-def update_node(node, index=None, bulk=False, async=True):
+def update_node(node, index=None, bulk=False, async=True, saved_fields=None):
+    if saved_fields is not None:
+        # Must be serializable to be passed to celery
+        saved_fields = list(saved_fields)
     if async:
         node_id = node._id
         # We need the transaction to be committed before trying to run celery tasks.
         # For example, when updating a Node's privacy, is_public must be True in the
         # database in order for method that updates the Node's elastic search document
         # to run correctly.
-        if settings.USE_CELERY:
-            enqueue_task(search_engine.update_node_async.s(node_id=node_id, index=index, bulk=bulk))
+        if settings.USE_CELERY and index is None and not bulk:
+            outbox.mark_dirty('node', node_id, saved_fields=saved_fields)
+        elif settings.USE_CELERY:
+            enqueue_task(search_engine.update_node_async.s(node_id=node_id, index=index, bulk=bulk, saved_fields=saved_fields))
         else:
-            search_engine.update_node_async(node_id=node_id, index=index, bulk=bulk)
+            search_engine.update_node_async(node_id=node_id, index=index, bulk=bulk, saved_fields=saved_fields)
     else:
         index = index or settings.ELASTIC_INDEX
-        return search_engine.update_node(node, index=index, bulk=bulk)
+        return search_engine.update_node(node, index=index, bulk=bulk, saved_fields=saved_fields)
 
 @requires_search
 def bulk_update_nodes(serialize, nodes, index=None):
@@ -59,20 +65,39 @@ def update_contributors(nodes):
 
 
 @requires_search
-def update_user(user, index=None):
+def update_user(user, index=None, async=True):
+    if async and settings.USE_CELERY and index is None:
+        outbox.mark_dirty('user', user._id)
+        return
     index = index or settings.ELASTIC_INDEX
     search_engine.update_user(user, index=index)
 
 @requires_search
-def update_file(file_, index=None, delete=False):
+def update_file(file_, index=None, delete=False, async=True):
+    if async and settings.USE_CELERY and index is None:
+        # The outbox removes the document if the file is gone by the time it is drained
+        outbox.mark_dirty('file', file_._id)
+        return
     index = index or settings.ELASTIC_INDEX
     search_engine.update_file(file_, index=index, delete=delete)
 
 @requires_search
-def update_institution(institution, index=None):
+def update_institution(institution, index=None, async=True):
+    if async and settings.USE_CELERY and index is None:
+        outbox.mark_dirty('institution', institution._id)
+        return
     index = index or settings.ELASTIC_INDEX
     search_engine.update_institution(institution, index=index)
 
+@requires_search
+def drain_outbox(index=None, batch_size=None):
+    """Index everything queued in the search outbox now, without waiting for the beat task."""
+    return search_engine.drain_outbox(index=index, batch_size=batch_size, settle_seconds=0)
+
+def outbox_stats():
+    """Return the depth of the search outbox and the age in seconds of its oldest entry."""
+    return outbox.stats()
+
 @requires_search
 def delete_all():
     search_engine.delete_all()
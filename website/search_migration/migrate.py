@@ -3,53 +3,195 @@
 '''Migration script for Search-enabled Models.'''
 from __future__ import absolute_import
 
+import itertools
 import logging
+import multiprocessing
+from collections import Counter, OrderedDict
 
-from elasticsearch import helpers
+from elasticsearch import Elasticsearch, helpers
 from modularodm.query.querydialect import DefaultQueryDialect as Q
 
+from framework.mongo import database
+from framework.mongo import handlers as mongo_handlers
 from framework.mongo.utils import paginated
 from website import settings
 from framework.auth import User
 from website.models import Node
-from website.app import init_app
+from website.app import do_set_backends, init_app
 import website.search.search as search
 from scripts import utils as script_utils
+from website.search import elastic_search
 from website.search.elastic_search import es
 
 
 logger = logging.getLogger(__name__)
 
-def migrate_nodes(index):
-    logger.info('Migrating nodes to index: {}'.format(index))
-    query = Q('is_public', 'eq', True) & Q('is_deleted', 'eq', False)
-    total = Node.find(query).count()
-    increment = 200
-    total_pages = (total // increment) + 1
-    pages = paginated(Node, query=query, increment=increment, each=False)
-    for page_number, page in enumerate(pages):
-        logger.info('Updating page {} / {}'.format(page_number + 1, total_pages))
-        Node.bulk_update_search(page, index=index)
+# Progress of interrupted migrations, keyed by the alias being migrated
+checkpoints = database['searchmigration']
+
+# Objects whose search documents are migrated, as raw queries on their collections
+MIGRATED_COLLECTIONS = OrderedDict([
+    ('node', {'is_public': True, 'is_deleted': False}),
+    ('user', {}),
+])
+
+# Number of objects serialized and sent by a worker as one unit of work
+RANGE_SIZE = 1000
+
+# Elasticsearch client of the current worker process
+worker_es = None
+
+
+def node_actions(index, start, end):
+    query = (
+        Q('is_public', 'eq', True) &
+        Q('is_deleted', 'eq', False) &
+        Q('_id', 'gte', start)
+    )
+    if end is not None:
+        query = query & Q('_id', 'lt', end)
+    for page in paginated(Node, query=query, increment=200, each=False):
+        for node in page:
+            node_doc = elastic_search.serialize_node(node)
+            if node_doc is not None:
+                yield elastic_search.bulk_action(index, elastic_search.get_doctype_from_node(node), node._id, node_doc)
+                for action in elastic_search.node_file_actions(node, index):
+                    if action['_op_type'] == 'index':
+                        yield action
         Node._clear_caches()
 
-    logger.info('Nodes migrated: {}'.format(total))
 
+def user_actions(index, start, end):
+    query = Q('_id', 'gte', start)
+    if end is not None:
+        query = query & Q('_id', 'lt', end)
+    for page in paginated(User, query=query, increment=1000, each=False):
+        for user in page:
+            user_doc = elastic_search.serialize_user(user)
+            if user_doc is not None:
+                yield elastic_search.bulk_action(index, 'user', user._id, user_doc)
+        User._clear_caches()
+
+
+ACTIONS = {
+    'node': node_actions,
+    'user': user_actions,
+}
+
+
+def split_ranges(doc_type, range_size=RANGE_SIZE):
+    """Split the ids of the objects to migrate into consecutive ranges of ``range_size``.
+
+    :return list: ``(start, end)`` pairs; ``end`` is exclusive, and None for the last range
+    """
+    cursor = database[doc_type].find(MIGRATED_COLLECTIONS[doc_type], {'_id': 1}).sort('_id', 1)
+    starts = [doc['_id'] for i, doc in enumerate(cursor) if i % range_size == 0]
+    return zip(starts, starts[1:] + [None])
+
+
+def init_worker():
+    global worker_es
+    # Connections must not be shared with the parent process. pymongo clients are not fork-safe, so drop
+    # the clients inherited from the parent and let the storage backends open a new one.
+    mongo_handlers.CLIENT_POOL = mongo_handlers.ClientPool()
+    do_set_backends(settings)
+    worker_es = Elasticsearch(settings.ELASTIC_URI, request_timeout=settings.ELASTIC_TIMEOUT)
 
-def migrate_users(index):
-    logger.info('Migrating users to index: {}'.format(index))
-    n_migr = 0
-    n_iter = 0
-    users = paginated(User, query=None, increment=1000, each=True)
-    for user in users:
-        if user.is_active:
-            search.update_user(user, index=index)
-            n_migr += 1
-        n_iter += 1
 
-    logger.info('Users iterated: {0}\nUsers migrated: {1}'.format(n_iter, n_migr))
+def index_range(range_):
+    """Serialize the objects of a range and send them to the index with bulk requests.
 
+    :return tuple: The range, the number of documents indexed per type and the number of failures
+    """
+    client = worker_es or es
+    counts = Counter()
+    failures = 0
+    actions = ACTIONS[range_['doc_type']](range_['index'], range_['start'], range_['end'])
+    for ok, item in helpers.streaming_bulk(client, actions):
+        result = item.values()[0]
+        if ok:
+            counts[result['_type']] += 1
+        else:
+            logger.error('Failed to index {0} {1}: {2}'.format(result.get('_type'), result.get('_id'), result.get('error')))
+            failures += 1
+    return range_, dict(counts), failures
 
-def migrate(delete, index=None, app=None):
+
+def plan_migration(index, new_index):
+    """Record the ranges to migrate into ``new_index``, replacing any previous checkpoint for ``index``."""
+    ranges = [
+        {
+            'key': '{0}:{1}'.format(doc_type, n),
+            'doc_type': doc_type,
+            'index': new_index,
+            'start': start,
+            'end': end,
+            'done': False,
+        }
+        for doc_type in MIGRATED_COLLECTIONS
+        for n, (start, end) in enumerate(split_ranges(doc_type))
+    ]
+    checkpoint = {'_id': index, 'target': new_index, 'ranges': ranges}
+    checkpoints.save(checkpoint)
+    return checkpoint
+
+
+def run_migration(checkpoint, processes=1):
+    """Index every range of a checkpoint that is not done yet or had failures, marking each one done as it completes."""
+    todo = [range_ for range_ in checkpoint['ranges'] if not range_['done'] or range_['failures']]
+    logger.info('Migrating {0} of {1} ranges to index: {2}'.format(len(todo), len(checkpoint['ranges']), checkpoint['target']))
+    if processes > 1:
+        pool = multiprocessing.Pool(processes, initializer=init_worker)
+        results = pool.imap_unordered(index_range, todo)
+    else:
+        pool = None
+        results = itertools.imap(index_range, todo)
+    try:
+        for n, (range_, counts, failures) in enumerate(results):
+            checkpoints.update(
+                {'_id': checkpoint['_id'], 'ranges.key': range_['key']},
+                {'$set': {
+                    'ranges.$.done': True,
+                    'ranges.$.counts': counts,
+                    'ranges.$.failures': failures,
+                }}
+            )
+            logger.info('Range {0} done ({1} / {2})'.format(range_['key'], n + 1, len(todo)))
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    return checkpoints.find_one({'_id': checkpoint['_id']})
+
+
+def validate_migration(checkpoint):
+    """Check that every range was indexed without failures and the index holds the documents sent to it."""
+    expected = Counter()
+    valid = True
+    for range_ in checkpoint['ranges']:
+        if not range_['done'] or range_['failures']:
+            logger.error('Range {0} was not fully indexed'.format(range_['key']))
+            valid = False
+        expected.update(range_.get('counts', {}))
+
+    index = checkpoint['target']
+    es.indices.refresh(index=index)
+    for doc_type, count in expected.items():
+        indexed = es.count(index=index, doc_type=doc_type)['count']
+        # The first migration reindexes the existing documents first, so there may be more
+        if indexed < count:
+            logger.error('Index {0} has {1} {2} documents, expected {3}'.format(index, indexed, doc_type, count))
+            valid = False
+    return valid
+
+
+def migrate(delete, index=None, app=None, processes=1, resume=False):
+    """Reindex all search documents into a new version of ``index`` and point the alias at it.
+
+    :param bool delete: Delete the previous version of the index once migrated
+    :param int processes: Number of worker processes serializing and sending documents
+    :param bool resume: Continue the last interrupted migration of ``index`` instead of starting over
+    """
     index = index or settings.ELASTIC_INDEX
     app = app or init_app('website.settings', set_backends=True, routes=True)
 
@@ -60,12 +202,22 @@ def migrate(delete, index=None, app=None):
     ctx = app.test_request_context()
     ctx.push()
 
-    new_index = set_up_index(index)
+    checkpoint = checkpoints.find_one({'_id': index}) if resume else None
+    if checkpoint is None:
+        new_index = set_up_index(index)
+        checkpoint = plan_migration(index, new_index)
+    else:
+        new_index = checkpoint['target']
+        logger.info('Resuming migration to index: {}'.format(new_index))
+
+    checkpoint = run_migration(checkpoint, processes=processes)
 
-    migrate_nodes(new_index)
-    migrate_users(new_index)
+    if not validate_migration(checkpoint):
+        ctx.pop()
+        raise RuntimeError('Migration to {} failed validation; rerun with resume to retry'.format(new_index))
 
     set_up_alias(index, new_index)
+    checkpoints.remove({'_id': index})
 
     if delete:
         delete_old(new_index)
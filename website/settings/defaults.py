@@ -83,6 +83,12 @@ SEARCH_ENGINE = 'elastic'  # Can be 'elastic', or None
 ELASTIC_URI = 'localhost:9200'
 ELASTIC_TIMEOUT = 10
 ELASTIC_INDEX = 'website'
+# When celery is enabled, saved objects are queued in the search outbox and re-indexed in
+# batches of this size once they have not been saved again for SEARCH_OUTBOX_SETTLE_SECONDS
+SEARCH_OUTBOX_BATCH_SIZE = 500
+SEARCH_OUTBOX_SETTLE_SECONDS = 5
+# Entries that fail to index this many times are moved to the searchoutboxdead collection
+SEARCH_OUTBOX_MAX_ATTEMPTS = 5
 SHARE_ELASTIC_URI = ELASTIC_URI
 SHARE_ELASTIC_INDEX = 'share'
 # For old indices
@@ -94,6 +100,13 @@ COOKIE_NAME = 'osf'
 OSF_COOKIE_DOMAIN = None
 # server-side verification timeout
 OSF_SESSION_TIMEOUT = 30 * 24 * 60 * 60  # 30 days in seconds
+# A user's date_last_login is updated at most once per this many seconds
+DATE_LAST_LOGIN_THROTTLE = 5 * 60
+# Optional in-process cache of up to SESSION_CACHE_SIZE sessions, each kept for SESSION_CACHE_TTL
+# seconds. Disabled by default, because a session removed by another process (e.g. on logout)
+# stays usable in this one until it expires from the cache.
+SESSION_CACHE_SIZE = 0
+SESSION_CACHE_TTL = 30
 # TODO: Override SECRET_KEY in local.py in production
 SECRET_KEY = 'CHANGEME'
 SESSION_COOKIE_SECURE = SECURE_MODE
@@ -184,6 +197,8 @@ PROFILE_IMAGE_SMALL = 20
 
 # Conference options
 CONFERENCE_MIN_COUNT = 5
+# Default page size of the meetings submission listings when a page is requested
+CONFERENCE_SUBMISSIONS_PAGE_SIZE = 100
 
 WIKI_WHITELIST = {
     'tags': [
@@ -290,9 +305,23 @@ NEW_AND_NOTEWORTHY_CONTRIBUTOR_BLACKLIST = []  # TODO Override in local.py in pr
 # and uploads in order to save disk space.
 DISK_SAVING_MODE = False
 
+# Addon root folders on the files page are fetched from their providers concurrently by up to
+# ADDON_HGRID_POOL_SIZE greenlets, each given ADDON_HGRID_TIMEOUT seconds, and cached in
+# process for ADDON_HGRID_CACHE_TTL seconds
+ADDON_HGRID_POOL_SIZE = 10
+ADDON_HGRID_TIMEOUT = 10
+ADDON_HGRID_CACHE_TTL = 30
+
 # Seconds before another notification email can be sent to a contributor when added to a project
 CONTRIBUTOR_ADDED_EMAIL_THROTTLE = 24 * 3600
 
+# Page and download counters are buffered in memory and written at most every
+# ANALYTICS_FLUSH_INTERVAL seconds, or sooner once ANALYTICS_FLUSH_PAGES pages have pending counts
+ANALYTICS_FLUSH_INTERVAL = 10
+ANALYTICS_FLUSH_PAGES = 1000
+# Expected number of distinct (visitor, page) pairs per day and process, used to size unique visitor tracking
+ANALYTICS_VISITORS_PER_DAY = 1000000
+
 # Google Analytics
 GOOGLE_ANALYTICS_ID = None
 GOOGLE_SITE_VERIFICATION = None
@@ -320,6 +349,15 @@ SHARE_REGISTRATION_URL = ''
 SHARE_API_DOCS_URL = ''
 
 CAS_SERVER_URL = 'http://localhost:8080'
+# Profiles of OAuth2 access tokens looked up from CAS are cached in process for CAS_TOKEN_CACHE_TTL
+# seconds, up to CAS_TOKEN_CACHE_SIZE tokens. Tokens CAS rejects are cached for
+# CAS_TOKEN_NEGATIVE_CACHE_TTL seconds; set either TTL to 0 to disable that part of the cache.
+# Revoking tokens increments a generation counter in the castokenrevocations collection, which
+# every process reads on each profile lookup; entries cached under an older generation are
+# discarded, so a revocation applies to every process from its next lookup on.
+CAS_TOKEN_CACHE_SIZE = 10000
+CAS_TOKEN_CACHE_TTL = 60
+CAS_TOKEN_NEGATIVE_CACHE_TTL = 10
 MFR_SERVER_URL = 'http://localhost:7778'
 
 ###### ARCHIVER ###########
@@ -332,6 +370,20 @@ ARCHIVE_TIMEOUT_TIMEDELTA = timedelta(1)  # 24 hours
 
 ENABLE_ARCHIVER = True
 
+# Files are copied into an archive in batches of this many, one task per batch
+ARCHIVE_COPY_BATCH_SIZE = 100
+# A batch that hits transient provider errors is retried this many times,
+# waiting ARCHIVE_COPY_RETRY_DELAY seconds, doubled after each attempt
+ARCHIVE_COPY_MAX_RETRIES = 5
+ARCHIVE_COPY_RETRY_DELAY = 10
+# A file WaterButler accepted for copying in the background is sent again by a
+# resumed batch if no callback has arrived for it after this long
+ARCHIVE_COPY_ACCEPTED_TIMEOUT = timedelta(hours=1)
+
+# Forks and templates of projects with more components than this copy their
+# components in a background task instead of during the request
+COPY_CHILDREN_SYNC_LIMIT = 10
+
 JWT_SECRET = 'changeme'
 JWT_ALGORITHM = 'HS256'
 
@@ -417,6 +469,9 @@ CELERY_IMPORTS = (
     'scripts.triggered_mails',
     'scripts.send_queued_mails',
     'scripts.meeting_visit_count',
+    'scripts.refresh_node_counters',
+    'scripts.sales_analytics',
+    'website.project.tasks',
 )
 
 # Modules that need metrics and release requirements
@@ -492,6 +547,20 @@ else:
             'schedule': crontab(minute=0, hour=0),  # Daily 12 a.m
             'kwargs': {'dry_run': False},
         },
+        'refresh_node_counters': {
+            'task': 'scripts.refresh_node_counters',
+            'schedule': crontab(minute=0, hour=3, day_of_week=0),  # Sunday 3:00 a.m.
+            'kwargs': {'dry_run': False},
+        },
+        'sales_analytics': {
+            'task': 'scripts.sales_analytics',
+            'schedule': crontab(minute=0, hour=1),  # Daily 1:00 a.m.
+            'kwargs': {'dry_run': False},
+        },
+        'drain_search_outbox': {
+            'task': 'website.search.elastic_search.drain_outbox',
+            'schedule': crontab(),  # Every minute
+        },
     }
 
     # Tasks that need metrics and release requirements
@@ -561,6 +630,11 @@ ENABLE_INSTITUTIONS = False
 ENABLE_VARNISH = False
 ENABLE_ESI = False
 VARNISH_SERVERS = []  # This should be set in local.py or cache invalidation won't work
+# Bans collected during a request are merged into regexes of at most this many
+# characters and sent to each Varnish server concurrently
+VARNISH_BAN_MAX_LENGTH = 2000
+VARNISH_BAN_POOL_SIZE = 10
+VARNISH_BAN_TIMEOUT = 0.3  # seconds
 ESI_MEDIA_TYPES = {'application/vnd.api+json', 'application/json'}
 
 # Used for gathering meta information about the current build
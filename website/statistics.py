@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""Daily counters behind the admin OSF statistics.
+
+Each document in the ``osfstatistics`` collection holds, for one day, the
+number of top-level projects (and public projects and registrations) created
+that day, and the number of active users registered that day, as they stand
+now. Summing the documents before a date gives the same totals as counting
+nodes and users created before that date.
+"""
+import collections
+import weakref
+
+from modularodm import signals
+
+from framework.mongo import database
+from website.models import Node, User
+
+COLLECTION = 'osfstatistics'
+
+NODE_FIELDS = {'parent_node', 'is_collection', 'is_deleted', 'is_public', 'is_registration'}
+USER_FIELDS = {'is_registered', 'password', 'merged_by', 'date_confirmed', 'date_disabled'}
+COUNTERS = ('projects', 'public_projects', 'registered_projects', 'users')
+
+# Objects being saved for the first time, see `record_insert`
+_inserting = weakref.WeakSet()
+
+
+def node_counters(get):
+    """Return the counters a node adds to its day; ``get`` looks up node fields."""
+    if get('parent_node') or get('is_collection') or get('is_deleted'):
+        return {}
+    return {
+        'projects': 1,
+        'public_projects': int(bool(get('is_public'))),
+        'registered_projects': int(bool(get('is_registration'))),
+    }
+
+
+def user_counters(get):
+    """Return the counters a user adds to its day; ``get`` looks up user fields."""
+    active = (
+        get('is_registered') and
+        get('password') and
+        not get('merged_by') and
+        get('date_confirmed') and
+        not get('date_disabled')
+    )
+    return {'users': 1} if active else {}
+
+
+def day_key(date):
+    return date.strftime('%Y-%m-%d')
+
+
+def increment(date, counters):
+    counters = {key: value for key, value in counters.items() if value}
+    if counters:
+        database[COLLECTION].update({'_id': day_key(date)}, {'$inc': counters}, upsert=True)
+
+
+@signals.before_save.connect
+def record_insert(sender, instance):
+    """Remember whether ``instance`` is being inserted. The save signal cannot
+    tell: existing objects missing from the cache also come without cached data.
+    """
+    if not isinstance(instance, (Node, User)):
+        return
+    if instance._is_loaded:
+        _inserting.discard(instance)
+    else:
+        _inserting.add(instance)
+
+
+@signals.save.connect
+def update_statistics(sender, instance, fields_changed, cached_data):
+    if isinstance(instance, Node):
+        get_counters, date_field, watched = node_counters, 'date_created', NODE_FIELDS
+    elif isinstance(instance, User):
+        get_counters, date_field, watched = user_counters, 'date_registered', USER_FIELDS
+    else:
+        return
+    inserted = instance in _inserting
+    _inserting.discard(instance)
+    if not inserted:
+        if not watched.intersection(fields_changed or ()):
+            return
+        if not cached_data:
+            # Without the previous values the change cannot be counted;
+            # rebuild_statistics corrects the counters
+            return
+
+    before = {} if inserted else get_counters(cached_data.get)
+    after = get_counters(lambda name: getattr(instance, name))
+    increment(getattr(instance, date_field), {
+        key: after.get(key, 0) - before.get(key, 0)
+        for key in COUNTERS
+    })
+
+
+def get_totals(dates):
+    """Return, for each of ``dates``, the counters summed over every day before
+    it, reading the collection once.
+    """
+    totals = {}
+    running = collections.Counter()
+    dates = sorted(dates)
+    if not dates:
+        return totals
+    days = iter(database[COLLECTION].find({'_id': {'$lt': day_key(dates[-1])}}).sort('_id', 1))
+    day = next(days, None)
+    for date in dates:
+        while day is not None and day['_id'] < day_key(date):
+            running.update({key: day.get(key, 0) for key in COUNTERS})
+            day = next(days, None)
+        totals[date] = running.copy()
+    return totals
+
+
+def rebuild_statistics():
+    """Recompute every day's counters in one pass over nodes and users."""
+    days = collections.defaultdict(collections.Counter)
+    for node in database['node'].find({}, dict.fromkeys(NODE_FIELDS | {'date_created'}, True)):
+        if node.get('date_created'):
+            days[day_key(node['date_created'])].update(node_counters(node.get))
+    for user in database['user'].find({}, dict.fromkeys(USER_FIELDS | {'date_registered'}, True)):
+        if user.get('date_registered'):
+            days[day_key(user['date_registered'])].update(user_counters(user.get))
+
+    database[COLLECTION].remove({})
+    if days:
+        database[COLLECTION].insert([
+            dict(counters, _id=key) for key, counters in days.items()
+        ])
+    return days
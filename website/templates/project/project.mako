@@ -422,7 +422,7 @@
 </div>
 
 <%def name="children()">
-% if ('write' in user['permissions'] and not node['is_registration']) or node['children']:
+% if ('write' in user['permissions'] and not node['is_registration']) or node['children'] or node['children_pending']:
     <div class="components panel panel-default">
         <div class="panel-heading clearfix">
             <h3 class="panel-title" style="padding-bottom: 5px; padding-top: 5px;">Components </h3>
@@ -436,6 +436,9 @@
             </div>
         </div><!-- end addon-widget-header -->
         <div class="panel-body">
+            % if node['children_pending']:
+                <p class="text-muted">Components are still being copied to this ${node['node_type']}. Refresh the page in a few minutes to see all of them.</p>
+            % endif
             % if node['children']:
                 <div id="containment">
                     <div mod-meta='{
@@ -448,7 +451,7 @@
                         }
                       }'></div>
                 </div><!-- end containment -->
-            % else:
+            % elif not node['children_pending']:
               <p>No components have been added to this ${node['node_type']}.</p>
             % endif
         </div><!-- end addon-widget-body -->
@@ -2,10 +2,17 @@
 """Contains helper functions for generating correctly
 formatted hgrid list/folders.
 """
+import copy
+import json
+import time
+import hashlib
 import logging
 import datetime
 
+import gevent
 import hurry.filesize
+from flask import copy_current_request_context, has_request_context
+from gevent.pool import Pool
 
 from framework import sentry
 from framework.auth.decorators import Auth
@@ -29,6 +36,9 @@ DEFAULT_PERMISSIONS = {
     'edit': False,
 }
 
+# Addon root folders by cache key, as (expiry timestamp, hgrid data)
+_addon_root_cache = {}
+
 def format_filesize(size):
     return hurry.filesize.size(size, system=hurry.filesize.alternative)
 
@@ -155,12 +165,23 @@ class NodeFileCollector(object):
         self.extra = kwargs
         self.can_view = node.can_view(auth)
         self.can_edit = node.can_edit(auth) and not node.is_registration
+        self._pool = None
+        # (children list, addon jobs) of serialized nodes, filled in once all jobs are spawned
+        self._pending_addons = None
 
     def to_hgrid(self):
         """Return the Rubeus.JS representation of the node's file data, including
         addons and components
         """
-        root = self._serialize_node(self.node)
+        # Addon roots of the whole tree are fetched concurrently while components are serialized
+        self._pool = Pool(settings.ADDON_HGRID_POOL_SIZE)
+        self._pending_addons = []
+        try:
+            root = self._serialize_node(self.node)
+            for children, jobs in self._pending_addons:
+                children[0:0] = self._gather_addons(jobs)
+        finally:
+            self._pool = self._pending_addons = None
         return [root]
 
     def _collect_components(self, node, visited):
@@ -204,10 +225,13 @@ class NodeFileCollector(object):
         visited = visited or []
         visited.append(node.resolve()._id)
         can_view = node.can_view(auth=self.auth)
-        if can_view:
-            children = self._collect_addons(node) + self._collect_components(node, visited)
-        else:
+        if not can_view:
             children = []
+        elif self._pending_addons is not None:
+            children = self._collect_components(node, visited)
+            self._pending_addons.append((children, self._spawn_addons(node)))
+        else:
+            children = self._collect_addons(node) + self._collect_components(node, visited)
 
         return {
             # TODO: Remove safe_unescape_html when mako html safe comes in
@@ -230,32 +254,77 @@ class NodeFileCollector(object):
         }
 
     def _collect_addons(self, node):
+        pool = self._pool or Pool(settings.ADDON_HGRID_POOL_SIZE)
+        return self._gather_addons(self._spawn_addons(node, pool=pool))
+
+    def _spawn_addons(self, node, pool=None):
+        """Start fetching the root folders of the node's addons, returning the greenlets."""
+        pool = pool or self._pool
+        fetch = self._fetch_addon_root
+        if has_request_context():
+            # Addon views may read the current request from their greenlet
+            fetch = copy_current_request_context(fetch)
+        return [
+            pool.spawn(fetch, addon)
+            for addon in node.get_addons()
+            if addon.config.has_hgrid_files
+        ]
+
+    def _gather_addons(self, jobs):
         rv = []
-        for addon in node.get_addons():
-            if addon.config.has_hgrid_files:
-                # WARNING: get_hgrid_data can return None if the addon is added but has no credentials.
-                try:
-                    temp = addon.config.get_hgrid_data(addon, self.auth, **self.extra)
-                except Exception as e:
-                    logger.warn(
-                        getattr(
-                            e,
-                            'data',
-                            'Unexpected error when fetching file contents for {0}.'.format(addon.config.full_name)
-                        )
-                    )
-                    sentry.log_exception()
-                    rv.append({
-                        KIND: FOLDER,
-                        'unavailable': True,
-                        'iconUrl': addon.config.icon_url,
-                        'provider': addon.config.short_name,
-                        'addonFullname': addon.config.full_name,
-                        'permissions': {'view': False, 'edit': False},
-                        'name': '{} is currently unavailable'.format(addon.config.full_name),
-                    })
-                    continue
-                rv.extend(sort_by_name(temp) or [])
+        for job in jobs:
+            rv.extend(job.get())
+        return rv
+
+    def _addon_root_cache_key(self, addon):
+        """Key the root folder of an addon on its settings, its credentials and the viewer."""
+        account = getattr(addon, 'external_account', None)
+        fingerprint = json.dumps(
+            [
+                addon.config.short_name,
+                addon.to_storage(),
+                account.to_storage() if account else None,
+                self.auth.user._id if self.auth.user else None,
+                self.auth.private_key,
+                self.extra,
+            ],
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.md5(fingerprint).hexdigest()
+
+    def _fetch_addon_root(self, addon):
+        key = self._addon_root_cache_key(addon)
+        expires, cached = _addon_root_cache.get(key, (0, None))
+        if expires > time.time():
+            return copy.deepcopy(cached)
+        try:
+            # WARNING: get_hgrid_data can return None if the addon is added but has no credentials.
+            with gevent.Timeout(settings.ADDON_HGRID_TIMEOUT):
+                temp = addon.config.get_hgrid_data(addon, self.auth, **self.extra)
+        except (Exception, gevent.Timeout) as e:
+            logger.warn(
+                getattr(
+                    e,
+                    'data',
+                    'Unexpected error when fetching file contents for {0}.'.format(addon.config.full_name)
+                )
+            )
+            sentry.log_exception()
+            return [{
+                KIND: FOLDER,
+                'unavailable': True,
+                'iconUrl': addon.config.icon_url,
+                'provider': addon.config.short_name,
+                'addonFullname': addon.config.full_name,
+                'permissions': {'view': False, 'edit': False},
+                'name': '{} is currently unavailable'.format(addon.config.full_name),
+            }]
+        rv = sort_by_name(temp) or []
+        now = time.time()
+        for stale_key in [each for each, (expiry, _) in _addon_root_cache.items() if expiry <= now]:
+            _addon_root_cache.pop(stale_key, None)
+        _addon_root_cache[key] = (now + settings.ADDON_HGRID_CACHE_TTL, copy.deepcopy(rv))
         return rv
 
 